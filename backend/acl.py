@@ -0,0 +1,256 @@
+# acl.py - per-file access control lists and the in-memory permission cache
+"""
+A file with no ACL document is unrestricted (ACL_DEFAULT_OPEN=1, the historic
+behaviour) or admin-only (ACL_DEFAULT_OPEN=0). A file with an ACL is readable
+by the listed users plus the members of the listed groups. An ACL left with
+no grantees (its last user was deleted) keeps the file admin-only until an
+admin replaces or clears it.
+
+Effective permissions are kept per user as a set of file ids, so the check on
+the download path is a dict lookup plus a set lookup with no DB access. Grants
+and group changes update only the affected users. Each change also bumps a
+version document; other workers poll it and reload when it moves.
+"""
+from typing import Dict, Set, Iterable, List, Optional, Any
+
+from db import db
+from config import settings
+from employee_io import normalize_email
+
+
+ACL_DEFAULT_OPEN = settings.acl_default_open
+ACL_REFRESH_SECONDS = settings.acl_refresh_seconds
+
+_VERSION_DOC_ID = "acl_version"
+
+
+class PermissionCache:
+    def __init__(self):
+        self._file_users: Dict[str, Set[str]] = {}
+        self._file_groups: Dict[str, Set[str]] = {}
+        self._group_members: Dict[str, Set[str]] = {}
+        self._group_files: Dict[str, Set[str]] = {}
+        self._file_effective: Dict[str, Set[str]] = {}
+        self._user_files: Dict[str, Set[str]] = {}
+        self.version = 0
+
+    # -----------------------------------------------------------------
+    # hot path
+    # -----------------------------------------------------------------
+    def can_access(self, email: str, role: Optional[str], file_id: str) -> bool:
+        if role == "admin":
+            return True
+        if file_id not in self._file_effective:
+            return ACL_DEFAULT_OPEN
+        return file_id in self._user_files.get(email, ())
+
+    def files_for(self, email: str) -> Set[str]:
+        return self._user_files.get(email, set())
+
+    def is_restricted(self, file_id: str) -> bool:
+        return file_id in self._file_effective
+
+    # -----------------------------------------------------------------
+    # incremental maintenance
+    # -----------------------------------------------------------------
+    def _recompute_file(self, file_id: str):
+        if file_id not in self._file_users and file_id not in self._file_groups:
+            new = None
+        else:
+            new = set(self._file_users.get(file_id, ()))
+            for g in self._file_groups.get(file_id, ()):
+                new |= self._group_members.get(g, set())
+        old = self._file_effective.get(file_id, set())
+        for email in old - (new or set()):
+            files = self._user_files.get(email)
+            if files is not None:
+                files.discard(file_id)
+                if not files:
+                    del self._user_files[email]
+        for email in (new or set()) - old:
+            self._user_files.setdefault(email, set()).add(file_id)
+        if new is None:
+            self._file_effective.pop(file_id, None)
+        else:
+            self._file_effective[file_id] = new
+
+    def set_file_acl(self, file_id: str, users: Iterable[str], groups: Iterable[str]):
+        """
+        Restrict a file to `users` and `groups`; both may be empty (admin-only).
+        """
+        for g in self._file_groups.get(file_id, ()):
+            self._group_files.get(g, set()).discard(file_id)
+        self._file_users[file_id] = set(users)
+        self._file_groups[file_id] = set(groups)
+        for g in self._file_groups[file_id]:
+            self._group_files.setdefault(g, set()).add(file_id)
+        self._recompute_file(file_id)
+
+    def set_group_members(self, name: str, members: Iterable[str]):
+        members = set(members)
+        if members:
+            self._group_members[name] = members
+        else:
+            self._group_members.pop(name, None)
+        for file_id in list(self._group_files.get(name, ())):
+            self._recompute_file(file_id)
+
+    def remove_file(self, file_id: str):
+        for g in self._file_groups.pop(file_id, ()):
+            self._group_files.get(g, set()).discard(file_id)
+        self._file_users.pop(file_id, None)
+        self._recompute_file(file_id)
+
+    def remove_user(self, email: str):
+        touched = set(self._user_files.get(email, ()))
+        for users in self._file_users.values():
+            users.discard(email)
+        for name, members in list(self._group_members.items()):
+            if email in members:
+                members.discard(email)
+                touched |= self._group_files.get(name, set())
+        for file_id in touched:
+            self._recompute_file(file_id)
+
+    def rename_user(self, old: str, new: str):
+        for users in self._file_users.values():
+            if old in users:
+                users.discard(old)
+                users.add(new)
+        for members in self._group_members.values():
+            if old in members:
+                members.discard(old)
+                members.add(new)
+        for file_id in list(self._user_files.get(old, ())):
+            self._recompute_file(file_id)
+
+    def load(self, acls: List[Dict[str, Any]], groups: List[Dict[str, Any]], version: int):
+        fresh = PermissionCache()
+        for g in groups:
+            fresh._group_members[g["name"]] = set(g.get("members", []))
+        for a in acls:
+            fresh.set_file_acl(a["file_id"], a.get("users", []), a.get("groups", []))
+        self.__dict__.update(fresh.__dict__)
+        self.version = version
+
+
+permissions = PermissionCache()
+
+
+# ---------------------------------------------------------------------
+# Persistence (every write keeps Mongo, this worker's cache and the version in step)
+# ---------------------------------------------------------------------
+async def _bump_version() -> int:
+    doc = await db["settings"].find_one_and_update(
+        {"_id": _VERSION_DOC_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=True
+    )
+    return doc["version"]
+
+
+async def _record_change():
+    """
+    Bump the version after a write already applied to this worker's cache. If
+    the counter moved by more than one, another worker changed permissions
+    since our last load, so reload instead of skipping its change.
+    """
+    version = await _bump_version()
+    if version == permissions.version + 1:
+        permissions.version = version
+    else:
+        await load_permissions()
+
+
+async def _current_version() -> int:
+    doc = await db["settings"].find_one({"_id": _VERSION_DOC_ID})
+    return doc["version"] if doc else 0
+
+
+async def load_permissions():
+    version = await _current_version()
+    acls = await db["file_acls"].find({}).to_list(None)
+    groups = await db["groups"].find({}).to_list(None)
+    permissions.load(acls, groups, version)
+
+
+def _normalized(emails: Iterable[str]) -> List[str]:
+    # grants must match the normalized `sub` of the users they name
+    return sorted({normalize_email(e) for e in emails})
+
+
+async def save_file_acl(file_id: str, users: List[str], groups: List[str]):
+    """
+    Replace a file's ACL. Raises EmailNotValidError for a malformed user.
+    """
+    users, groups = _normalized(users), sorted(set(groups))
+    restricted = bool(users or groups)
+    if restricted:
+        await db["file_acls"].update_one(
+            {"file_id": file_id}, {"$set": {"users": users, "groups": groups}}, upsert=True
+        )
+        permissions.set_file_acl(file_id, users, groups)
+    else:
+        await db["file_acls"].delete_one({"file_id": file_id})
+        permissions.remove_file(file_id)
+    # flag on the catalog lets employee listings filter in Mongo
+    await db["files"].update_one({"file_id": file_id}, {"$set": {"restricted": restricted}})
+    await _record_change()
+
+
+async def save_group(name: str, members: List[str]):
+    """
+    Replace a group's members. Raises EmailNotValidError for a malformed member.
+    """
+    members = _normalized(members)
+    if members:
+        await db["groups"].update_one({"name": name}, {"$set": {"members": members}}, upsert=True)
+    else:
+        await db["groups"].delete_one({"name": name})
+    permissions.set_group_members(name, members)
+    await _record_change()
+
+
+async def forget_user(email: str):
+    # the ACL document stays even when this was its last user, so the file stays admin-only
+    await db["file_acls"].update_many({"users": email}, {"$pull": {"users": email}})
+    await db["groups"].update_many({"members": email}, {"$pull": {"members": email}})
+    permissions.remove_user(email)
+    await _record_change()
+
+
+async def rename_user(old: str, new: str):
+    old, new = normalize_email(old), normalize_email(new)
+    await db["file_acls"].update_many({"users": old}, {"$set": {"users.$": new}})
+    await db["groups"].update_many({"members": old}, {"$set": {"members.$": new}})
+    permissions.rename_user(old, new)
+    await _record_change()
+
+
+def accessible_files_query(email: str) -> Dict[str, Any]:
+    """
+    Mongo filter for the files an employee may see.
+    """
+    granted = {"file_id": {"$in": list(permissions.files_for(email))}}
+    if ACL_DEFAULT_OPEN:
+        return {"$or": [{"restricted": {"$ne": True}}, granted]}
+    return granted
+
+
+async def ensure_indexes():
+    await db["file_acls"].create_index("file_id", unique=True)
+    await db["file_acls"].create_index("users")
+    await db["file_acls"].create_index("groups")
+    await db["groups"].create_index("name", unique=True)
+    await db["groups"].create_index("members")
+
+
+# ---------------------------------------------------------------------
+# Cross-worker refresh (run every ACL_REFRESH_SECONDS by the scheduler)
+# ---------------------------------------------------------------------
+async def refresh_permissions() -> bool:
+    """
+    Reload the cache if another worker changed permissions. Returns True if it reloaded.
+    """
+    if await _current_version() != permissions.version:
+        await load_permissions()
+        return True
+    return False
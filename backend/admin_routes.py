@@ -1,18 +1,49 @@
 # backend/admin_routes.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, status
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List
 from datetime import datetime
 from bson import ObjectId
-
-from db import db
-from auth import hash_password, decode_token
-from models import make_user_doc
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from email_validator import EmailNotValidError
+
+from db import db, reader
+from auth import hash_password, hash_passwords, decode_token
+from models import make_user_doc, email_key
+from schemas import (
+    BulkWFHDecisionIn, FileACLIn, GroupIn, RevokeSessionsIn, EmployeeOut, FileOut, FilePage, WFHRequestOut, LogOut
+)
+from serialization import FastJSONResponse, projection
 from files import store_encrypted_file
+from log_archive import query_logs, iter_logs, encode_log_line, archive_old_logs
+from log_migration import migration_status
+from audit import log_event, log_events
+from events import bus, emit, format_sse
+from tickets import issue_stream_ticket, verify_stream_ticket, STREAM_TICKET_TTL_SECONDS
+from file_catalog import (
+    make_catalog_entry, catalog_entry, parse_tags, with_defaults, build_search_query, apply_cursor,
+    encode_cursor, SORT_FIELDS, MAX_PAGE_SIZE,
+)
+import uploads
+from uploads import UploadError
+from scrubber import verify_file, integrity_summary
+from scheduler import scheduler
+from profiling import list_profiles, get_profile
+from sessions import list_sessions, revoke_sessions
+from segment_cache import segment_cache
+from utils import parse_wfh_until
+from acl import permissions, save_file_acl, save_group, forget_user, rename_user
+from employee_io import (
+    parse_import_rows, validate_rows, normalize_email, csv_header, csv_line, jsonl_line, MAX_IMPORT_ROWS,
+)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 bearer = HTTPBearer()
 
+SSE_KEEPALIVE_SECONDS = 15
+
 
 def require_admin(creds: HTTPAuthorizationCredentials = Depends(bearer)) -> Dict[str, Any]:
     token = creds.credentials
@@ -24,6 +55,20 @@ def require_admin(creds: HTTPAuthorizationCredentials = Depends(bearer)) -> Dict
     return payload
 
 
+def require_stream_ticket(ticket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Admin claims from a ?ticket= issued by POST /admin/events/ticket. Browser
+    EventSource cannot send an Authorization header, and a short-lived ticket
+    in the URL keeps the session JWT out of access and proxy logs.
+    """
+    payload = verify_stream_ticket(ticket) if ticket else None
+    if not payload:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid or expired stream ticket")
+    if payload.get("rl") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="admin only")
+    return payload
+
+
 @router.post("/create-employee")
 async def create_employee(payload: Dict[str, Any], token_data: Dict[str, Any] = Depends(require_admin)):
     email = payload.get("email")
@@ -32,15 +77,23 @@ async def create_employee(payload: Dict[str, Any], token_data: Dict[str, Any] =
 
     if not email or not password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="email and password required")
+    try:
+        email = normalize_email(email)
+    except EmailNotValidError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    existing = await db["users"].find_one({"email": email})
+    existing = await db["users"].find_one({"email_key": email_key(email)})
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="email already exists")
 
     hashed = hash_password(password)
     doc = make_user_doc(email, hashed, name, "employee")
-    await db["users"].insert_one(doc)
-    await db["logs"].insert_one({
+    try:
+        await db["users"].insert_one(doc)
+    except DuplicateKeyError:
+        # created concurrently by another request
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="email already exists")
+    await log_event({
         "email": token_data.get("sub"),
         "action": "created_employee",
         "target": email,
@@ -49,14 +102,94 @@ async def create_employee(payload: Dict[str, Any], token_data: Dict[str, Any] =
     return {"detail": "employee created"}
 
 
-@router.get("/employees")
+@router.get("/employees", response_model=List[EmployeeOut])
 async def list_employees(token_data: Dict[str, Any] = Depends(require_admin)):
-    cursor = db["users"].find({"role": "employee"}, {"hashed_password": 0})
-    res = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        res.append(doc)
-    return res
+    docs = await reader("admin_lists")["users"].find({"role": "employee"}, projection(EmployeeOut)).to_list(None)
+    return FastJSONResponse(docs, model=List[EmployeeOut])
+
+
+@router.post("/employees/import")
+async def import_employees(file: UploadFile = File(...), token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Bulk-create employees from a CSV (email,password,name) or JSON upload.
+    Existing emails are found with one $in query, passwords are hashed in a
+    process pool and new users are written with one unordered insert_many.
+    Returns a result entry per input row.
+    """
+    try:
+        rows = parse_import_rows(file.filename, await file.read())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"unreadable import file: {e}")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"at most {MAX_IMPORT_ROWS} rows per import")
+
+    valid, results = validate_rows(rows)
+
+    existing = set()
+    if valid:
+        cursor = db["users"].find({"email_key": {"$in": [email_key(v["email"]) for v in valid]}}, {"email_key": 1, "_id": 0})
+        existing = {u["email_key"] async for u in cursor}
+    pending = []
+    for v in valid:
+        if email_key(v["email"]) in existing:
+            results.append({"row": v["row"], "email": v["email"], "status": "duplicate", "detail": "email already exists"})
+        else:
+            pending.append(v)
+
+    hashes = await hash_passwords([v["password"] for v in pending])
+    docs = [make_user_doc(v["email"], h, v["name"], "employee") for v, h in zip(pending, hashes)]
+
+    failed = {}
+    if docs:
+        try:
+            await db["users"].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+    created = 0
+    for i, v in enumerate(pending):
+        if i in failed and failed[i].get("code") == 11000:
+            # inserted by a concurrent import or create since the check above
+            results.append({"row": v["row"], "email": v["email"], "status": "duplicate", "detail": "email already exists"})
+        elif i in failed:
+            results.append({"row": v["row"], "email": v["email"], "status": "error",
+                            "detail": failed[i].get("errmsg", "write failed")})
+        else:
+            results.append({"row": v["row"], "email": v["email"], "status": "created"})
+            created += 1
+    results.sort(key=lambda r: r["row"])
+
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "imported_employees",
+        "created": created,
+        "rows": len(rows),
+        "time": datetime.utcnow()
+    })
+    return {"created": created, "total": len(rows), "results": results}
+
+
+@router.get("/employees/export")
+async def export_employees(format: str = "csv", token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Stream all employees as CSV (default) or JSON lines, without password hashes.
+    """
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be csv or jsonl")
+    projection = {"_id": 0, "email": 1, "name": 1, "role": 1, "created_at": 1, "wfh_allowed_until": 1}
+    line = csv_line if format == "csv" else jsonl_line
+
+    async def gen():
+        if format == "csv":
+            yield csv_header()
+        async for doc in reader("exports")["users"].find({"role": "employee"}, projection).batch_size(1000):
+            yield line(doc)
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="employees.{format}"'}
+    )
 
 
 @router.put("/update-employee")
@@ -71,24 +204,40 @@ async def update_employee(payload: Dict[str, Any], token_data: Dict[str, Any] =
 
     update = {}
     if payload.get("new_email"):
-        update["email"] = payload.get("new_email")
+        try:
+            update["email"] = normalize_email(payload.get("new_email"))
+        except EmailNotValidError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        update["email_key"] = email_key(update["email"])
     if "name" in payload:
         update["name"] = payload.get("name")
     if payload.get("password"):
         update["hashed_password"] = hash_password(payload.get("password"))
+    # the audit trail (and the live feed) records that the password changed, never the hash
+    changes = {k: v for k, v in update.items() if k != "hashed_password"}
+    if "hashed_password" in update:
+        changes["password_changed"] = True
 
     if not update:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="no changes supplied")
 
-    result = await db["users"].update_one({"email": email, "role": "employee"}, {"$set": update})
+    try:
+        result = await db["users"].update_one({"email": email, "role": "employee"}, {"$set": update})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="email already exists")
     if result.matched_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="employee not found")
+    if "email" in update and update["email"] != email:
+        await rename_user(email, update["email"])
+    # a new password or address signs the employee out everywhere
+    if "hashed_password" in update or ("email" in update and update["email"] != email):
+        await revoke_sessions([email], "credentials_changed")
 
-    await db["logs"].insert_one({
+    await log_event({
         "email": token_data.get("sub"),
         "action": "updated_employee",
         "target": email,
-        "changes": update,
+        "changes": changes,
         "time": datetime.utcnow()
     })
     return {"detail": "updated"}
@@ -105,8 +254,10 @@ async def delete_employee(email: str = Form(...), token_data: Dict[str, Any] = D
     res = await db["users"].delete_one({"email": email, "role": "employee"})
     if res.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="employee not found")
+    await forget_user(email)
+    await revoke_sessions([email], "user_removed")
 
-    await db["logs"].insert_one({
+    await log_event({
         "email": token_data.get("sub"),
         "action": "deleted_employee",
         "target": email,
@@ -115,59 +266,452 @@ async def delete_employee(email: str = Form(...), token_data: Dict[str, Any] = D
     return {"detail": "deleted"}
 
 
+# ---------------------------------------------------------------------
+# Login sessions (refresh tokens)
+# ---------------------------------------------------------------------
+@router.get("/sessions")
+async def get_sessions(email: Optional[str] = None, limit: int = 200,
+                       token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Live sessions, newest first; `email` filters to one user.
+    """
+    return await list_sessions(email, min(max(limit, 1), 1000))
+
+
+@router.post("/sessions/revoke")
+async def revoke_user_sessions(payload: RevokeSessionsIn, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    JSON body: { "emails": ["a@x.com", ...] }. Ends every session of those
+    users; they sign in again (password + OTP) once their access token expires.
+    """
+    emails = sorted({e.strip() for e in payload.emails if e and e.strip()})
+    if not emails:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="emails required")
+    revoked = await revoke_sessions(emails, "admin")
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "revoked_sessions",
+        "targets": emails,
+        "revoked": revoked,
+        "time": datetime.utcnow()
+    })
+    return {"revoked": revoked, "users": len(emails)}
+
+
 @router.post("/upload-file")
-async def upload_file(file: UploadFile = File(...), token_data: Dict[str, Any] = Depends(require_admin)):
+async def upload_file(
+    file: UploadFile = File(...),
+    tags: str = Form(""),
+    token_data: Dict[str, Any] = Depends(require_admin),
+):
+    """
+    Encrypt and store an upload. Size, MIME type, SHA-256 and tags
+    (comma-separated) are recorded in the `files` catalog.
+    """
     content = await file.read()
     metadata = {"uploaded_by": token_data.get("sub")}
     oid = await store_encrypted_file(file.filename, content, metadata=metadata)
-    file_doc = {
-        "file_id": str(oid),
-        "filename": file.filename,
-        "uploaded_by": token_data.get("sub"),
-        "uploaded_at": datetime.utcnow()
-    }
+    file_doc = make_catalog_entry(str(oid), file.filename, token_data.get("sub"), content, parse_tags(tags))
     await db["files"].insert_one(file_doc)
-    await db["logs"].insert_one({
+    await log_event({
         "email": token_data.get("sub"),
         "action": "uploaded_file",
         "file_id": str(oid),
         "filename": file.filename,
         "time": datetime.utcnow()
     })
-    return {"file_id": str(oid)}
+    return {"file_id": str(oid), "size": file_doc["size"], "mime_type": file_doc["mime_type"]}
+
+
+# ---------------------------------------------------------------------
+# Resumable chunked uploads
+# ---------------------------------------------------------------------
+def _upload_http_error(e: UploadError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.post("/uploads")
+async def create_upload(
+    filename: str = Form(...),
+    size: int = Form(...),
+    chunk_size: Optional[int] = Form(None),
+    tags: str = Form(""),
+    token_data: Dict[str, Any] = Depends(require_admin),
+):
+    """
+    Start a resumable upload. chunk_size defaults to 8 MiB and must be a
+    multiple of the 1 MiB encryption segment.
+    """
+    try:
+        session = await uploads.create_session(filename, size, chunk_size, parse_tags(tags), token_data.get("sub"))
+    except UploadError as e:
+        raise _upload_http_error(e)
+    return uploads.describe(session)
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    try:
+        return uploads.describe(await uploads.get_session(upload_id, token_data.get("sub")))
+    except UploadError as e:
+        raise _upload_http_error(e)
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request,
+                           token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Upload chunk `index` as the raw request body. Chunks may arrive in any order
+    and in parallel; re-sending a chunk replaces it.
+    """
+    try:
+        session = await uploads.get_session(upload_id, token_data.get("sub"))
+        return await uploads.put_chunk(session, index, await request.body())
+    except UploadError as e:
+        raise _upload_http_error(e)
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    try:
+        session = await uploads.get_session(upload_id, token_data.get("sub"))
+        result = await uploads.finalize(session)
+    except UploadError as e:
+        raise _upload_http_error(e)
+
+    file_doc = catalog_entry(result["file_id"], result["filename"], token_data.get("sub"),
+                             result["size"], result["sha256"], result["head"], result["tags"])
+    await db["files"].insert_one(file_doc)
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "uploaded_file",
+        "file_id": result["file_id"],
+        "filename": result["filename"],
+        "time": datetime.utcnow()
+    })
+    return {"file_id": result["file_id"], "size": file_doc["size"], "mime_type": file_doc["mime_type"]}
 
 
-@router.get("/files")
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    try:
+        session = await uploads.get_session(upload_id, token_data.get("sub"))
+    except UploadError as e:
+        raise _upload_http_error(e)
+    await uploads.abort(session)
+    return {"detail": "upload aborted"}
+
+
+@router.get("/files", response_model=List[FileOut])
 async def list_files(token_data: Dict[str, Any] = Depends(require_admin)):
-    cursor = db["files"].find({})
-    res = []
-    async for f in cursor:
-        f["_id"] = str(f["_id"])
-        res.append(f)
-    return res
+    docs = await reader("admin_lists")["files"].find({}, projection(FileOut)).to_list(None)
+    return FastJSONResponse([with_defaults(f) for f in docs], model=List[FileOut])
+
+
+@router.get("/files/search", response_model=FilePage)
+async def search_files(
+    q: Optional[str] = None,
+    uploaded_by: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    tag: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    uploaded_from: Optional[datetime] = None,
+    uploaded_to: Optional[datetime] = None,
+    integrity: Optional[str] = None,
+    sort: str = "uploaded_at",
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    token_data: Dict[str, Any] = Depends(require_admin),
+):
+    """
+    Search the file catalog without touching file bytes.
+      q          filename prefix (case-insensitive)
+      mime_type  exact type, or a prefix ending in "/" such as "image/"
+      integrity  ok | corrupt | missing (set by the background scrubber)
+      sort       uploaded_at | filename | size, order asc | desc
+      cursor     next_cursor from the previous page (keyset pagination)
+    """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"sort must be one of {', '.join(SORT_FIELDS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="order must be asc or desc")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    field = SORT_FIELDS[sort]
+    descending = order == "desc"
+
+    query = build_search_query(q, uploaded_by, mime_type, tag, min_size, max_size, uploaded_from, uploaded_to, integrity)
+    if cursor:
+        try:
+            query = apply_cursor(query, field, descending, cursor)
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor")
+
+    direction = -1 if descending else 1
+    fields = projection(FileOut)
+    fields[field] = 1  # the sort key is needed for the next cursor
+    docs = await reader("file_search")["files"].find(query, fields) \
+        .sort([(field, direction), ("_id", direction)]).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(field), last["_id"])
+    for d in docs:
+        d.pop("filename_lc", None)
+        with_defaults(d)
+    return FastJSONResponse({"items": docs, "next_cursor": next_cursor}, model=FilePage)
+
+
+@router.get("/files/{file_id}/acl")
+async def get_file_acl(file_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    doc = await db["file_acls"].find_one({"file_id": file_id}, {"_id": 0})
+    if not doc:
+        return {"file_id": file_id, "users": [], "groups": [], "restricted": False}
+    return {**doc, "restricted": True}
+
+
+@router.put("/files/{file_id}/acl")
+async def put_file_acl(file_id: str, payload: FileACLIn, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Replace a file's ACL. JSON body: { "users": [emails], "groups": [names] }.
+    Empty lists remove the ACL and the file is unrestricted again.
+    """
+    if not await db["files"].find_one({"file_id": file_id}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not found")
+    try:
+        await save_file_acl(file_id, payload.users, payload.groups)
+    except EmailNotValidError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "updated_file_acl",
+        "file_id": file_id,
+        "users": len(payload.users),
+        "groups": len(payload.groups),
+        "time": datetime.utcnow()
+    })
+    return {"detail": "acl updated", "restricted": permissions.is_restricted(file_id)}
+
+
+@router.get("/integrity")
+async def integrity_status(token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Scrubber progress (checkpoint, last pass, this worker's counters) and
+    catalog counts per integrity status.
+    """
+    return await integrity_summary()
+
+
+@router.get("/segment-cache")
+async def segment_cache_status(token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    This worker's encrypted-segment cache: size, hit ratio and bytes served
+    from memory versus read from GridFS.
+    """
+    return segment_cache.stats()
+
+
+@router.post("/files/{file_id}/verify")
+async def verify_stored_file(file_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Check one file's ciphertext now instead of waiting for the next scrub pass.
+    """
+    if not await db["files"].find_one({"file_id": file_id}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="file not found")
+    result = await verify_file(file_id)
+    return {"file_id": file_id, **result}
+
+
+@router.get("/jobs")
+async def list_jobs(token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Maintenance jobs with their schedule and the last run's start, duration,
+    status and error (from whichever worker held the lease).
+    """
+    return await scheduler.status()
+
+
+@router.post("/jobs/{name}/run")
+async def run_job_now(name: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    job = scheduler.jobs.get(name)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="job not found")
+    last = await scheduler.run_job(job)
+    await log_event({"email": token_data.get("sub"), "action": "job_run", "job": name, "time": datetime.utcnow()})
+    return {"name": name, **last}
+
+
+@router.get("/profiles")
+async def profiles(route: Optional[str] = None, limit: int = 50, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Recent request profiles (newest first) with wall time and its Mongo /
+    crypto / hashing split; `route` filters by path template.
+    """
+    return await list_profiles(route, min(max(limit, 1), 500))
+
+
+@router.get("/profiles/{profile_id}")
+async def profile_detail(profile_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    doc = await get_profile(profile_id)
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile not found")
+    return doc
+
+
+@router.get("/profiles/{profile_id}/collapsed")
+async def profile_collapsed(profile_id: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Collapsed stacks as text, ready for flamegraph.pl or speedscope.
+    """
+    doc = await get_profile(profile_id)
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="profile not found")
+    return PlainTextResponse(doc.get("collapsed", "") + "\n")
+
+
+@router.get("/groups")
+async def list_groups(token_data: Dict[str, Any] = Depends(require_admin)):
+    return await reader("admin_lists")["groups"].find({}, {"_id": 0}).sort("name", 1).to_list(None)
+
+
+@router.put("/groups/{name}")
+async def put_group(name: str, payload: GroupIn, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Create or replace a group. JSON body: { "members": [emails] }.
+    An empty member list deletes the group.
+    """
+    try:
+        await save_group(name, payload.members)
+    except EmailNotValidError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "updated_group",
+        "target": name,
+        "members": len(payload.members),
+        "time": datetime.utcnow()
+    })
+    return {"detail": "group updated"}
 
 
-@router.get("/logs")
+@router.delete("/groups/{name}")
+async def delete_group(name: str, token_data: Dict[str, Any] = Depends(require_admin)):
+    await save_group(name, [])
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "deleted_group",
+        "target": name,
+        "time": datetime.utcnow()
+    })
+    return {"detail": "group deleted"}
+
+
+@router.get("/logs", response_model=List[LogOut])
 async def get_logs(limit: int = 100, token_data: Dict[str, Any] = Depends(require_admin)):
-    cursor = db["logs"].find({}).sort("time", -1).limit(limit)
-    res = []
-    async for l in cursor:
-        l["_id"] = str(l["_id"])
-        res.append(l)
-    return res
+    # reads the hot collection first, then archived segments if more rows are needed
+    return FastJSONResponse(await query_logs(limit=limit), model=List[LogOut])
+
+
+@router.get("/logs/export")
+async def export_logs(
+    email: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    token_data: Dict[str, Any] = Depends(require_admin),
+):
+    """
+    Stream matching events (hot + archive, newest first) as JSON lines.
+    """
+    async def gen():
+        async for l in iter_logs(email=email, since=since, until=until):
+            yield encode_log_line(l)
+
+    return StreamingResponse(
+        gen(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="logs.jsonl"'}
+    )
+
+
+@router.post("/logs/archive")
+async def archive_logs(retention_days: Optional[int] = Form(None), token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Move events older than the retention horizon (LOG_RETENTION_DAYS by default)
+    into compressed archive segments.
+    """
+    if retention_days is not None and retention_days < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid retention_days")
+    result = await archive_old_logs(retention_days)
+    if "skipped" in result:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=result["skipped"])
+    await log_event({
+        "email": token_data.get("sub"),
+        "action": "archived_logs",
+        "archived": result["archived"],
+        "time": datetime.utcnow()
+    })
+    return result
+
+
+@router.get("/logs/migration")
+async def log_migration_status(token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Progress of the rewrite of old-style events into the compact schema
+    (run it now with POST /admin/jobs/log_migration/run).
+    """
+    return await migration_status()
 
 
-@router.get("/wfh_requests")
+@router.post("/events/ticket")
+async def live_events_ticket(token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Ticket for opening /admin/events?ticket=...; get a new one for every (re)connect.
+    """
+    ticket = issue_stream_ticket(token_data.get("sub"), token_data.get("role"))
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_TTL_SECONDS}
+
+
+@router.get("/events")
+async def live_events(request: Request, token_data: Dict[str, Any] = Depends(require_stream_ticket)):
+    """
+    Server-sent event stream of audit events ("log") and WFH changes
+    ("wfh_request", "wfh_updated"). Each client gets a bounded buffer.
+    The ticket is only checked when the stream opens.
+    """
+    sub = bus.subscribe()
+
+    async def gen():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if sub.closed:
+                    break
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        gen(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/wfh_requests", response_model=List[WFHRequestOut])
 async def list_wfh_requests(token_data: Dict[str, Any] = Depends(require_admin)):
-    cursor = db["wfh_requests"].find({}).sort("created_at", -1)
-    out = []
-    async for r in cursor:
-        r["_id"] = str(r["_id"])
-        # Normalize missing status → pending
-        if "status" not in r:
-            r["status"] = "pending"
-        out.append(r)
-    return out
+    fields = projection(WFHRequestOut)
+    # missing status -> pending, done by the server
+    fields["status"] = {"$ifNull": ["$status", "pending"]}
+    docs = await reader("admin_lists")["wfh_requests"].aggregate(
+        [{"$sort": {"created_at": -1}}, {"$project": fields}]).to_list(None)
+    return FastJSONResponse(docs, model=List[WFHRequestOut])
 
 
 @router.post("/approve-wfh")
@@ -192,9 +736,10 @@ async def approve_wfh(request_id: str = Form(...), token_data: Dict[str, Any] =
     )
     await db["users"].update_one(
         {"email": req["requested_by"]},
-        {"$set": {"wfh_allowed_until": req["end_date"]}}
+        {"$set": {"wfh_allowed_until": parse_wfh_until(req["end_date"])}}
     )
-    await db["logs"].insert_one({
+    emit("wfh_updated", {"_id": request_id, "requested_by": req["requested_by"], "status": "approved"})
+    await log_event({
         "email": token_data["sub"],
         "action": "wfh_approved",
         "request_id": request_id,
@@ -224,7 +769,8 @@ async def reject_wfh(request_id: str = Form(...), token_data: Dict[str, Any] = D
             }
         }
     )
-    await db["logs"].insert_one({
+    emit("wfh_updated", {"_id": request_id, "requested_by": req["requested_by"], "status": "rejected"})
+    await log_event({
         "email": token_data["sub"],
         "action": "wfh_rejected",
         "request_id": request_id,
@@ -234,6 +780,78 @@ async def reject_wfh(request_id: str = Form(...), token_data: Dict[str, Any] = D
     return {"detail": "rejected"}
 
 
+MAX_BULK_WFH = 1000
+
+
+@router.post("/wfh/bulk-decision")
+async def bulk_wfh_decision(payload: BulkWFHDecisionIn, token_data: Dict[str, Any] = Depends(require_admin)):
+    """
+    Approve or reject many WFH requests at once. JSON body:
+      { "request_ids": ["<id>", ...], "decision": "approve" | "reject" }
+    Requests are loaded with one $in query, all updates go out in bulk_write
+    calls and audit entries in one insert_many. Returns one result per id.
+    """
+    if len(payload.request_ids) > MAX_BULK_WFH:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BULK_WFH} requests per call")
+
+    results = {}
+    oids = {}
+    for rid in payload.request_ids:
+        try:
+            oids[rid] = ObjectId(rid)
+        except Exception:
+            results[rid] = {"request_id": rid, "status": "error", "detail": "invalid request id"}
+
+    found = {}
+    if oids:
+        async for req in db["wfh_requests"].find({"_id": {"$in": list(oids.values())}}):
+            found[req["_id"]] = req
+
+    approve = payload.decision == "approve"
+    now = datetime.utcnow()
+    request_ops = []
+    user_until = {}  # email -> end_date; later ids win, as with sequential approve-wfh calls
+    log_docs = []
+    decided = []
+    for rid, oid in oids.items():
+        req = found.get(oid)
+        if not req:
+            results[rid] = {"request_id": rid, "status": "error", "detail": "request not found"}
+            continue
+        if approve:
+            request_ops.append(UpdateOne({"_id": oid}, {"$set": {"status": "approved", "approved_at": now}}))
+            user_until[req["requested_by"]] = parse_wfh_until(req["end_date"])
+        else:
+            request_ops.append(UpdateOne({"_id": oid}, {"$set": {"status": "rejected", "rejected_at": now}}))
+        log_docs.append({
+            "email": token_data["sub"],
+            "action": "wfh_approved" if approve else "wfh_rejected",
+            "request_id": rid,
+            "requested_by": req["requested_by"],
+            "time": now
+        })
+        decided.append((rid, req["requested_by"]))
+
+    if request_ops:
+        await db["wfh_requests"].bulk_write(request_ops, ordered=False)
+    if user_until:
+        await db["users"].bulk_write(
+            [UpdateOne({"email": email}, {"$set": {"wfh_allowed_until": until}}) for email, until in user_until.items()],
+            ordered=False
+        )
+    await log_events(log_docs)
+
+    status_value = "approved" if approve else "rejected"
+    for rid, requested_by in decided:
+        results[rid] = {"request_id": rid, "status": status_value}
+        emit("wfh_updated", {"_id": rid, "requested_by": requested_by, "status": status_value})
+
+    return {
+        "decision": payload.decision,
+        "applied": len(decided),
+        "results": [results[rid] for rid in dict.fromkeys(payload.request_ids)],
+    }
+
 
 @router.post("/revoke-wfh")
 async def revoke_wfh(user_email: str = Form(...), token_data: Dict[str, Any] = Depends(require_admin)):
@@ -255,9 +873,11 @@ async def revoke_wfh(user_email: str = Form(...), token_data: Dict[str, Any] = D
         {"requested_by": user_email, "status": "approved"},
         {"$set": {"status": "revoked", "revoked_at": datetime.utcnow()}}
     )
+    if result.modified_count:
+        emit("wfh_updated", {"requested_by": user_email, "status": "revoked"})
 
     # Log the revoke action
-    await db["logs"].insert_one({
+    await log_event({
         "email": token_data.get("sub"),
         "action": "wfh_revoked",
         "target": user_email,
@@ -369,7 +989,7 @@ async def update_settings(payload: dict = Body(...), token_data: Dict[str, Any]
     # Upsert the single settings doc
     await db["settings"].update_one({"_id": _SETTINGS_DOC_ID}, {"$set": cleaned}, upsert=True)
     # Log the change
-    await db["logs"].insert_one({
+    await log_event({
         "email": token_data.get("sub"),
         "action": "updated_settings",
         "changes": cleaned,
@@ -0,0 +1,209 @@
+# audit.py - single writer for the `logs` audit collection
+"""
+Events are stored in a compact, versioned form (v=2) and expanded back to the
+API shape (`email`, `action`, `time`, ...) by expand_events() on every read:
+
+  {"v": 2, "t": time, "a": action code, "u": actor id, "f": file,
+   "o": target, "c": [changed field names], "d": detail, ...other fields}
+
+Actions are small integers from ACTION_CODES; an action missing from the
+table is stored as its string. Users are referenced through `log_actors`
+(one document per email ever logged), not `users`, so an event keeps the
+address it was written with after the employee is renamed or deleted. Update
+events keep only the names of the changed fields, never their values.
+
+Documents without `v` are the old shape; log_migration rewrites them.
+"""
+from typing import Dict, Any, List, Optional, Iterable
+
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from db import db
+from events import emit
+
+
+SCHEMA_VERSION = 2
+
+# stored in every event: append new actions, never renumber or reuse a code
+ACTION_CODES: Dict[str, int] = {
+    "access_granted": 1,
+    "download": 2,
+    "decrypt_error": 3,
+    "denied_acl": 4,
+    "denied_geofence": 5,
+    "denied_time": 6,
+    "denied_network": 7,
+    "denied_file_not_found": 8,
+    "uploaded_file": 9,
+    "created_employee": 10,
+    "updated_employee": 11,
+    "deleted_employee": 12,
+    "imported_employees": 13,
+    "updated_file_acl": 14,
+    "updated_group": 15,
+    "deleted_group": 16,
+    "wfh_requested": 17,
+    "wfh_approved": 18,
+    "wfh_rejected": 19,
+    "wfh_revoked": 20,
+    "wfh_expired": 21,
+    "archived_logs": 22,
+    "job_run": 23,
+    "updated_settings": 24,
+    "revoked_sessions": 25,
+    "session_reuse_detected": 26,
+    "session_device_mismatch": 27,
+}
+ACTION_NAMES: Dict[int, str] = {code: name for name, code in ACTION_CODES.items()}
+
+# API field -> stored field; `email` (-> "u") and `action` (-> "a") are encoded separately
+SHORT_FIELDS = {"time": "t", "file": "f", "target": "o", "changes": "c", "detail": "d"}
+LONG_FIELDS = {short: name for name, short in SHORT_FIELDS.items()}
+
+# actors never change, so both directions are cached for the life of the process
+_actor_ids: Dict[str, ObjectId] = {}
+_actor_emails: Dict[ObjectId, str] = {}
+
+
+# ---------------------------------------------------------------------
+# Actors
+# ---------------------------------------------------------------------
+def _remember(actor_id: ObjectId, email: str):
+    _actor_ids[email] = actor_id
+    _actor_emails[actor_id] = email
+
+
+async def actor_ids(emails: Iterable[str], create: bool = True) -> Dict[str, ObjectId]:
+    """
+    Map emails to actor ids, registering unknown emails when `create` is set.
+    """
+    wanted = {e for e in emails if e}
+    missing = [e for e in wanted if e not in _actor_ids]
+    if missing:
+        async for a in db["log_actors"].find({"email": {"$in": missing}}):
+            _remember(a["_id"], a["email"])
+        for email in missing:
+            if email in _actor_ids or not create:
+                continue
+            try:
+                actor_id = ObjectId()
+                await db["log_actors"].insert_one({"_id": actor_id, "email": email})
+            except DuplicateKeyError:
+                # registered concurrently by another request or worker
+                actor_id = (await db["log_actors"].find_one({"email": email}))["_id"]
+            _remember(actor_id, email)
+    return {e: _actor_ids[e] for e in wanted if e in _actor_ids}
+
+
+async def actor_id(email: str) -> Optional[ObjectId]:
+    """
+    Actor id of an email that has been logged before, else None (for queries).
+    """
+    return (await actor_ids([email], create=False)).get(email)
+
+
+async def _actor_emails_for(ids: Iterable[ObjectId]) -> Dict[ObjectId, str]:
+    missing = [i for i in set(ids) if i not in _actor_emails]
+    if missing:
+        async for a in db["log_actors"].find({"_id": {"$in": missing}}):
+            _remember(a["_id"], a["email"])
+    return _actor_emails
+
+
+# ---------------------------------------------------------------------
+# Encoding
+# ---------------------------------------------------------------------
+def _changed_fields(changes) -> List[str]:
+    if not isinstance(changes, dict):
+        return list(changes or [])
+    # old update events stored the new password hash itself
+    return sorted("password_changed" if k == "hashed_password" else k for k in changes)
+
+
+def compact(doc: Dict[str, Any], actors: Dict[str, ObjectId]) -> Dict[str, Any]:
+    """
+    Stored form of an API-shaped event; `actors` must hold the event's email.
+    """
+    out: Dict[str, Any] = {"v": SCHEMA_VERSION}
+    if "_id" in doc:
+        out["_id"] = doc["_id"]
+    for key, value in doc.items():
+        if key in ("_id", "v"):
+            continue
+        if key == "email":
+            if value:
+                out["u"] = actors[value]
+        elif key == "action":
+            out["a"] = ACTION_CODES.get(value, value)
+        elif key == "changes":
+            out["c"] = _changed_fields(value)
+        elif key in SHORT_FIELDS:
+            out[SHORT_FIELDS[key]] = value
+        else:
+            out[key] = value
+    return out
+
+
+async def compact_events(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    actors = await actor_ids(d.get("email") for d in docs)
+    return [compact(d, actors) for d in docs]
+
+
+# ---------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------
+def _expand(doc: Dict[str, Any], emails: Dict[ObjectId, str]) -> Dict[str, Any]:
+    if doc.get("v") != SCHEMA_VERSION:
+        return doc
+    out: Dict[str, Any] = {"_id": doc["_id"]} if "_id" in doc else {}
+    if "u" in doc:
+        out["email"] = emails.get(doc["u"])
+    action = doc.get("a")
+    out["action"] = ACTION_NAMES.get(action, str(action)) if isinstance(action, int) else action
+    for key, value in doc.items():
+        if key in ("_id", "v", "u", "a"):
+            continue
+        out[LONG_FIELDS.get(key, key)] = value
+    return out
+
+
+async def expand_events(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    API shape of stored events (compact or old-style), with one actors query
+    at most for ids this process has not seen.
+    """
+    emails = await _actor_emails_for(d["u"] for d in docs if d.get("v") == SCHEMA_VERSION and "u" in d)
+    return [_expand(d, emails) for d in docs]
+
+
+# ---------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------
+async def log_event(doc: Dict[str, Any]):
+    """
+    Insert one audit event and publish it to the live activity feed.
+    """
+    await log_events([doc])
+
+
+async def log_events(docs: List[Dict[str, Any]]):
+    """
+    Insert many audit events with one round trip and publish each of them.
+    """
+    if not docs:
+        return
+    stored = await compact_events(docs)
+    if len(stored) == 1:
+        await db["logs"].insert_one(stored[0])
+    else:
+        await db["logs"].insert_many(stored, ordered=False)
+    for doc, row in zip(docs, stored):
+        doc["_id"] = row["_id"]
+        if "changes" in doc:
+            doc["changes"] = row["c"]
+        emit("log", doc)
+
+
+async def ensure_indexes():
+    await db["log_actors"].create_index("email", unique=True)
@@ -1,25 +1,69 @@
 # auth.py - password hashing, JWT, OTP management
-import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from passlib.context import CryptContext
 from jose import jwt
+from pymongo.errors import OperationFailure
 from datetime import datetime, timedelta
 import random
 from db import db
-from dotenv import load_dotenv
+from config import settings
+from metrics import record_phase
 
-load_dotenv()
 
 # use PBKDF2 to avoid native bcrypt dependency (good for quick dev)
 pwd_ctx = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-JWT_SECRET = os.getenv("JWT_SECRET", "dev_jwt_secret")
-JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-JWT_EXP_MINUTES = int(os.getenv("JWT_EXP_MINUTES", "60"))
+JWT_SECRET = settings.jwt_secret
+JWT_ALGORITHM = settings.jwt_algorithm
+JWT_EXP_MINUTES = settings.jwt_exp_minutes
+HASH_WORKERS = settings.hash_workers or None  # None -> os.cpu_count()
+HASH_BATCH = 64
+
+_hash_pool = None
 
 def hash_password(password: str) -> str:
-    return pwd_ctx.hash(password)
+    start = time.perf_counter()
+    hashed = pwd_ctx.hash(password)
+    record_phase("hashing", time.perf_counter() - start)
+    return hashed
+
+def _hash_many(passwords: List[str]) -> List[str]:
+    return [pwd_ctx.hash(p) for p in passwords]
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _hash_pool
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """
+    Hash many passwords in a process pool (PBKDF2 is CPU bound and holds the GIL).
+    Work is sent in batches to keep IPC overhead low. Order matches the input.
+    """
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    pool = _get_hash_pool()
+    batches = [passwords[i:i + HASH_BATCH] for i in range(0, len(passwords), HASH_BATCH)]
+    start = time.perf_counter()
+    results = await asyncio.gather(*[loop.run_in_executor(pool, _hash_many, b) for b in batches])
+    record_phase("hashing", time.perf_counter() - start)
+    return [h for batch in results for h in batch]
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_ctx.verify(plain, hashed)
+    start = time.perf_counter()
+    ok = pwd_ctx.verify(plain, hashed)
+    record_phase("hashing", time.perf_counter() - start)
+    return ok
 
 def create_access_token(subject: str, role: str, minutes: int = None):
     expire = datetime.utcnow() + timedelta(minutes=(minutes or JWT_EXP_MINUTES))
@@ -51,3 +95,33 @@ async def verify_otp(email: str, code: str) -> bool:
         await db["otps"].delete_one({"email": email})
         return True
     return False
+
+async def purge_expired_otps() -> int:
+    result = await db["otps"].delete_many({"expires_at": {"$lt": datetime.utcnow()}})
+    return result.deleted_count
+
+async def ensure_user_indexes():
+    """
+    Backfill email_key on users created before it existed, then make `email`
+    and `email_key` unique. Existing duplicates are reported and leave that
+    index non-unique until the accounts are merged.
+    """
+    await db["users"].update_many(
+        {"email_key": {"$exists": False}},
+        [{"$set": {"email_key": {"$toLower": "$email"}}}]
+    )
+    for field in ("email", "email_key"):
+        dupes = [d["_id"] async for d in db["users"].aggregate([
+            {"$group": {"_id": f"${field}", "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}},
+        ])]
+        if dupes:
+            print(f"warning: duplicate users.{field}: {', '.join(map(str, dupes[:10]))}; merge them, then restart")
+            await db["users"].create_index(field)
+            continue
+        try:
+            await db["users"].create_index(field, unique=True)
+        except OperationFailure:
+            # an older non-unique index of the same name
+            await db["users"].drop_index(f"{field}_1")
+            await db["users"].create_index(field, unique=True)
@@ -0,0 +1,307 @@
+# bench_primitives.py - micro-benchmarks for the per-request primitives (no services needed)
+"""
+Usage:
+    python bench_primitives.py                                 # all groups, results to bench-results.json
+    python bench_primitives.py --only crypto --sizes 1KB,1MB,1GB
+    python bench_primitives.py --baseline bench-main.json      # flag regressions
+
+Groups:
+  geo        utils.haversine_meters / is_within_geofence / is_within_work_hours
+  jwt        auth.create_access_token / decode_token (valid and tampered)
+  hashing    verify_password with the configured context and each --hash-profiles entry
+  crypto     files.encrypt_segments / decrypt_segments throughput per --sizes entry
+  serialize  the admin list endpoints' row shapes, --rows rows each, through
+             FastAPI's generic path (jsonable_encoder + JSONResponse) and
+             through serialization.FastJSONResponse as the endpoints use it
+  import     cold `import main` in a fresh interpreter (what each worker pays
+             on spawn or restart), net of bare interpreter start-up, plus the
+             slowest modules from `python -X importtime`
+
+Each benchmark is run in rounds, as pytest-benchmark does. One call is
+timed first. From that, the loop count per round is set so a round lasts
+--round-time, and the number of rounds is capped by --max-time. The
+median time per call is what gets compared. Results are written as JSON
+together with machine and library versions. --baseline compares against
+an earlier file and exits 1 when any median is more than --threshold
+slower.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List
+
+KB = 1024
+MB = 1024 * KB
+GROUPS = ("geo", "jwt", "hashing", "crypto", "serialize", "import")
+DEFAULT_SIZES = "1KB,64KB,1MB,16MB,64MB"
+DEFAULT_HASH_PROFILES = "pbkdf2_sha256:29000,pbkdf2_sha256:100000,pbkdf2_sha256:600000,bcrypt:12"
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, mult in (("GB", 1024 * MB), ("MB", MB), ("KB", KB), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * mult)
+    return int(text)
+
+
+def _version(module: str) -> str:
+    try:
+        from importlib.metadata import version
+        return version(module)
+    except Exception:
+        return "n/a"
+
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "cryptography": _version("cryptography"),
+        "passlib": _version("passlib"),
+        "fastapi": _version("fastapi"),
+    }
+
+
+class Runner:
+    def __init__(self, round_time: float, rounds: int, max_time: float):
+        self.round_time = round_time
+        self.rounds = rounds
+        self.max_time = max_time
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def bench(self, name: str, fn: Callable[[], Any], nbytes: int = 0):
+        start = time.perf_counter()
+        fn()  # warm-up, also the estimate
+        once = max(time.perf_counter() - start, 1e-9)
+        loops = max(1, int(self.round_time / once))
+        rounds = max(1, min(self.rounds, int(self.max_time / (once * loops))))
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            samples.append((time.perf_counter() - start) / loops)
+        median = statistics.median(samples)
+        row = {
+            "rounds": rounds,
+            "loops": loops,
+            "min_s": min(samples),
+            "median_s": median,
+            "mean_s": statistics.fmean(samples),
+            "stddev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            "ops_per_s": round(1 / median, 2),
+        }
+        if nbytes:
+            row["bytes"] = nbytes
+            row["mb_per_s"] = round(nbytes / median / MB, 2)
+        self.results[name] = row
+        rate = f"{row['mb_per_s']:>10.1f} MB/s" if nbytes else f"{row['ops_per_s']:>12.1f} ops/s"
+        print(f"{name:<44}{median * 1e6:>14.2f} us  {rate}  ({rounds}x{loops})")
+
+
+# ---------------------------------------------------------------------
+# Groups
+# ---------------------------------------------------------------------
+def bench_geo(r: Runner, args):
+    from utils import haversine_meters, is_within_geofence, is_within_work_hours, CENTER_LAT, CENTER_LON
+    r.bench("utils.haversine_meters", lambda: haversine_meters(CENTER_LAT, CENTER_LON, CENTER_LAT + 0.01, CENTER_LON))
+    r.bench("utils.is_within_geofence[inside]", lambda: is_within_geofence(CENTER_LAT, CENTER_LON))
+    r.bench("utils.is_within_geofence[outside]", lambda: is_within_geofence(0.0, 0.0))
+    r.bench("utils.is_within_work_hours", is_within_work_hours)
+
+
+def bench_jwt(r: Runner, args):
+    from auth import create_access_token, decode_token
+    token = create_access_token("bench@example.com", "employee")
+    tampered = token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB")
+    r.bench("auth.create_access_token", lambda: create_access_token("bench@example.com", "employee"))
+    r.bench("auth.decode_token[valid]", lambda: decode_token(token))
+    r.bench("auth.decode_token[tampered]", lambda: decode_token(tampered))
+
+
+def bench_hashing(r: Runner, args):
+    from passlib.context import CryptContext
+    from auth import pwd_ctx, verify_password
+    password = "Bench-Password-1"
+    hashed = pwd_ctx.hash(password)
+    r.bench("auth.verify_password[configured]", lambda: verify_password(password, hashed))
+    for profile in filter(None, args.hash_profiles.split(",")):
+        scheme, _, rounds = profile.strip().partition(":")
+        try:
+            ctx = CryptContext(schemes=[scheme], **({f"{scheme}__rounds": int(rounds)} if rounds else {}))
+            stored = ctx.hash(password)
+        except Exception as e:  # backend missing (e.g. no bcrypt module)
+            print(f"{'verify_password[' + profile + ']':<44} skipped: {e}")
+            continue
+        r.bench(f"verify_password[{profile}]", lambda ctx=ctx, stored=stored: ctx.verify(password, stored))
+
+
+def bench_crypto(r: Runner, args):
+    from files import encrypt_segments, decrypt_segments, _get_fernet
+    fernet = _get_fernet()
+    for label in args.sizes.split(","):
+        size = parse_size(label)
+        plain = os.urandom(size)
+        enc = encrypt_segments(plain, fernet)
+        r.bench(f"files.encrypt_segments[{label.strip()}]", lambda: encrypt_segments(plain, fernet), size)
+        r.bench(f"files.decrypt_segments[{label.strip()}]", lambda: decrypt_segments(enc, size, 0, fernet), size)
+        del plain, enc
+
+
+def _rows(kind: str, n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    from bson import ObjectId
+    from models import make_user_doc
+    from file_catalog import catalog_entry, with_defaults
+    now = datetime.utcnow()
+    rows = []
+    for i in range(n):
+        if kind == "employees":
+            doc = make_user_doc(f"user{i}@example.com", "", f"Employee {i}", "employee")
+            doc.pop("hashed_password")
+            doc.pop("email_key")
+            doc["wfh_allowed_until"] = now + timedelta(hours=rng.randint(0, 48)) if i % 3 == 0 else None
+        elif kind == "files":
+            doc = catalog_entry(str(ObjectId()), f"report-{i}.pdf", "admin@example.com", rng.randint(1, 10 * MB),
+                                "%064x" % rng.getrandbits(256), b"%PDF-", ["finance", "q3"][: i % 3])
+            doc.pop("filename_lc")
+            doc = with_defaults({"_id": ObjectId(), **doc})
+        elif kind == "logs":
+            doc = {"email": f"user{i % 50}@example.com", "file": str(ObjectId()), "action": "download",
+                   "lat": 9.3586 + rng.random() / 100, "lon": 76.6772 + rng.random() / 100,
+                   "time": now - timedelta(seconds=i)}
+        else:  # wfh_requests
+            doc = {"requested_by": f"user{i % 50}@example.com", "start_date": "2026-01-05 09:00:00",
+                   "end_date": "2026-01-05 17:00:00", "reason": "remote day", "status": "pending",
+                   "created_at": now - timedelta(minutes=i)}
+        doc["_id"] = str(doc.get("_id") or ObjectId())
+        rows.append(doc)
+    return rows
+
+
+def bench_serialize(r: Runner, args):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from bson import ObjectId
+    from typing import List
+    from serialization import FastJSONResponse
+    from schemas import EmployeeOut, FileOut, LogOut, WFHRequestOut
+    rng = random.Random(1)
+    endpoints = {"employees": ("/admin/employees", EmployeeOut), "files": ("/admin/files", FileOut),
+                 "logs": ("/admin/logs", LogOut), "wfh_requests": ("/admin/wfh_requests", WFHRequestOut)}
+    for kind, (path, model) in endpoints.items():
+        rows = _rows(kind, args.rows, rng)
+        r.bench(f"serialize[{path} x{args.rows}]", lambda rows=rows: JSONResponse(jsonable_encoder(rows)).body)
+        # as the endpoints send them: raw Motor documents, ObjectId `_id` included, checked against the model
+        raw = [{**row, "_id": ObjectId(row["_id"])} for row in rows]
+        r.bench(f"serialize_fast[{path} x{args.rows}]",
+                lambda raw=raw, model=model: FastJSONResponse(raw, model=List[model]).body)
+
+
+def _python(*argv: str) -> subprocess.CompletedProcess:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.run([sys.executable, *argv], cwd=here, capture_output=True, text=True, check=True)
+
+
+def _importtime_top(module: str, n: int) -> List[str]:
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in _python("-X", "importtime", "-c", f"import {module}").stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[0].startswith("import time:") and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return [f"{us / 1000:>8.1f} ms  {name}" for us, name in rows[:n]]
+
+
+def bench_import(r: Runner, args):
+    # one process per call; with ~1 s per call the Runner settles on a few rounds of one loop
+    r.bench("python -c pass", lambda: _python("-c", "pass"))
+    r.bench("python -c 'import main'", lambda: _python("-c", "import main"))
+    base = r.results["python -c pass"]["median_s"]
+    cold = r.results["python -c 'import main'"]["median_s"]
+    print(f"{'import main (net of interpreter start)':<44}{(cold - base) * 1e3:>14.2f} ms")
+    print("slowest modules, cumulative:")
+    for line in _importtime_top("main", 10):
+        print(f"  {line}")
+
+
+BENCHES = {"geo": bench_geo, "jwt": bench_jwt, "hashing": bench_hashing,
+           "crypto": bench_crypto, "serialize": bench_serialize, "import": bench_import}
+
+
+# ---------------------------------------------------------------------
+# Comparison
+# ---------------------------------------------------------------------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    problems = []
+    for name, base in baseline.get("benchmarks", {}).items():
+        cur = current["benchmarks"].get(name)
+        if cur is None:
+            continue
+        change = cur["median_s"] / base["median_s"] - 1
+        if change > threshold:
+            problems.append(f"{name}: {base['median_s'] * 1e6:.2f} -> {cur['median_s'] * 1e6:.2f} us (+{change:.0%})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for Geocrypt backend primitives")
+    parser.add_argument("--only", help=f"comma separated groups: {','.join(GROUPS)}")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="crypto sizes, e.g. 1KB,1MB,1GB")
+    parser.add_argument("--hash-profiles", default=DEFAULT_HASH_PROFILES, help="scheme:rounds list")
+    parser.add_argument("--rows", type=int, default=1000, help="rows per list endpoint for serialize")
+    parser.add_argument("--round-time", type=float, default=0.05, help="target seconds per round")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--max-time", type=float, default=5.0, help="cap on seconds per benchmark")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    groups = args.only.split(",") if args.only else list(GROUPS)
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+
+    runner = Runner(args.round_time, args.rounds, args.max_time)
+    for group in groups:
+        print(f"== {group}")
+        BENCHES[group](runner, args)
+
+    result = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "machine": machine_info(),
+        "config": {k: getattr(args, k) for k in ("sizes", "hash_profiles", "rows", "round_time", "rounds", "max_time")},
+        "benchmarks": runner.results,
+    }
+    with open(args.out, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print(f"results in {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        if baseline.get("machine") != result["machine"]:
+            print("note: baseline was recorded on a different machine or library versions")
+        problems = compare(result, baseline, args.threshold)
+        if problems:
+            print(f"\nslower by more than {args.threshold:.0%} than {args.baseline}:")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
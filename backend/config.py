@@ -0,0 +1,244 @@
+# config.py - typed application settings, read once from the environment / .env
+"""
+Every module takes its configuration from `settings` instead of calling
+load_dotenv() and os.getenv() itself. The .env file is parsed once, on the
+first import of this module; values already set in the environment win, as
+before.
+
+Bad values (a non-numeric port, "9am" as a work hour) raise ConfigError at
+import, naming every offending variable at once. Checks that need more than
+parsing, such as FERNET_KEY being a usable key, run in validate(), which the
+app lifespan calls at startup. Offline tools can import modules without a
+key.
+
+Derived values (work-hour times, the ticket secret, the Fernet signing key,
+Mongo client options) are computed here once rather than per request.
+"""
+import os
+import hmac
+import base64
+import hashlib
+import binascii
+from dataclasses import dataclass, field, fields
+from datetime import time
+from typing import Optional, Dict, Any, List, FrozenSet
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError("expected 1/0")
+
+
+def _clock(value: str) -> time:
+    hour, minute = value.split(":")
+    return time(int(hour), int(minute))
+
+
+READ_MODES = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+
+
+def _read_mode(value: str) -> str:
+    if value not in READ_MODES:
+        raise ValueError("unknown read preference")
+    return value
+
+
+def _names(value: str) -> FrozenSet[str]:
+    return frozenset(n.strip() for n in value.split(",") if n.strip())
+
+
+def env(name: str, default: Any = None, cast=str):
+    return field(default=default, metadata={"env": name, "cast": cast})
+
+
+# Mongo client options (pymongo name -> env var, type); unset keeps the driver default
+_MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_MS", int),
+    "maxConnecting": ("MONGO_MAX_CONNECTING", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+    "socketTimeoutMS": ("MONGO_SOCKET_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),  # e.g. "zstd,snappy,zlib"
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    # MongoDB
+    mongo_uri: str = env("MONGO_URI", "mongodb://localhost:27017")
+    mongo_warm_connections: Optional[int] = env("MONGO_WARM_CONNECTIONS", None, int)
+    # read routing (db.reader): which read purposes may go to secondaries, and how
+    analytics_read_preference: str = env("ANALYTICS_READ_PREFERENCE", "secondaryPreferred", _read_mode)
+    analytics_max_staleness_seconds: int = env("ANALYTICS_MAX_STALENESS_SECONDS", 90, int)
+    analytics_reads: FrozenSet[str] = env(
+        "ANALYTICS_READS", frozenset({"admin_lists", "file_search", "logs", "exports", "integrity", "profiles"}), _names)
+
+    # auth
+    jwt_secret: str = env("JWT_SECRET", "dev_jwt_secret")
+    jwt_algorithm: str = env("JWT_ALGORITHM", "HS256")
+    jwt_exp_minutes: int = env("JWT_EXP_MINUTES", 60, int)
+    hash_workers: int = env("HASH_WORKERS", 0, int)  # 0 -> one per core
+    refresh_token_days: int = env("REFRESH_TOKEN_DAYS", 14, int)
+    session_max_days: int = env("SESSION_MAX_DAYS", 30, int)
+    refresh_reuse_grace_seconds: int = env("REFRESH_REUSE_GRACE_SECONDS", 10, int)
+    bootstrap_admin_email: Optional[str] = env("BOOTSTRAP_ADMIN_EMAIL")
+    bootstrap_admin_password: str = env("BOOTSTRAP_ADMIN_PASSWORD", "admin")
+
+    # SMTP
+    smtp_host: str = env("SMTP_HOST", "smtp.gmail.com")
+    smtp_port: int = env("SMTP_PORT", 587, int)
+    smtp_user: Optional[str] = env("SMTP_USER")
+    smtp_pass: Optional[str] = env("SMTP_PASS")
+
+    # encryption
+    fernet_key: Optional[str] = env("FERNET_KEY")
+
+    # access policy
+    geofence_center_lat: float = env("GEOFENCE_CENTER_LAT", 9.35866726100274, float)
+    geofence_center_lon: float = env("GEOFENCE_CENTER_LON", 76.67729687183018, float)
+    geofence_radius_m: float = env("GEOFENCE_RADIUS_M", 1000.0, float)
+    workday_start: time = env("WORKDAY_START", time(9, 0), _clock)
+    workday_end: time = env("WORKDAY_END", time(17, 0), _clock)
+    allowed_wifi_ssid: Optional[str] = env("ALLOWED_WIFI_SSID")
+    acl_default_open: bool = env("ACL_DEFAULT_OPEN", True, _bool)
+    acl_refresh_seconds: int = env("ACL_REFRESH_SECONDS", 30, int)
+    download_ticket_ttl_seconds: int = env("DOWNLOAD_TICKET_TTL_SECONDS", 300, int)
+    download_ticket_secret: Optional[str] = env("DOWNLOAD_TICKET_SECRET")
+    stream_ticket_ttl_seconds: int = env("STREAM_TICKET_TTL_SECONDS", 30, int)
+
+    # audit log / events
+    log_retention_days: int = env("LOG_RETENTION_DAYS", 90, int)
+    log_archive_dir: str = env("LOG_ARCHIVE_DIR", "log_archive")
+    log_migration_docs_per_second: int = env("LOG_MIGRATION_DOCS_PER_SECOND", 2000, int)
+    events_change_streams: bool = env("EVENTS_CHANGE_STREAMS", False, _bool)
+    events_subscriber_buffer: int = env("EVENTS_SUBSCRIBER_BUFFER", 256, int)
+
+    # uploads / previews / scrubber
+    upload_session_ttl_hours: int = env("UPLOAD_SESSION_TTL_HOURS", 24, int)
+    upload_gc_seconds: int = env("UPLOAD_GC_SECONDS", 600, int)
+    max_upload_size: int = env("MAX_UPLOAD_SIZE", 50 * 1024 ** 3, int)
+    preview_text_bytes: int = env("PREVIEW_TEXT_BYTES", 64 * 1024, int)
+    preview_image_px: int = env("PREVIEW_IMAGE_PX", 512, int)
+    preview_max_source_bytes: int = env("PREVIEW_MAX_SOURCE_BYTES", 50 * 1024 * 1024, int)
+    segment_cache_bytes: int = env("SEGMENT_CACHE_BYTES", 128 * 1024 * 1024, int)
+    scrub_bytes_per_second: int = env("SCRUB_BYTES_PER_SECOND", 8 * 1024 * 1024, int)
+    scrub_concurrency: int = env("SCRUB_CONCURRENCY", 2, int)
+    scrub_interval_hours: float = env("SCRUB_INTERVAL_HOURS", 24.0, float)
+
+    # maintenance scheduler
+    otp_purge_seconds: int = env("OTP_PURGE_SECONDS", 900, int)
+    wfh_expiry_seconds: int = env("WFH_EXPIRY_SECONDS", 300, int)
+    log_archive_cron: str = env("LOG_ARCHIVE_CRON", "30 2 * * *")
+    scrub_check_seconds: int = env("SCRUB_CHECK_SECONDS", 3600, int)
+
+    # observability
+    metrics_token: Optional[str] = env("METRICS_TOKEN")
+    profile_sample_rate: float = env("PROFILE_SAMPLE_RATE", 0.0, float)
+    profile_on_header: bool = env("PROFILE_ON_HEADER", False, _bool)
+    profile_interval_seconds: float = env("PROFILE_INTERVAL_SECONDS", 0.001, float)
+    profile_retention_days: int = env("PROFILE_RETENTION_DAYS", 7, int)
+
+    # server
+    app_host: str = env("APP_HOST", "0.0.0.0")
+    app_port: int = env("APP_PORT", 8000, int)
+    web_concurrency: Optional[int] = env("WEB_CONCURRENCY", None, int)
+    graceful_shutdown_seconds: int = env("GRACEFUL_SHUTDOWN_SECONDS", 30, int)
+    keep_alive_seconds: int = env("KEEP_ALIVE_SECONDS", 5, int)
+    listen_backlog: int = env("LISTEN_BACKLOG", 2048, int)
+    forwarded_allow_ips: str = env("FORWARDED_ALLOW_IPS", "127.0.0.1")
+    access_log: bool = env("ACCESS_LOG", False, _bool)
+
+    # derived (filled by from_env)
+    mongo_client_options: Dict[str, Any] = field(default_factory=dict)
+    ticket_secret: bytes = b""
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        values: Dict[str, Any] = {}
+        errors: List[str] = []
+        for f in fields(cls):
+            name = f.metadata.get("env")
+            raw = os.environ.get(name) if name else None
+            # empty means "unset", except for lists, where it is the empty list
+            if raw is None or (raw == "" and f.metadata["cast"] is not _names):
+                continue
+            try:
+                values[f.name] = f.metadata["cast"](raw.strip())
+            except ValueError:
+                errors.append(f"{name}={raw!r}")
+
+        client_options = {}
+        for option, (name, cast) in _MONGO_CLIENT_OPTIONS.items():
+            raw = os.environ.get(name)
+            if raw:
+                try:
+                    client_options[option] = cast(raw)
+                except ValueError:
+                    errors.append(f"{name}={raw!r}")
+        if errors:
+            raise ConfigError("invalid configuration: " + ", ".join(errors))
+
+        values["mongo_client_options"] = client_options
+        if values.get("download_ticket_secret"):
+            values["ticket_secret"] = values["download_ticket_secret"].encode()
+        else:
+            # derived from the JWT secret so a ticket is never a valid JWT signature
+            jwt_secret = values.get("jwt_secret", cls.jwt_secret).encode()
+            values["ticket_secret"] = hmac.new(jwt_secret, b"geocrypt-download-ticket", hashlib.sha256).digest()
+        return cls(**values)
+
+    @property
+    def fernet_key_bytes(self) -> bytes:
+        if not self.fernet_key:
+            raise RuntimeError(
+                "FERNET_KEY is not set in the environment. "
+                "Generate one with: python -c \"from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())\" "
+                "and add it to your .env as FERNET_KEY"
+            )
+        return self.fernet_key.encode()
+
+    @property
+    def warm_connections(self) -> int:
+        return self.mongo_warm_connections or self.mongo_client_options.get("minPoolSize") or 4
+
+    def validate(self):
+        """
+        Startup checks beyond parsing; raises ConfigError listing every problem.
+        """
+        problems = []
+        try:
+            if len(base64.urlsafe_b64decode(self.fernet_key_bytes)) != 32:
+                problems.append("FERNET_KEY must be 32 url-safe base64-encoded bytes")
+        except (RuntimeError, binascii.Error) as e:
+            problems.append(str(e) if isinstance(e, RuntimeError) else "FERNET_KEY is not valid base64")
+        if self.workday_start > self.workday_end:
+            problems.append("WORKDAY_START is after WORKDAY_END")
+        if 0 < self.analytics_max_staleness_seconds < 90:
+            problems.append("ANALYTICS_MAX_STALENESS_SECONDS must be 0 (no bound) or at least 90")
+        if self.scrub_check_seconds <= 0:
+            problems.append("SCRUB_CHECK_SECONDS must be positive")
+        if self.stream_ticket_ttl_seconds <= 0:
+            problems.append("STREAM_TICKET_TTL_SECONDS must be positive")
+        if not 0 <= self.profile_sample_rate <= 1:
+            problems.append("PROFILE_SAMPLE_RATE must be between 0 and 1")
+        if problems:
+            raise ConfigError("; ".join(problems))
+        if self.jwt_secret == Settings.jwt_secret:
+            print("warning: JWT_SECRET is the development default")
+
+
+settings = Settings.from_env()
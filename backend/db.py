@@ -1,9 +1,67 @@
 # db.py
-import os
+"""
+`db` reads from the primary. Auth, OTP, policy checks and every write use it.
+
+reader(purpose) returns the handle for a read that may instead be served by a
+secondary. Dashboards, searches and exports read through it, so they do not
+compete with logins and downloads on the primary. The routed purposes are
+listed in ANALYTICS_READS, and they use ANALYTICS_READ_PREFERENCE (default
+secondaryPreferred). ANALYTICS_MAX_STALENESS_SECONDS bounds how far behind
+the primary a chosen secondary may be; 0 means no bound, and MongoDB's
+minimum is 90. A routed read can miss a write made just before it on the
+primary, for example a new employee in the next list refresh. Set
+ANALYTICS_READ_PREFERENCE=primary or ANALYTICS_READS= to turn routing off.
+On a standalone server every read goes to that server.
+read_routing_check.py checks the routing against a replica set.
+"""
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
-from dotenv import load_dotenv
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+from metrics import mongo_listener
+from config import settings
+
+MONGO_URI = settings.mongo_uri
+
+# read purposes (reader(purpose)); those in ANALYTICS_READS may be served by a secondary
+READ_PURPOSES = {
+    "admin_lists": "/admin/employees, /admin/files, /admin/wfh_requests, /admin/groups",
+    "file_search": "/admin/files/search",
+    "logs": "/admin/logs, /employee/my-logs (hot collection)",
+    "exports": "/admin/logs/export, /admin/employees/export",
+    "integrity": "/admin/integrity catalog counts",
+    "profiles": "/admin/profiles",
+}
+
+_READ_MODES = {"primary": Primary, "primaryPreferred": PrimaryPreferred, "secondary": Secondary,
+               "secondaryPreferred": SecondaryPreferred, "nearest": Nearest}
+
 
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URI)
+def analytics_read_preference():
+    mode = _READ_MODES[settings.analytics_read_preference]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=settings.analytics_max_staleness_seconds or -1)
+
+
+# pool / timeout / compression tuning from MONGO_* settings; unset values keep the driver defaults.
+# Creating the client opens no connections, so it stays module-level.
+client = AsyncIOMotorClient(MONGO_URI, event_listeners=[mongo_listener], **settings.mongo_client_options)
 db = client.get_default_database()  # database: geocrypt (from URI)
+analytics_db = db.with_options(read_preference=analytics_read_preference())
+
+
+def reader(purpose: str):
+    """
+    Database handle for a read of the given purpose (see READ_PURPOSES).
+    """
+    return analytics_db if purpose in settings.analytics_reads else db
+
+
+async def warm_up_pool(connections: int = None):
+    """
+    Open pool connections before the first request needs them: concurrent
+    pings each check out (and so create) a connection.
+    """
+    n = connections or settings.warm_connections
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(n, 1))))
@@ -1,15 +1,16 @@
 # email_utils.py - simple SMTP sender for OTPs
-import os
+import time
 import smtplib
 from email.message import EmailMessage
-from dotenv import load_dotenv
 
-load_dotenv()
+from metrics import record_smtp
+from config import settings
 
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
+
+SMTP_HOST = settings.smtp_host
+SMTP_PORT = settings.smtp_port
+SMTP_USER = settings.smtp_user
+SMTP_PASS = settings.smtp_pass
 
 def send_email(to_email: str, subject: str, body: str):
     if not SMTP_USER or not SMTP_PASS:
@@ -19,7 +20,13 @@ def send_email(to_email: str, subject: str, body: str):
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
-        s.starttls()
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
+    start = time.perf_counter()
+    try:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as s:
+            s.starttls()
+            s.login(SMTP_USER, SMTP_PASS)
+            s.send_message(msg)
+    except Exception as e:
+        record_smtp(time.perf_counter() - start, e)
+        raise
+    record_smtp(time.perf_counter() - start)
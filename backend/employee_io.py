@@ -0,0 +1,94 @@
+# employee_io.py - parsing and formatting for bulk employee import/export
+import io
+import csv
+import json
+from typing import List, Dict, Any, Tuple
+from email_validator import validate_email, EmailNotValidError
+
+from models import email_key
+
+EXPORT_FIELDS = ["email", "name", "role", "created_at", "wfh_allowed_until"]
+MAX_IMPORT_ROWS = 50000
+
+
+def parse_import_rows(filename: str, content: bytes) -> List[Dict[str, Any]]:
+    """
+    Parse an uploaded CSV (header: email,password,name) or JSON file
+    (array of objects, or one object per line) into a list of raw row dicts.
+    Raises ValueError on an unreadable file.
+    """
+    text = content.decode("utf-8-sig")
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return [dict(r) for r in csv.DictReader(io.StringIO(text))]
+
+    stripped = text.strip()
+    if not stripped:
+        return []
+    if stripped.startswith("["):
+        rows = json.loads(stripped)
+    else:
+        rows = [json.loads(line) for line in stripped.splitlines() if line.strip()]
+    if not all(isinstance(r, dict) for r in rows):
+        raise ValueError("each row must be an object")
+    return rows
+
+
+def normalize_email(raw: str) -> str:
+    """
+    The form every write path stores (email-validator's normalization, which
+    lowercases the domain). Raises EmailNotValidError.
+    """
+    return validate_email(raw.strip(), check_deliverability=False).normalized
+
+
+def validate_rows(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split rows into (valid, results). `valid` entries carry the normalized
+    email/name/password plus their row number; `results` holds one error entry
+    per rejected row. Repeated emails within the file are rejected after the first.
+    """
+    valid = []
+    results = []
+    seen = set()
+    for i, row in enumerate(rows, start=1):
+        raw_email = str(row.get("email") or "").strip()
+        password = row.get("password") or ""
+        name = str(row.get("name") or "").strip()
+
+        if not raw_email or not password:
+            results.append({"row": i, "email": raw_email, "status": "error", "detail": "email and password required"})
+            continue
+        try:
+            email = normalize_email(raw_email)
+        except EmailNotValidError as e:
+            results.append({"row": i, "email": raw_email, "status": "error", "detail": str(e)})
+            continue
+        if email_key(email) in seen:
+            results.append({"row": i, "email": email, "status": "duplicate", "detail": "repeated in file"})
+            continue
+        seen.add(email_key(email))
+        valid.append({"row": i, "email": email, "name": name, "password": str(password)})
+    return valid, results
+
+
+def _export_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def csv_header() -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(EXPORT_FIELDS)
+    return buf.getvalue()
+
+
+def csv_line(doc: Dict[str, Any]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow([_export_value(doc.get(f)) or "" for f in EXPORT_FIELDS])
+    return buf.getvalue()
+
+
+def jsonl_line(doc: Dict[str, Any]) -> str:
+    return json.dumps({f: _export_value(doc.get(f)) for f in EXPORT_FIELDS}) + "\n"
@@ -1,10 +1,17 @@
 # backend/employee_routes.py
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Any
+from typing import Dict, Any, List
 from datetime import datetime
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from db import db
 from auth import decode_token
+from log_archive import query_logs
+from audit import log_event
+from events import emit
+from acl import accessible_files_query
+from file_catalog import with_defaults
+from schemas import EmployeeFileOut, LogOut
+from serialization import FastJSONResponse, projection
 
 router = APIRouter(prefix="/employee", tags=["employee"])
 bearer = HTTPBearer()
@@ -33,15 +40,17 @@ async def request_wfh(payload: Dict[str, Any], token_data: Dict[str, Any] = Depe
     if not start or not end:
         raise HTTPException(status_code=400, detail="start_date and end_date required")
 
-    await db["wfh_requests"].insert_one({
+    wfh_doc = {
         "requested_by": email,
         "start_date": start,
         "end_date": end,
         "reason": reason,
         "status": "pending",
         "created_at": datetime.utcnow()
-    })
-    await db["logs"].insert_one({
+    }
+    await db["wfh_requests"].insert_one(wfh_doc)
+    emit("wfh_request", wfh_doc)
+    await log_event({
         "email": email,
         "action": "wfh_requested",
         "time": datetime.utcnow()
@@ -49,12 +58,18 @@ async def request_wfh(payload: Dict[str, Any], token_data: Dict[str, Any] = Depe
     return {"detail": "requested"}
 
 
-@router.get("/my-logs")
+@router.get("/my-logs", response_model=List[LogOut])
 async def my_logs(token_data: Dict[str, Any] = Depends(require_user)):
     email = token_data.get("sub")
-    cursor = db["logs"].find({"email": email}).sort("time", -1).limit(100)
-    out = []
-    async for l in cursor:
-        l["_id"] = str(l["_id"])
-        out.append(l)
-    return out
+    return FastJSONResponse(await query_logs(email=email, limit=100), model=List[LogOut])
+
+
+@router.get("/files", response_model=List[EmployeeFileOut])
+async def my_files(token_data: Dict[str, Any] = Depends(require_user)):
+    """
+    Files the caller is allowed to download (per-file ACLs applied).
+    """
+    email = token_data.get("sub")
+    docs = await db["files"].find(accessible_files_query(email), projection(EmployeeFileOut)) \
+        .sort("uploaded_at", -1).to_list(None)
+    return FastJSONResponse([with_defaults(f) for f in docs], model=List[EmployeeFileOut])
@@ -0,0 +1,158 @@
+# events.py - in-process event bus feeding the admin live activity stream
+"""
+Writers call `emit(kind, data)`; every connected subscriber receives the event
+through its own bounded queue. A slow subscriber never blocks publishers or
+grows memory: when its queue is full the oldest event is dropped and counted.
+
+With several uvicorn workers each process has its own bus, so set
+EVENTS_CHANGE_STREAMS=1 (requires a replica set) to feed every bus from Mongo
+change streams instead of local publishes.
+"""
+import json
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+from bson.objectid import ObjectId
+
+from db import db
+from config import settings
+
+
+EVENTS_CHANGE_STREAMS = settings.events_change_streams
+SUBSCRIBER_BUFFER = settings.events_subscriber_buffer
+
+# collection -> event kind for change stream inserts
+_WATCHED = {"logs": "log", "wfh_requests": "wfh_request"}
+
+
+def _to_jsonable(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    return value
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", maxsize: int):
+        self._bus = bus
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def offer(self, event: Dict[str, Any]):
+        if self.queue.full():
+            # drop the oldest event so the newest state always gets through
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._subscribers.discard(self)
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+
+    def subscribe(self, maxsize: int = SUBSCRIBER_BUFFER) -> Subscription:
+        sub = Subscription(self, maxsize)
+        self._subscribers.add(sub)
+        return sub
+
+    def publish(self, event: Dict[str, Any]):
+        for sub in list(self._subscribers):
+            sub.offer(event)
+
+    def drain(self):
+        """
+        Ask every stream to finish (server shutdown); each wakes up and sees `closed`.
+        """
+        for sub in list(self._subscribers):
+            sub.closed = True
+            sub.offer(None)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+bus = EventBus()
+
+
+def emit(kind: str, data: Dict[str, Any]):
+    """
+    Publish an event to local subscribers. No-op when the change stream bridge
+    is enabled, since the bridge delivers the same write to every worker.
+    """
+    if EVENTS_CHANGE_STREAMS:
+        return
+    bus.publish({"type": kind, "data": _to_jsonable(data)})
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+# ---------------------------------------------------------------------
+# Optional Mongo change stream bridge (multi-worker deployments)
+# ---------------------------------------------------------------------
+_bridge_task: Optional[asyncio.Task] = None
+
+
+async def _run_bridge():
+    pipeline = [{"$match": {
+        "operationType": {"$in": ["insert", "update"]},
+        "ns.coll": {"$in": list(_WATCHED)},
+    }}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                async for change in stream:
+                    coll = change["ns"]["coll"]
+                    doc = change.get("fullDocument")
+                    if not doc:
+                        continue
+                    if coll == "wfh_requests" and change["operationType"] == "update":
+                        kind = "wfh_updated"
+                    elif change["operationType"] == "insert":
+                        kind = _WATCHED[coll]
+                    else:
+                        continue
+                    if coll == "logs":
+                        # imported here: audit publishes through this module
+                        from audit import expand_events
+                        doc = (await expand_events([doc]))[0]
+                    bus.publish({"type": kind, "data": _to_jsonable(doc)})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"event change stream error, retrying: {e}")
+            await asyncio.sleep(5)
+
+
+def start_bridge():
+    global _bridge_task
+    if EVENTS_CHANGE_STREAMS and _bridge_task is None:
+        _bridge_task = asyncio.create_task(_run_bridge())
+
+
+async def stop_bridge():
+    global _bridge_task
+    if _bridge_task is not None:
+        _bridge_task.cancel()
+        try:
+            await _bridge_task
+        except asyncio.CancelledError:
+            pass
+        _bridge_task = None
@@ -0,0 +1,188 @@
+# file_catalog.py - metadata capture and indexed search over the `files` collection
+import re
+import json
+import base64
+import hashlib
+import mimetypes
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from bson.objectid import ObjectId
+
+from db import db
+
+# leading bytes -> MIME type, checked before falling back to the filename
+_MAGIC = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+]
+
+SORT_FIELDS = {"uploaded_at": "uploaded_at", "filename": "filename_lc", "size": "size"}
+MAX_PAGE_SIZE = 200
+
+
+def detect_mime(filename: str, head: bytes) -> str:
+    """
+    Best-effort MIME type from magic bytes, then the file extension.
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            if mime == "application/zip":
+                # docx/xlsx/... are zip containers; the extension is more specific
+                return mimetypes.guess_type(filename or "")[0] or mime
+            return mime
+    guessed = mimetypes.guess_type(filename or "")[0]
+    if guessed:
+        return guessed
+    try:
+        head.decode("utf-8")
+        return "text/plain"
+    except UnicodeDecodeError:
+        return "application/octet-stream"
+
+
+def parse_tags(raw: Optional[str]) -> List[str]:
+    if not raw:
+        return []
+    return sorted({t.strip().lower() for t in raw.split(",") if t.strip()})
+
+
+def make_catalog_entry(file_id: str, filename: str, uploaded_by: str, content: bytes, tags: List[str]) -> Dict[str, Any]:
+    """
+    Build the `files` document for a new upload, capturing size, type and content hash.
+    """
+    return catalog_entry(file_id, filename, uploaded_by, len(content),
+                         hashlib.sha256(content).hexdigest(), content[:64], tags)
+
+
+def catalog_entry(file_id: str, filename: str, uploaded_by: str, size: int, sha256: str,
+                  head: bytes, tags: List[str]) -> Dict[str, Any]:
+    """
+    Same as make_catalog_entry for uploads whose content was never held in one piece.
+    `head` is the first bytes of the plaintext, used for type detection.
+    """
+    return {
+        "file_id": file_id,
+        "filename": filename,
+        "filename_lc": (filename or "").lower(),
+        "uploaded_by": uploaded_by,
+        "uploaded_at": datetime.utcnow(),
+        "size": size,
+        "mime_type": detect_mime(filename, head),
+        "sha256": sha256,
+        "tags": tags,
+    }
+
+
+def with_defaults(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fill catalog fields for records uploaded before metadata was captured.
+    """
+    doc["_id"] = str(doc["_id"])
+    if not doc.get("mime_type"):
+        doc["mime_type"] = mimetypes.guess_type(doc.get("filename") or "")[0] or "application/octet-stream"
+    doc.setdefault("tags", [])
+    return doc
+
+
+# ---------------------------------------------------------------------
+# Keyset pagination
+# ---------------------------------------------------------------------
+def encode_cursor(value, oid) -> str:
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    raw = json.dumps({"v": value, "id": str(oid)}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    value = data["v"]
+    if isinstance(value, dict) and "$date" in value:
+        value = datetime.fromisoformat(value["$date"])
+    return value, data["id"]
+
+
+def build_search_query(
+    q: Optional[str] = None,
+    uploaded_by: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    tag: Optional[str] = None,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    uploaded_from: Optional[datetime] = None,
+    uploaded_to: Optional[datetime] = None,
+    integrity: Optional[str] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if q:
+        # anchored, case-folded prefix so the filename_lc index is used
+        query["filename_lc"] = {"$regex": "^" + re.escape(q.lower())}
+    if uploaded_by:
+        query["uploaded_by"] = uploaded_by
+    if mime_type:
+        if mime_type.endswith("/"):
+            query["mime_type"] = {"$regex": "^" + re.escape(mime_type)}
+        else:
+            query["mime_type"] = mime_type
+    if tag:
+        query["tags"] = tag.lower()
+    if min_size is not None or max_size is not None:
+        query["size"] = {}
+        if min_size is not None:
+            query["size"]["$gte"] = min_size
+        if max_size is not None:
+            query["size"]["$lte"] = max_size
+    if uploaded_from or uploaded_to:
+        query["uploaded_at"] = {}
+        if uploaded_from:
+            query["uploaded_at"]["$gte"] = uploaded_from
+        if uploaded_to:
+            query["uploaded_at"]["$lt"] = uploaded_to
+    if integrity:
+        query["integrity.status"] = integrity
+    return query
+
+
+def apply_cursor(query: Dict[str, Any], field: str, descending: bool, cursor: str) -> Dict[str, Any]:
+    """
+    Keyset predicate for the rows after `cursor`. Records from before a field
+    existed (no `size` on legacy uploads) hold null, which Mongo sorts before
+    every value, and which no $gt / $lt comparison matches, so the null block
+    is handled explicitly.
+    """
+    value, oid = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    same = {field: value, "_id": {op: ObjectId(oid)}}
+    if value is None:
+        # ascending: every valued row comes after the nulls; descending: nothing does
+        branches = [same, {field: {"$ne": None}}] if not descending else [same]
+    else:
+        branches = [{field: {op: value}}, same]
+        if descending:
+            branches.append({field: None})
+    after = {"$or": branches}
+    return {"$and": [query, after]} if query else after
+
+
+async def ensure_indexes():
+    await db["files"].create_index("file_id")
+    await db["files"].create_index([("filename_lc", 1), ("_id", 1)])
+    await db["files"].create_index([("uploaded_at", -1), ("_id", -1)])
+    await db["files"].create_index([("size", 1), ("_id", 1)])
+    await db["files"].create_index([("uploaded_by", 1), ("uploaded_at", -1)])
+    await db["files"].create_index("mime_type")
+    await db["files"].create_index("tags")
+    await db["files"].create_index("sha256")
+    # backfill the search key on records created before it existed
+    await db["files"].update_many(
+        {"filename_lc": {"$exists": False}},
+        [{"$set": {"filename_lc": {"$toLower": "$filename"}}}]
+    )
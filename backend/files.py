@@ -1,49 +1,135 @@
 # files.py - GridFS encrypt/decrypt helpers (Fernet)
 # Rewritten to avoid import-time failures and give clear runtime errors.
-import os
-from typing import Tuple
-from dotenv import load_dotenv
+#
+# Two blob layouts exist in GridFS:
+#  - legacy: one Fernet token (base64) over the whole file
+#  - "fseg1": the plaintext split into SEGMENT_SIZE pieces, each encrypted as its own
+#    Fernet token and stored as raw (base64-decoded) bytes back to back. Every full
+#    segment has the same ciphertext length, so segment i starts at i * enc_len(SEGMENT_SIZE)
+#    and ranged reads or chunked uploads only touch the segments they need.
+import re
+import hmac
+import base64
+import hashlib
+import time
+from typing import Tuple, Optional, List, Iterable, Callable, Awaitable, AsyncIterator
 from cryptography.fernet import Fernet, InvalidToken
 from db import db
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from bson.objectid import ObjectId
 
-load_dotenv()
+from metrics import record_crypto
+from config import settings
+from segment_cache import segment_cache
+
+SEGMENT_FORMAT = "fseg1"
+SEGMENT_SIZE = 1024 * 1024
+
+_fernet: Optional[Fernet] = None
 
 def _get_fernet() -> Fernet:
     """
-    Lazily obtain a Fernet instance. Raises RuntimeError if FERNET_KEY is not configured.
+    The Fernet instance for FERNET_KEY, built on first use and then reused.
+    Raises RuntimeError if FERNET_KEY is not configured.
+    """
+    global _fernet
+    if _fernet is None:
+        _fernet = Fernet(settings.fernet_key_bytes)
+    return _fernet
+
+# ---------------------------------------------------------------------
+# Segment layout
+# ---------------------------------------------------------------------
+def enc_len(plain_len: int) -> int:
+    """
+    Raw Fernet token length for a plaintext of plain_len bytes:
+    version(1) + timestamp(8) + IV(16) + AES-CBC ciphertext (PKCS7 padded) + HMAC(32).
+    """
+    return 57 + (plain_len // 16 + 1) * 16
+
+def segment_count(plain_size: int, segment_size: int = SEGMENT_SIZE) -> int:
+    return max(1, -(-plain_size // segment_size))
+
+def segment_bounds(index: int, plain_size: int, segment_size: int = SEGMENT_SIZE) -> Tuple[int, int]:
+    """
+    (ciphertext offset, ciphertext length) of segment `index`.
+    """
+    plain_len = min(segment_size, plain_size - index * segment_size)
+    return index * enc_len(segment_size), enc_len(max(plain_len, 0))
+
+def encrypt_segments(content: bytes, fernet: Fernet = None, segment_size: int = SEGMENT_SIZE) -> bytes:
+    """
+    Encrypt content as consecutive fixed-size segments (raw token bytes).
+    An empty input still produces one (empty) segment.
+    """
+    fernet = fernet or _get_fernet()
+    start = time.perf_counter()
+    parts = []
+    for off in range(0, max(len(content), 1), segment_size):
+        token = fernet.encrypt(content[off:off + segment_size])
+        parts.append(base64.urlsafe_b64decode(token))
+    record_crypto("encrypt", len(content), time.perf_counter() - start)
+    return b"".join(parts)
+
+def decrypt_segment(raw: bytes, fernet: Fernet = None) -> bytes:
+    fernet = fernet or _get_fernet()
+    return fernet.decrypt(base64.urlsafe_b64encode(raw))
+
+def decrypt_segments(raw: bytes, plain_size: int, first_index: int = 0,
+                     fernet: Fernet = None, segment_size: int = SEGMENT_SIZE) -> List[bytes]:
+    """
+    Split a run of consecutive segments starting at `first_index` and decrypt each.
+    """
+    fernet = fernet or _get_fernet()
+    start = time.perf_counter()
+    out = []
+    pos = 0
+    index = first_index
+    while pos < len(raw):
+        _, length = segment_bounds(index, plain_size, segment_size)
+        out.append(decrypt_segment(raw[pos:pos + length], fernet))
+        pos += length
+        index += 1
+    record_crypto("decrypt", sum(len(p) for p in out), time.perf_counter() - start)
+    return out
+
+def signing_key() -> bytes:
+    """
+    HMAC half of FERNET_KEY (the first 16 bytes), for checking tokens without decrypting.
     """
-    key = os.getenv("FERNET_KEY")
-    if not key:
-        raise RuntimeError(
-            "FERNET_KEY is not set in the environment. "
-            "Generate one with: python -c \"from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())\" "
-            "and add it to your .env as FERNET_KEY"
-        )
-    # ensure bytes
-    if isinstance(key, str):
-        key = key.encode()
-    return Fernet(key)
+    return base64.urlsafe_b64decode(settings.fernet_key_bytes)[:16]
 
+def token_mac_ok(raw: bytes, key: bytes) -> bool:
+    """
+    Check a raw Fernet token's framing and HMAC-SHA256 tag; nothing is decrypted.
+    """
+    if len(raw) < 73 or raw[0] != 0x80 or (len(raw) - 57) % 16:
+        return False
+    expected = hmac.new(key, raw[:-32], hashlib.sha256).digest()
+    return hmac.compare_digest(expected, raw[-32:])
+
+def segment_metadata(plain_size: int, segment_size: int = SEGMENT_SIZE) -> dict:
+    return {"format": SEGMENT_FORMAT, "segment_size": segment_size, "plain_size": plain_size}
+
+def is_segmented(metadata: Optional[dict]) -> bool:
+    return bool(metadata) and metadata.get("format") == SEGMENT_FORMAT
+
+# ---------------------------------------------------------------------
+# Store / load
+# ---------------------------------------------------------------------
 async def store_encrypted_file(filename: str, content_bytes: bytes, metadata: dict = None):
     """
-    Encrypt content_bytes with Fernet and store in GridFS.
+    Encrypt content_bytes (segmented Fernet) and store in GridFS.
     Returns the ObjectId (as a string) of the stored file.
     """
-    fernet = _get_fernet()
-    enc = fernet.encrypt(content_bytes)
+    enc = encrypt_segments(content_bytes)
     fs = AsyncIOMotorGridFSBucket(db)
-    oid = await fs.upload_from_stream(filename, enc, metadata=metadata or {})
+    meta = {**(metadata or {}), **segment_metadata(len(content_bytes))}
+    oid = await fs.upload_from_stream(filename, enc, metadata=meta)
     # oid is an ObjectId; return string representation for convenience
     return str(oid)
 
-async def get_decrypted_file(oid_value: str) -> Tuple[str, bytes]:
-    """
-    Retrieve file by ObjectId (string) from GridFS, decrypt and return (filename, bytes).
-    Raises RuntimeError if decryption fails or file not found.
-    """
-    fernet = _get_fernet()
+async def _open(oid_value: str):
     fs = AsyncIOMotorGridFSBucket(db)
     try:
         oid = ObjectId(oid_value)
@@ -51,20 +137,197 @@ async def get_decrypted_file(oid_value: str) -> Tuple[str, bytes]:
         raise RuntimeError(f"Invalid file id format: {oid_value}") from e
 
     try:
-        grid_out = await fs.open_download_stream(oid)
+        return await fs.open_download_stream(oid)
     except Exception as e:
         raise RuntimeError(f"Failed to open GridFS stream for id {oid_value}: {e}") from e
 
+async def _cached_segments(grid_out, meta: dict, first: int, last: int,
+                           fernet: Fernet = None) -> List[bytes]:
+    """
+    Decrypted segments first..last of a segmented blob. Ciphertext comes from the
+    segment cache where present; each run of missing segments is read from GridFS
+    with one seek + read and cached once it has decrypted (so authenticated).
+    """
+    fernet = fernet or _get_fernet()
+    seg_size, plain_size = meta["segment_size"], meta["plain_size"]
+    blob = str(grid_out._id)
+    raws: List[Optional[bytes]] = [segment_cache.get(blob, i) for i in range(first, last + 1)]
+    fetched = []
+    i = first
+    while i <= last:
+        if raws[i - first] is not None:
+            i += 1
+            continue
+        j = i
+        while j < last and raws[j + 1 - first] is None:
+            j += 1
+        offset, _ = segment_bounds(i, plain_size, seg_size)
+        end_off, end_len = segment_bounds(j, plain_size, seg_size)
+        grid_out.seek(offset)
+        run = await grid_out.read(end_off + end_len - offset)
+        pos = 0
+        for k in range(i, j + 1):
+            _, length = segment_bounds(k, plain_size, seg_size)
+            raws[k - first] = run[pos:pos + length]
+            pos += length
+            fetched.append(k)
+        i = j + 1
+
+    start = time.perf_counter()
+    plain = [decrypt_segment(raw, fernet) for raw in raws]
+    record_crypto("decrypt", sum(len(p) for p in plain), time.perf_counter() - start)
+    for k in fetched:
+        segment_cache.put(blob, k, raws[k - first])
+    return plain
+
+async def get_decrypted_file(oid_value: str) -> Tuple[str, bytes]:
+    """
+    Retrieve file by ObjectId (string) from GridFS, decrypt and return (filename, bytes).
+    Raises RuntimeError if decryption fails or file not found.
+    """
+    fernet = _get_fernet()
+    grid_out = await _open(oid_value)
+    meta = grid_out.metadata or {}
+
+    if is_segmented(meta):
+        last = segment_count(meta["plain_size"], meta["segment_size"]) - 1
+        try:
+            dec = b"".join(await _cached_segments(grid_out, meta, 0, last, fernet))
+        except InvalidToken as e:
+            raise RuntimeError("Decryption failed. Is FERNET_KEY correct for this file?") from e
+        except Exception as e:
+            raise RuntimeError(f"Failed to read or decrypt GridFS stream for id {oid_value}: {e}") from e
+        return grid_out.filename, dec
+
     try:
         data = await grid_out.read()
     except Exception as e:
         raise RuntimeError(f"Failed to read GridFS stream for id {oid_value}: {e}") from e
 
+    # legacy whole-file token (not cached)
     try:
+        start = time.perf_counter()
         dec = fernet.decrypt(data)
+        record_crypto("decrypt", len(dec), time.perf_counter() - start)
     except InvalidToken as e:
         raise RuntimeError("Decryption failed. Is FERNET_KEY correct for this file?") from e
     except Exception as e:
         raise RuntimeError(f"Unexpected decryption error: {e}") from e
 
     return grid_out.filename, dec
+
+
+# ---------------------------------------------------------------------
+# Ranged reads (used by ticketed GET downloads)
+# ---------------------------------------------------------------------
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=a-b` header into an inclusive (start, end).
+    Returns None when there is no usable header (serve the whole file) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+    else:
+        # suffix range: last N bytes
+        start = max(size - int(m.group(2)), 0)
+        end = size - 1
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+async def open_stored_file(oid_value: str):
+    """
+    GridFS stream of a stored file, for callers that check its layout
+    (is_segmented(grid_out.metadata)) before choosing how to read it.
+    Raises RuntimeError if the id is malformed or the blob is missing.
+    """
+    return await _open(oid_value)
+
+async def iter_plaintext_range(grid_out, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Decrypted bytes [start, end] (inclusive) of a segmented blob, yielded one
+    segment at a time through the segment cache, so a download holds at most
+    one segment of plaintext however large the file.
+    """
+    meta = grid_out.metadata
+    seg_size = meta["segment_size"]
+    fernet = _get_fernet()
+    for index in range(start // seg_size, end // seg_size + 1):
+        try:
+            plain = (await _cached_segments(grid_out, meta, index, index, fernet))[0]
+        except InvalidToken as e:
+            raise RuntimeError("Decryption failed. Is FERNET_KEY correct for this file?") from e
+        base = index * seg_size
+        yield plain[max(start - base, 0):end - base + 1]
+
+async def read_plaintext_range(oid_value: str, start: int, end: int) -> bytes:
+    """
+    Decrypted bytes [start, end] (inclusive). Segmented blobs decrypt only the
+    overlapping segments (from the segment cache or GridFS); legacy whole-file
+    tokens are decrypted and sliced.
+    """
+    grid_out = await _open(oid_value)
+    meta = grid_out.metadata or {}
+    if not is_segmented(meta):
+        _, data = await get_decrypted_file(oid_value)
+        return data[start:end + 1]
+
+    seg_size = meta["segment_size"]
+    first, last = start // seg_size, end // seg_size
+    try:
+        plain = b"".join(await _cached_segments(grid_out, meta, first, last))
+    except InvalidToken as e:
+        raise RuntimeError("Decryption failed. Is FERNET_KEY correct for this file?") from e
+    base = first * seg_size
+    return plain[start - base:end - base + 1]
+
+# ---------------------------------------------------------------------
+# Assembling pre-encrypted parts (chunked uploads)
+# ---------------------------------------------------------------------
+async def store_encrypted_blob(filename: str, encrypted: bytes, metadata: dict = None) -> ObjectId:
+    fs = AsyncIOMotorGridFSBucket(db)
+    return await fs.upload_from_stream(filename, encrypted, metadata=metadata or {})
+
+async def read_blob(oid: ObjectId) -> bytes:
+    fs = AsyncIOMotorGridFSBucket(db)
+    grid_out = await fs.open_download_stream(oid)
+    return await grid_out.read()
+
+async def delete_blobs(oids: Iterable[ObjectId]):
+    fs = AsyncIOMotorGridFSBucket(db)
+    for oid in oids:
+        segment_cache.invalidate(str(oid))
+        try:
+            await fs.delete(oid)
+        except Exception:
+            pass
+
+async def concat_blobs(filename: str, parts: List[ObjectId], metadata: dict,
+                       visit: Optional[Callable[[int, bytes], Awaitable[None]]] = None) -> ObjectId:
+    """
+    Write the given blobs back to back into one new GridFS file, one part in memory
+    at a time. `visit(index, raw)` is awaited for each part before it is written.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    stream = fs.open_upload_stream(filename, metadata=metadata)
+    try:
+        for i, oid in enumerate(parts):
+            raw = await read_blob(oid)
+            if visit:
+                await visit(i, raw)
+            await stream.write(raw)
+    except Exception:
+        await stream.abort()
+        raise
+    await stream.close()
+    return stream._id
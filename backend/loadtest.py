@@ -0,0 +1,454 @@
+# loadtest.py - in-process load test for the whole API, with baseline comparison
+"""
+Usage:
+    python loadtest.py --in-memory                       # mongomock-motor, no services
+    python loadtest.py --mongo-uri mongodb://localhost:27017/geocrypt_loadtest
+    python loadtest.py --in-memory --out run.json --baseline baseline.json
+
+The app runs in this process (lifespan included) and is driven through
+httpx's ASGI transport, so no server, SMTP account or network is needed:
+OTP mails are captured by an outbox that replaces main.send_email. Use a
+local mongod for numbers that mean anything; --in-memory (mongomock-motor
+plus an in-memory GridFS bucket) is for checking the flows and for
+relative comparisons on one machine. The --mongo-uri database must be a
+throwaway one (name ending in "_loadtest"); it is dropped before seeding.
+
+Scenarios run one after another, each for --iterations rounds spread over
+--concurrency workers; every worker acts as its own employee. Per
+operation the JSON report holds count, errors, p50/p95/p99/mean latency
+(ms) and throughput (req/s), plus peak RSS. With --baseline, operations
+whose p95 grew or whose throughput fell by more than --threshold are
+reported and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Callable, Awaitable, Optional
+
+KB = 1024
+MB = 1024 * KB
+DEFAULT_SIZES = "16KB,1MB,8MB"
+EMPLOYEE_PASSWORD = "LoadTest-Pass-1"
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, mult in (("GB", 1024 * MB), ("MB", MB), ("KB", KB), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * mult)
+    return int(text)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (MB if sys.platform == "darwin" else KB), 1)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# ---------------------------------------------------------------------
+# Environment: configured before any backend module is imported
+# ---------------------------------------------------------------------
+def configure_env(args):
+    os.environ["MONGO_URI"] = args.mongo_uri or "mongodb://localhost:27017/geocrypt_loadtest"
+    os.environ["BOOTSTRAP_ADMIN_EMAIL"] = "loadtest-admin@example.com"
+    os.environ["BOOTSTRAP_ADMIN_PASSWORD"] = EMPLOYEE_PASSWORD
+    # the policy checks still run; the window just never denies
+    os.environ["WORKDAY_START"] = "00:00"
+    os.environ["WORKDAY_END"] = "23:59"
+    os.environ["SMTP_USER"] = "loadtest"
+    os.environ["SMTP_PASS"] = "loadtest"
+    os.environ["PROFILE_SAMPLE_RATE"] = "0"
+    os.environ["PROFILE_ON_HEADER"] = "0"
+
+
+class MemoryGridOut:
+    def __init__(self, oid, blob: Dict[str, Any]):
+        self._id = oid
+        self.filename = blob["filename"]
+        self.metadata = blob["metadata"]
+        self.upload_date = blob["upload_date"]
+        self._data = blob["data"]
+        self.length = len(self._data)
+        self._pos = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        end = self.length if size is None or size < 0 else self._pos + size
+        data = self._data[self._pos:end]
+        self._pos += len(data)
+        return data
+
+    async def readchunk(self) -> bytes:
+        return await self.read(255 * KB)
+
+    def seek(self, pos: int, whence: int = 0):
+        self._pos = pos if whence == 0 else (self._pos + pos if whence == 1 else self.length + pos)
+
+    def tell(self) -> int:
+        return self._pos
+
+    async def close(self):
+        pass
+
+
+class MemoryGridIn:
+    def __init__(self, blobs, oid, filename: str, metadata: dict):
+        self._blobs, self._id, self.filename, self.metadata = blobs, oid, filename, metadata
+        self._buf = bytearray()
+
+    async def write(self, data: bytes):
+        self._buf += data
+
+    async def close(self):
+        self._blobs[self._id] = {"filename": self.filename, "metadata": self.metadata,
+                                 "data": bytes(self._buf), "upload_date": datetime.utcnow()}
+
+    async def abort(self):
+        self._buf = bytearray()
+
+
+class MemoryGridFSBucket:
+    """
+    The parts of AsyncIOMotorGridFSBucket the backend uses, kept in a dict
+    (mongomock-motor has no GridFS).
+    """
+    blobs: Dict[Any, Dict[str, Any]] = {}
+
+    def __init__(self, database=None, *args, **kwargs):
+        pass
+
+    async def upload_from_stream(self, filename: str, source, metadata: dict = None, **kwargs):
+        stream = self.open_upload_stream(filename, metadata=metadata)
+        await stream.write(source if isinstance(source, (bytes, bytearray)) else source.read())
+        await stream.close()
+        return stream._id
+
+    def open_upload_stream(self, filename: str, metadata: dict = None, **kwargs):
+        from bson import ObjectId
+        return MemoryGridIn(self.blobs, ObjectId(), filename, metadata or {})
+
+    async def open_download_stream(self, oid):
+        from gridfs.errors import NoFile
+        if oid not in self.blobs:
+            raise NoFile(f"no file with _id {oid}")
+        return MemoryGridOut(oid, self.blobs[oid])
+
+    async def delete(self, oid):
+        from gridfs.errors import NoFile
+        if self.blobs.pop(oid, None) is None:
+            raise NoFile(f"no file with _id {oid}")
+
+
+def load_app(args):
+    """
+    Import the app. In --in-memory mode the Motor client and the GridFS
+    bucket are swapped before the modules that bind them are imported.
+    """
+    configure_env(args)
+    import db as db_module
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--in-memory needs mongomock-motor (pip install mongomock-motor)")
+        import motor.motor_asyncio
+        db_module.client = AsyncMongoMockClient()
+        db_module.db = db_module.client["geocrypt_loadtest"]
+        db_module.analytics_db = db_module.db
+        motor.motor_asyncio.AsyncIOMotorGridFSBucket = MemoryGridFSBucket
+    elif not db_module.db.name.endswith("_loadtest"):
+        sys.exit(f"refusing to drop database {db_module.db.name!r}; use a name ending in _loadtest")
+    import main
+    return main, db_module
+
+
+# ---------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.windows: Dict[str, List[float]] = {}
+
+    async def timed(self, op: str, call: Awaitable, expect: int = 200):
+        start = time.perf_counter()
+        resp = await call
+        end = time.perf_counter()
+        self.latencies.setdefault(op, []).append(end - start)
+        window = self.windows.setdefault(op, [start, end])
+        window[0], window[1] = min(window[0], start), max(window[1], end)
+        if resp.status_code != expect:
+            self.errors[op] = self.errors.get(op, 0) + 1
+            if self.errors[op] == 1:
+                print(f"  {op}: HTTP {resp.status_code} {resp.text[:200]}")
+        return resp
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for op, values in self.latencies.items():
+            values = sorted(values)
+            wall = self.windows[op][1] - self.windows[op][0]
+            out[op] = {
+                "count": len(values),
+                "errors": self.errors.get(op, 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "throughput_rps": round(len(values) / wall, 2) if wall > 0 else 0.0,
+            }
+        return out
+
+
+class Outbox:
+    """
+    SMTP stand-in: keeps the last OTP mailed to each address.
+    """
+
+    def __init__(self):
+        self.codes: Dict[str, str] = {}
+
+    def send_email(self, to_email: str, subject: str, body: str):
+        self.codes[to_email] = body.rsplit(":", 1)[-1].strip()
+
+
+# ---------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------
+class Harness:
+    def __init__(self, args, main, db_module, client, outbox: Outbox):
+        self.args = args
+        self.main = main
+        self.db = db_module.db
+        self.client = client
+        self.outbox = outbox
+        self.rec = Recorder()
+        self.admin: Dict[str, str] = {}
+        self.employees: List[Dict[str, str]] = []
+        self.files: Dict[str, str] = {}  # size label -> file_id
+        self.lat = float(os.getenv("GEOFENCE_CENTER_LAT", "9.35866726100274"))
+        self.lon = float(os.getenv("GEOFENCE_CENTER_LON", "76.67729687183018"))
+
+    async def login(self, email: str, password: str, op_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Password + OTP login; returns the verify-otp body (access and refresh token) or {}.
+        """
+        async def call(op, coro):
+            return await (self.rec.timed(op, coro) if op_prefix else coro)
+
+        await call(f"{op_prefix}_request_otp", self.client.post("/auth/login", json={"email": email, "password": password}))
+        code = self.outbox.codes.get(email, "")
+        resp = await call(f"{op_prefix}_verify_otp",
+                          self.client.post("/auth/verify-otp", data={"email": email, "code": code},
+                                           headers={"X-Device-Id": f"loadtest-{email}"}))
+        return resp.json() if resp.status_code == 200 else {}
+
+    async def seed(self):
+        token = (await self.login(os.environ["BOOTSTRAP_ADMIN_EMAIL"], EMPLOYEE_PASSWORD)).get("access_token")
+        if not token:
+            sys.exit("admin login failed during seeding")
+        self.admin = {"Authorization": f"Bearer {token}"}
+        for i in range(self.args.concurrency):
+            email = f"loadtest-{i}@example.com"
+            await self.client.post("/admin/create-employee", headers=self.admin,
+                                   json={"email": email, "password": EMPLOYEE_PASSWORD, "name": f"Load {i}"})
+            session = await self.login(email, EMPLOYEE_PASSWORD)
+            self.employees.append({"email": email, "token": session.get("access_token", ""),
+                                   "refresh_token": session.get("refresh_token", "")})
+        rng = random.Random(self.args.seed)
+        for label in self.args.sizes.split(","):
+            content = rng.randbytes(parse_size(label))
+            resp = await self.client.post("/admin/upload-file", headers=self.admin,
+                                          files={"file": (f"loadtest-{label}.bin", content)})
+            self.files[label.strip()] = resp.json()["file_id"]
+
+    def auth(self, worker: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.employees[worker]['token']}"}
+
+    async def run(self, name: str, step: Callable[[int], Awaitable[None]]):
+        """
+        Run `step(worker)` --iterations times across --concurrency workers.
+        """
+        remaining = [self.args.iterations]
+
+        async def worker(w: int):
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                await step(w)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(self.args.concurrency)))
+        print(f"{name}: {self.args.iterations} iterations in {time.perf_counter() - start:.2f}s, "
+              f"peak RSS {peak_rss_mb()} MB")
+
+    async def scenarios(self):
+        async def login(w):
+            await self.login(self.employees[w]["email"], EMPLOYEE_PASSWORD, "login")
+
+        async def me(w):
+            await self.rec.timed("auth_me", self.client.get("/auth/me", headers=self.auth(w)))
+
+        async def refresh(w):
+            # what replaces `login` when an access token expires; each worker rotates its own token
+            employee = self.employees[w]
+            resp = await self.rec.timed("auth_refresh", self.client.post(
+                "/auth/refresh", json={"refresh_token": employee["refresh_token"]},
+                headers={"X-Device-Id": f"loadtest-{employee['email']}"}))
+            if resp.status_code == 200:
+                employee["token"] = resp.json()["access_token"]
+                employee["refresh_token"] = resp.json()["refresh_token"]
+
+        def download(label: str, file_id: str):
+            async def step(w):
+                data = {"file_id": file_id, "lat": str(self.lat), "lon": str(self.lon),
+                        "client_network_hint": os.getenv("ALLOWED_WIFI_SSID", "")}
+                await self.rec.timed(f"download_{label}", self.client.post(
+                    "/employee/request-and-download", data=data, headers=self.auth(w)))
+            return step
+
+        async def admin_lists(w):
+            for path in ("/admin/employees", "/admin/files", "/admin/logs", "/admin/wfh_requests"):
+                await self.rec.timed("admin" + path.replace("/admin", "").replace("/", "_"),
+                                     self.client.get(path, headers=self.admin))
+
+        async def wfh(w):
+            start = datetime.utcnow()
+            payload = {"start_date": start.strftime("%Y-%m-%d %H:%M:%S"),
+                       "end_date": (start + timedelta(hours=8)).strftime("%Y-%m-%d %H:%M:%S"),
+                       "reason": "load test"}
+            email = self.employees[w]["email"]
+            await self.rec.timed("wfh_request", self.client.post(
+                "/employee/request-wfh", json=payload, headers=self.auth(w)))
+            # looked up directly (untimed) like an admin picking it from the list
+            req = await self.db["wfh_requests"].find_one({"requested_by": email, "status": "pending"},
+                                                          sort=[("created_at", -1)])
+            if req:
+                await self.rec.timed("wfh_approve", self.client.post(
+                    "/admin/approve-wfh", data={"request_id": str(req["_id"])}, headers=self.admin))
+
+        await self.run("login", login)
+        await self.run("auth_refresh", refresh)
+        await self.run("auth_me", me)
+        for label, file_id in self.files.items():
+            await self.run(f"download_{label}", download(label, file_id))
+        await self.run("admin_lists", admin_lists)
+        # last: approved WFH switches the employees' downloads to the bypass path
+        await self.run("wfh", wfh)
+
+
+# ---------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    problems = []
+    for op, base in baseline.get("operations", {}).items():
+        cur = current["operations"].get(op)
+        if cur is None:
+            problems.append(f"{op}: missing from this run")
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            problems.append(f"{op}: p95 {base['p95_ms']} -> {cur['p95_ms']} ms")
+        if base["throughput_rps"] and cur["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            problems.append(f"{op}: throughput {base['throughput_rps']} -> {cur['throughput_rps']} req/s")
+        if cur["errors"] > base["errors"]:
+            problems.append(f"{op}: errors {base['errors']} -> {cur['errors']}")
+    if current["peak_rss_mb"] > baseline.get("peak_rss_mb", float("inf")) * (1 + threshold):
+        problems.append(f"peak RSS {baseline['peak_rss_mb']} -> {current['peak_rss_mb']} MB")
+    return problems
+
+
+async def run_load(args) -> Dict[str, Any]:
+    import httpx
+
+    main, db_module = load_app(args)
+    from segment_cache import segment_cache
+    outbox = Outbox()
+    main.send_email = outbox.send_email
+    if not args.in_memory:
+        await db_module.client.drop_database(db_module.db.name)
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            harness = Harness(args, main, db_module, client, outbox)
+            await harness.seed()
+            started = time.perf_counter()
+            await harness.scenarios()
+            elapsed = time.perf_counter() - started
+
+    return {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "store": "in-memory" if args.in_memory else "mongod",
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+            "sizes": args.sizes,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "operations": harness.rec.report(),
+        "segment_cache": segment_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process load test for the Geocrypt API")
+    store = parser.add_mutually_exclusive_group(required=True)
+    store.add_argument("--mongo-uri", help="local mongod; database name must end in _loadtest (it is dropped)")
+    store.add_argument("--in-memory", action="store_true", help="mongomock-motor + in-memory GridFS")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=200, help="requests rounds per scenario")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="download file sizes, e.g. 16KB,1MB,8MB")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="loadtest-results.json")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args))
+    with open(args.out, "w") as fh:
+        json.dump(result, fh, indent=2)
+    print(f"\n{'operation':<28}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for op, s in result["operations"].items():
+        print(f"{op:<28}{s['count']:>7}{s['errors']:>5}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}"
+              f"{s['throughput_rps']:>10}")
+    cache = result["segment_cache"]
+    print(f"segment cache: hit ratio {cache['hit_ratio']}, {cache['bytes_served_from_cache'] / MB:.1f} MB from cache, "
+          f"{cache['bytes_read_from_mongo'] / MB:.1f} MB from GridFS")
+    print(f"peak RSS {result['peak_rss_mb']} MB, results in {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            problems = compare(result, json.load(fh), args.threshold)
+        if problems:
+            print(f"\nregressions beyond {args.threshold:.0%} against {args.baseline}:")
+            for p in problems:
+                print(f"  {p}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# log_archive.py - tiered retention for the `logs` collection
+"""
+Events older than LOG_RETENTION_DAYS are moved out of Mongo into compressed,
+day-partitioned JSONL segments under LOG_ARCHIVE_DIR. Every segment gets an
+entry in `index.json` (time range, count, emails present) so readers only open
+segments that can match a query.
+
+Archived events are always older than anything left in the hot collection,
+so a newest-first query reads Mongo first and only falls through to the
+archive when it needs more rows. Within Mongo, compact events come before
+old-style ones that log_migration has not rewritten yet (see there). Segments
+hold events in the API shape; gzip already removes the repeated keys.
+"""
+import os
+import json
+import gzip
+import fcntl
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+from bson.objectid import ObjectId
+
+from db import db, reader
+from config import settings
+from audit import expand_events, actor_id
+from log_migration import legacy_pending
+from scheduler import take_lock, release_lock
+
+
+LOG_ARCHIVE_DIR = settings.log_archive_dir
+LOG_RETENTION_DAYS = settings.log_retention_days
+ARCHIVE_BATCH_SIZE = 5000
+# cross-worker lock held (and renewed per batch) while an archive run moves events
+ARCHIVE_LOCK_SECONDS = 600
+
+_INDEX_NAME = "index.json"
+_LOCK_NAME = "log_archive:run"
+
+# older `updated_employee` events stored the new password hash in `changes`;
+# it is kept out of every read of old-style events (list, export, archive)
+REDACT_PROJECTION = {"changes.hashed_password": 0}
+_archive_lock = asyncio.Lock()
+_index_cache: Dict[str, Any] = {"mtime": None, "segments": []}
+
+
+# ---------------------------------------------------------------------
+# Encoding helpers (datetimes survive the round trip, ObjectIds become str)
+# ---------------------------------------------------------------------
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"not JSON serializable: {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def redact(doc: Dict[str, Any]) -> Dict[str, Any]:
+    changes = doc.get("changes")
+    if isinstance(changes, dict):
+        changes.pop("hashed_password", None)
+    return doc
+
+
+# ---------------------------------------------------------------------
+# Segment index
+# ---------------------------------------------------------------------
+def _index_path() -> str:
+    return os.path.join(LOG_ARCHIVE_DIR, _INDEX_NAME)
+
+
+def _load_index() -> List[Dict[str, Any]]:
+    """
+    Return the segment list, re-reading index.json only when it changed on disk.
+    """
+    path = _index_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+    if _index_cache["mtime"] != mtime:
+        _index_cache["segments"] = _read_index_file(path)
+        _index_cache["mtime"] = mtime
+    return _index_cache["segments"]
+
+
+def _read_index_file(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            raw = json.load(fh)
+    except FileNotFoundError:
+        return []
+    for seg in raw:
+        seg["start"] = datetime.fromisoformat(seg["start"])
+        seg["end"] = datetime.fromisoformat(seg["end"])
+    return raw
+
+
+def _save_index(segments: List[Dict[str, Any]]):
+    path = _index_path()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    serializable = [
+        {**seg, "start": seg["start"].isoformat(), "end": seg["end"].isoformat()}
+        for seg in segments
+    ]
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(serializable, fh)
+    os.replace(tmp, path)
+
+
+def _write_segment(day: str, run_tag: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Write one gzip JSONL segment for a single UTC day and return its index entry.
+    """
+    name = f"logs-{day}-{run_tag}.jsonl.gz"
+    path = os.path.join(LOG_ARCHIVE_DIR, name)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        for doc in docs:
+            fh.write(json.dumps(doc, default=_json_default))
+            fh.write("\n")
+    os.replace(tmp, path)
+    return {
+        "name": name,
+        "start": min(d["time"] for d in docs),
+        "end": max(d["time"] for d in docs),
+        "count": len(docs),
+        "emails": sorted({d["email"] for d in docs if d.get("email")}),
+    }
+
+
+def _read_segment(name: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(os.path.join(LOG_ARCHIVE_DIR, name), "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line, object_hook=_json_object_hook)
+
+
+def _persist_batch(docs: List[Dict[str, Any]]) -> int:
+    """
+    Partition docs by UTC day, write a segment per day and register them in the index.
+    Runs in a worker thread.
+    """
+    os.makedirs(LOG_ARCHIVE_DIR, exist_ok=True)
+    run_tag = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for doc in docs:
+        by_day.setdefault(doc["time"].strftime("%Y%m%d"), []).append(doc)
+
+    written = [_write_segment(day, run_tag, group) for day, group in sorted(by_day.items())]
+    # read-modify-write of index.json under a file lock, from the file itself rather than the cache
+    with open(_index_path() + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            _save_index(_read_index_file(_index_path()) + written)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return len(by_day)
+
+
+# ---------------------------------------------------------------------
+# Archiving
+# ---------------------------------------------------------------------
+async def archive_old_logs(retention_days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Move events older than the retention horizon from Mongo into archive segments.
+    Segments and the index are written before the source documents are deleted,
+    so an interrupted run never loses events. One run at a time across all
+    workers; a call while another runs returns {"skipped": ...}.
+    """
+    days = LOG_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archived = 0
+    segments_written = 0
+
+    async with _archive_lock:
+        if not await take_lock(_LOCK_NAME, ARCHIVE_LOCK_SECONDS):
+            return {"skipped": "an archive run is in progress on another worker"}
+        try:
+            # old-style events are the oldest left in Mongo, so they go first; once
+            # log_migration has dropped their `time` index the query would scan
+            tiers = [("t", None)]
+            if await legacy_pending():
+                tiers.insert(0, ("time", REDACT_PROJECTION))
+            for field, projection in tiers:
+                while True:
+                    docs = await db["logs"].find({field: {"$lt": cutoff}}, projection) \
+                        .sort(field, 1).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+                    if not docs:
+                        break
+                    expanded = await expand_events(docs)
+                    segments_written += await asyncio.to_thread(_persist_batch, expanded)
+                    await db["logs"].delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+                    archived += len(docs)
+                    if not await take_lock(_LOCK_NAME, ARCHIVE_LOCK_SECONDS):
+                        raise RuntimeError("archive lock expired and was taken by another worker")
+        finally:
+            await release_lock(_LOCK_NAME)
+
+    return {"archived": archived, "segments_written": segments_written, "cutoff": cutoff}
+
+
+# ---------------------------------------------------------------------
+# Reading across hot collection + archive
+# ---------------------------------------------------------------------
+def _segment_matches(seg, email, since, until) -> bool:
+    if email and email not in seg["emails"]:
+        return False
+    if since and seg["end"] < since:
+        return False
+    if until and seg["start"] >= until:
+        return False
+    return True
+
+
+def _doc_matches(doc, email, since, until) -> bool:
+    if email and doc.get("email") != email:
+        return False
+    t = doc.get("time")
+    if since and t < since:
+        return False
+    if until and t >= until:
+        return False
+    return True
+
+
+def _read_archive_newest(email, since, until, limit: int) -> List[Dict[str, Any]]:
+    """
+    Newest-first read of at most `limit` archived events. Segments are visited
+    by descending end time and reading stops once no remaining segment can hold
+    anything newer than the current limit-th result.
+    """
+    found: List[Dict[str, Any]] = []
+    for seg in _archive_candidates(email, since, until):
+        if len(found) >= limit and seg["end"] < found[limit - 1]["time"]:
+            break
+        found.extend(d for d in _read_segment(seg["name"]) if _doc_matches(d, email, since, until))
+        found.sort(key=lambda d: d["time"], reverse=True)
+    return found[:limit]
+
+
+def _archive_candidates(email, since, until) -> List[Dict[str, Any]]:
+    return sorted(
+        (s for s in _load_index() if _segment_matches(s, email, since, until)),
+        key=lambda s: s["end"],
+        reverse=True,
+    )
+
+
+def _read_segment_matches(name: str, email, since, until) -> List[Dict[str, Any]]:
+    docs = [d for d in _read_segment(name) if _doc_matches(d, email, since, until)]
+    docs.sort(key=lambda d: d["time"], reverse=True)
+    return docs
+
+
+def _time_range(field: str, since, until) -> Dict[str, Any]:
+    if not (since or until):
+        return {field: {"$exists": True}}
+    bounds: Dict[str, Any] = {}
+    if since:
+        bounds["$gte"] = since
+    if until:
+        bounds["$lt"] = until
+    return {field: bounds}
+
+
+def _compact_query(actor, since, until) -> Dict[str, Any]:
+    q = _time_range("t", since, until)
+    if actor:
+        q["u"] = actor
+    return q
+
+
+def _legacy_query(email, since, until) -> Dict[str, Any]:
+    q = _time_range("time", since, until)
+    if email:
+        q["email"] = email
+    return q
+
+
+async def _hot_tiers(email, since, until) -> List[Tuple[Dict[str, Any], str, Optional[Dict[str, int]]]]:
+    """
+    (query, sort field, projection) of each part of the hot collection to read, newest first.
+    Compact events are skipped for an email that was never logged.
+    """
+    tiers = []
+    actor = await actor_id(email) if email else None
+    if actor or not email:
+        tiers.append((_compact_query(actor, since, until), "t", None))
+    if await legacy_pending():
+        tiers.append((_legacy_query(email, since, until), "time", REDACT_PROJECTION))
+    return tiers
+
+
+async def query_logs(email: Optional[str] = None, limit: int = 100,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Return up to `limit` events, newest first, from Mongo and then the archive.
+    `_id` is an ObjectId for hot events and a string for archived ones; the
+    list endpoints' FastJSONResponse renders both as strings.
+    """
+    out: List[Dict[str, Any]] = []
+    for query, field, projection in await _hot_tiers(email, since, until):
+        want = limit - len(out)
+        if want <= 0:
+            break
+        docs = await reader("logs")["logs"].find(query, projection) \
+            .sort(field, -1).limit(want).to_list(want)
+        out.extend(await expand_events(docs))
+    if len(out) < limit:
+        archived = await asyncio.to_thread(_read_archive_newest, email, since, until, limit - len(out))
+        out.extend(redact(d) for d in archived)
+    return out
+
+
+async def iter_logs(email: Optional[str] = None, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None):
+    """
+    Async generator over all matching events, newest first, hot collection then archive.
+    """
+    for query, field, projection in await _hot_tiers(email, since, until):
+        cursor = reader("exports")["logs"].find(query, projection).sort(field, -1)
+        while True:
+            docs = await cursor.to_list(ARCHIVE_BATCH_SIZE)
+            if not docs:
+                break
+            for l in await expand_events(docs):
+                l["_id"] = str(l["_id"])
+                yield l
+
+    # segments are read one at a time off the event loop
+    for seg in await asyncio.to_thread(_archive_candidates, email, since, until):
+        for doc in await asyncio.to_thread(_read_segment_matches, seg["name"], email, since, until):
+            yield redact(doc)
+
+
+def encode_log_line(doc: Dict[str, Any]) -> str:
+    """
+    Serialize one event as a JSONL line for exports (datetimes as ISO strings).
+    """
+    return json.dumps(doc, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)) + "\n"
+
+
+async def ensure_indexes():
+    # the old-shape `time` / `email` indexes stay until log_migration drops them
+    await db["logs"].create_index([("t", -1)])
+    await db["logs"].create_index([("u", 1), ("t", -1)])
@@ -0,0 +1,112 @@
+# log_migration.py - online rewrite of old-style `logs` events into the compact schema
+"""
+Old events (no `v`, long field names, full emails) are rewritten in place by
+audit.compact(), in batches and newest first. That order keeps every compact
+event at least as new as every event still waiting, so readers take the
+compact events, then fall through to the old-style ones, then to the archive,
+exactly as the archive sits behind the hot collection.
+
+An old-style event is the only kind with a `time` field (compact events have
+`t`), so the walk needs no cursor: a run cut short by its timeout or a
+restart just continues with what is left. Writes are paced to
+LOG_MIGRATION_DOCS_PER_SECOND. Once nothing is left, the old `time` and
+`email` indexes are dropped and readers stop querying the old shape. Progress
+is kept in `settings`.
+"""
+import time
+import asyncio
+from datetime import datetime
+from typing import Dict, Any
+
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
+
+from db import db
+from config import settings
+from audit import compact_events
+
+
+LOG_MIGRATION_DOCS_PER_SECOND = settings.log_migration_docs_per_second
+MIGRATION_BATCH_SIZE = 500
+LEGACY_RECHECK_SECONDS = 60
+
+_STATE_ID = "log_migration"
+_LEGACY = {"time": {"$exists": True}}
+_LEGACY_INDEXES = ("time_-1", "email_1_time_-1")
+
+# per-process view of whether old-style events may still exist
+_pending: Dict[str, Any] = {"value": True, "checked_at": None}
+
+
+async def get_state() -> Dict[str, Any]:
+    return await db["settings"].find_one({"_id": _STATE_ID}) or {"_id": _STATE_ID}
+
+
+async def _save_state(update: Dict[str, Any]):
+    await db["settings"].update_one({"_id": _STATE_ID}, update, upsert=True)
+
+
+async def legacy_pending() -> bool:
+    """
+    Whether old-style events may exist, re-read at most every
+    LEGACY_RECHECK_SECONDS (also after a finish, since they can reappear).
+    """
+    now = time.monotonic()
+    if _pending["checked_at"] is None or now - _pending["checked_at"] >= LEGACY_RECHECK_SECONDS:
+        state = await get_state()
+        _pending["value"] = not state.get("finished_at")
+        _pending["checked_at"] = now
+    return _pending["value"]
+
+
+async def _drop_legacy_indexes():
+    for name in _LEGACY_INDEXES:
+        try:
+            await db["logs"].drop_index(name)
+        except OperationFailure:
+            pass
+
+
+async def migrate_logs() -> Dict[str, Any]:
+    """
+    Scheduler entry point: rewrite old-style events until none are left.
+    """
+    if LOG_MIGRATION_DOCS_PER_SECOND <= 0:
+        return {"skipped": "disabled"}
+    migrated = 0
+    started = time.monotonic()
+    while True:
+        batch = await db["logs"].find(_LEGACY).sort("time", -1) \
+            .limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not batch:
+            break
+        if migrated == 0:
+            # old-style events can reappear (a restored backup, a worker on the old version)
+            await _save_state({"$set": {"finished_at": None}})
+            _pending.update(value=True, checked_at=None)
+        stored = await compact_events(batch)
+        # matching on `time` too leaves events the archive job moved meanwhile alone
+        await db["logs"].bulk_write(
+            [ReplaceOne({"_id": d["_id"], "time": d["time"]}, row) for d, row in zip(batch, stored)],
+            ordered=False,
+        )
+        migrated += len(batch)
+        await _save_state({"$inc": {"migrated": len(batch)}, "$set": {"last_batch_at": datetime.utcnow()}})
+        ahead = migrated / LOG_MIGRATION_DOCS_PER_SECOND - (time.monotonic() - started)
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+    state = await get_state()
+    if not state.get("finished_at"):
+        await _drop_legacy_indexes()
+        await _save_state({"$set": {"finished_at": datetime.utcnow()}})
+    _pending.update(value=False, checked_at=time.monotonic())
+    return {"migrated": migrated}
+
+
+async def migration_status() -> Dict[str, Any]:
+    state = await get_state()
+    state.pop("_id", None)
+    state["remaining"] = await db["logs"].count_documents(_LEGACY)
+    state["docs_per_second"] = LOG_MIGRATION_DOCS_PER_SECOND
+    return state
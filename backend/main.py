@@ -1,41 +1,113 @@
 # main.py - Geocrypt Backend Entrypoint (rewritten, includes /auth/me)
-import os
+from contextlib import asynccontextmanager
 from datetime import datetime
-from dotenv import load_dotenv
+from typing import Optional
 from bson.objectid import ObjectId
 
-from fastapi import FastAPI, HTTPException, Depends, Form
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Form, Request, Header
+from fastapi.responses import StreamingResponse, JSONResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-import uvicorn
-
-from db import db
+from config import settings
+from db import db, warm_up_pool
 from auth import (
     decode_token,
     generate_and_store_otp,
     verify_password,
     hash_password,
-    create_access_token,
+    ensure_user_indexes,
     verify_otp,
+    shutdown_hash_pool,
 )
 from email_utils import send_email
-from schemas import LoginForm
+from schemas import LoginForm, RefreshIn
 from models import make_user_doc
-from files import get_decrypted_file, store_encrypted_file
-from utils import is_within_geofence, is_within_work_hours
+from files import (
+    get_decrypted_file,
+    store_encrypted_file,
+    open_stored_file,
+    iter_plaintext_range,
+    is_segmented,
+    parse_byte_range,
+)
+from previews import get_preview, ensure_indexes as ensure_preview_indexes
+from scrubber import ensure_indexes as ensure_scrub_indexes
+from tickets import issue_ticket, verify_ticket, DOWNLOAD_TICKET_TTL_SECONDS
+from utils import is_within_geofence, is_within_work_hours, parse_wfh_until, ALLOWED_WIFI_SSID
+from log_archive import ensure_indexes as ensure_log_indexes
+from file_catalog import ensure_indexes as ensure_file_indexes
+from audit import log_event, ensure_indexes as ensure_audit_indexes
+from events import bus, start_bridge, stop_bridge
+from uploads import ensure_indexes as ensure_upload_indexes
+from sessions import (
+    open_session, refresh_session, end_session, SessionError, ensure_indexes as ensure_session_indexes
+)
+from acl import permissions, load_permissions, ensure_indexes as ensure_acl_indexes
+from scheduler import scheduler
+from maintenance import register_jobs
+from serve import install_drain_handler
+import metrics
+from metrics import MetricsMiddleware, set_outcome
+import profiling
 
 # Routers
 from admin_routes import router as admin_router
 from employee_routes import router as employee_router
 
-load_dotenv()
+# ---------------------------------------------------------------------
+# Lifespan: bootstrap admin, indexes, caches and background work
+# ---------------------------------------------------------------------
+async def startup():
+    # fail fast on a missing/invalid FERNET_KEY or inconsistent settings
+    settings.validate()
+    # open pool connections before traffic arrives
+    await warm_up_pool()
+    await ensure_user_indexes()
+    admin = await db["users"].find_one({"role": "admin"})
+    if not admin:
+        admin_email = settings.bootstrap_admin_email
+        admin_pass = settings.bootstrap_admin_password
+        await db["users"].insert_one(
+            make_user_doc(admin_email, hash_password(admin_pass), "Bootstrap Admin", "admin")
+        )
+        print(f"Bootstrap admin created: {admin_email}")
+    await ensure_log_indexes()
+    await ensure_audit_indexes()
+    await ensure_file_indexes()
+    await ensure_acl_indexes()
+    await ensure_upload_indexes()
+    await ensure_session_indexes()
+    await ensure_preview_indexes()
+    await ensure_scrub_indexes()
+    if profiling.PROFILING_ENABLED:
+        await profiling.ensure_indexes()
+    await load_permissions()
+    register_jobs(scheduler)
+    scheduler.start()
+    start_bridge()
+    install_drain_handler(bus.drain)
+
+
+async def shutdown():
+    await stop_bridge()
+    await scheduler.stop()
+    shutdown_hash_pool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
 
 # ---------------------------------------------------------------------
 # FastAPI application
 # ---------------------------------------------------------------------
-app = FastAPI(title="Geocrypt Access Control Backend")
+app = FastAPI(title="Geocrypt Access Control Backend", lifespan=lifespan)
 
 # ---------------------------------------------------------------------
 # CORS configuration
@@ -53,6 +125,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# request profiling (PROFILE_* settings); nothing is installed when disabled
+profiling.install(app)
+# outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
 
 # ---------------------------------------------------------------------
 # Security helper (HTTP Bearer)
@@ -69,21 +145,6 @@ async def get_current_user(token: HTTPAuthorizationCredentials = Depends(bearer)
         raise HTTPException(status_code=401, detail="invalid token")
     return payload
 
-# ---------------------------------------------------------------------
-# Startup bootstrap – ensure admin exists
-# ---------------------------------------------------------------------
-@app.on_event("startup")
-async def startup():
-    admin = await db["users"].find_one({"role": "admin"})
-    if not admin:
-        admin_email = os.getenv("BOOTSTRAP_ADMIN_EMAIL")
-        admin_pass = os.getenv("BOOTSTRAP_ADMIN_PASSWORD", "admin")
-        await db["users"].insert_one(
-            make_user_doc(admin_email, hash_password(admin_pass), "Bootstrap Admin", "admin")
-        )
-        print(f"Bootstrap admin created: {admin_email}")
-
-
 # ---------------------------------------------------------------------
 # Authentication endpoints
 # ---------------------------------------------------------------------
@@ -108,19 +169,50 @@ async def login(form: LoginForm):
     return {"detail": "OTP sent to email"}
 
 
+def _client_info(request: Request) -> dict:
+    return {
+        "ip": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent"),
+    }
+
+
 @app.post("/auth/verify-otp")
-async def verify_otp_endpoint(email: str = Form(...), code: str = Form(...)):
+async def verify_otp_endpoint(
+    request: Request,
+    email: str = Form(...),
+    code: str = Form(...),
+    x_device_id: Optional[str] = Header(None),
+):
     """
-    Verify OTP -> issue JWT access token.
+    Verify OTP -> issue JWT access token plus a refresh token bound to X-Device-Id.
     """
     ok = await verify_otp(email, code)
     if not ok:
         raise HTTPException(status_code=401, detail="invalid otp")
 
     user = await db["users"].find_one({"email": email})
-    token = create_access_token(email, user["role"])
+    return await open_session(email, user["role"], x_device_id, _client_info(request))
+
+
+@app.post("/auth/refresh")
+async def refresh_endpoint(payload: RefreshIn, request: Request, x_device_id: Optional[str] = Header(None)):
+    """
+    Exchange a refresh token for a new access token and a new (rotated)
+    refresh token. No password, OTP or email involved.
+    """
+    try:
+        return await refresh_session(payload.refresh_token, x_device_id, _client_info(request))
+    except SessionError as e:
+        raise HTTPException(status_code=401, detail=e.detail)
 
-    return {"access_token": token, "role": user["role"]}
+
+@app.post("/auth/logout")
+async def logout_endpoint(payload: RefreshIn):
+    """
+    Revoke the session the refresh token belongs to.
+    """
+    await end_session(payload.refresh_token)
+    return {"detail": "logged out"}
 
 
 @app.post("/auth/resend-otp")
@@ -172,8 +264,11 @@ async def auth_me(token: HTTPAuthorizationCredentials = Depends(bearer)):
 @app.post("/stream-file")
 async def stream_file_endpoint(file_id: str = Form(...), current_user=Depends(get_current_user)):
     """
-    Stream decrypted file (raw download). Assumes access checks already done upstream.
+    Stream decrypted file (raw download). Only the per-file ACL is checked here;
+    location/time policy applies to /employee/request-and-download.
     """
+    if not permissions.can_access(current_user.get("sub"), current_user.get("role"), file_id):
+        raise HTTPException(status_code=403, detail="no access to this file")
     try:
         fname, data = await get_decrypted_file(file_id)
     except Exception:
@@ -189,46 +284,38 @@ async def stream_file_endpoint(file_id: str = Form(...), current_user=Depends(ge
 # ---------------------------------------------------------------------
 # EMPLOYEE FILE ACCESS (with geofence, time, wifi + WFH bypass)
 # ---------------------------------------------------------------------
-@app.post("/employee/request-and-download")
-async def employee_request_and_download(
-    file_id: str = Form(...),
-    lat: float = Form(...),
-    lon: float = Form(...),
-    client_network_hint: str = Form(""),
-    current_user=Depends(get_current_user),
-):
+async def check_download_policy(current_user: dict, file_id: str, lat: float, lon: float,
+                                client_network_hint: str) -> dict:
     """
-    Employee attempts to download + decrypt a file.
+    Run every access check for an employee download and return the file's
+    catalog document. Denials are logged and raised as HTTPException.
     Checks:
+     - Per-file ACL
      - WFH bypass window
      - Geofence
      - Working hours
      - Network SSID hint
     """
-
     email = current_user.get("sub")
 
+    # per-file ACL (in-memory, no DB read)
+    if not permissions.can_access(email, current_user.get("role"), file_id):
+        set_outcome("denied_acl")
+        await log_event({"email": email, "file": file_id, "action": "denied_acl", "time": datetime.utcnow()})
+        raise HTTPException(status_code=403, detail="no access to this file")
+
     # Fetch employee info
     user = await db["users"].find_one({"email": email})
     if not user:
+        set_outcome("user_not_found")
         raise HTTPException(status_code=404, detail="user not found")
 
     # -------------------------
     # WFH bypass logic
     # -------------------------
-    wfh_until = user.get("wfh_allowed_until")
-    bypass = False
-
-    if wfh_until:
-        # if stored as string parse; if stored as datetime, compare directly
-        if isinstance(wfh_until, str):
-            try:
-                wfh_until = datetime.fromisoformat(wfh_until)
-            except Exception:
-                wfh_until = None
-
-        if wfh_until and wfh_until > datetime.utcnow():
-            bypass = True
+    # stored as a datetime at approval; legacy strings are converted by the wfh_expiry job
+    wfh_until = parse_wfh_until(user.get("wfh_allowed_until"))
+    bypass = bool(wfh_until and wfh_until > datetime.utcnow())
 
     # -------------------------
     # Policy checks (if not bypass)
@@ -236,7 +323,8 @@ async def employee_request_and_download(
     if not bypass:
         # geofence check
         if not is_within_geofence(lat, lon):
-            await db["logs"].insert_one(
+            set_outcome("denied_geofence")
+            await log_event(
                 {"email": email, "file": file_id, "action": "denied_geofence",
                  "lat": lat, "lon": lon, "time": datetime.utcnow()}
             )
@@ -244,15 +332,16 @@ async def employee_request_and_download(
 
         # working hours check
         if not is_within_work_hours():
-            await db["logs"].insert_one(
+            set_outcome("denied_time")
+            await log_event(
                 {"email": email, "file": file_id, "action": "denied_time", "time": datetime.utcnow()}
             )
             raise HTTPException(status_code=403, detail="outside allowed working hours")
 
         # wifi SSID check
-        allowed_ssid = os.getenv("ALLOWED_WIFI_SSID")
-        if allowed_ssid and client_network_hint and (allowed_ssid not in client_network_hint):
-            await db["logs"].insert_one(
+        if ALLOWED_WIFI_SSID and client_network_hint and (ALLOWED_WIFI_SSID not in client_network_hint):
+            set_outcome("denied_network")
+            await log_event(
                 {"email": email, "file": file_id, "action": "denied_network",
                  "hint": client_network_hint, "time": datetime.utcnow()}
             )
@@ -263,9 +352,27 @@ async def employee_request_and_download(
     # -------------------------
     fdoc = await db["files"].find_one({"file_id": file_id})
     if not fdoc:
-        await db["logs"].insert_one({"email": email, "file": file_id,
-                                     "action": "denied_file_not_found", "time": datetime.utcnow()})
+        set_outcome("denied_file_not_found")
+        await log_event({"email": email, "file": file_id,
+                         "action": "denied_file_not_found", "time": datetime.utcnow()})
         raise HTTPException(status_code=404, detail="file not found")
+    set_outcome("granted_wfh" if bypass else "granted")
+    return fdoc
+
+
+@app.post("/employee/request-and-download")
+async def employee_request_and_download(
+    file_id: str = Form(...),
+    lat: float = Form(...),
+    lon: float = Form(...),
+    client_network_hint: str = Form(""),
+    current_user=Depends(get_current_user),
+):
+    """
+    Employee attempts to download + decrypt a file in one request.
+    """
+    email = current_user.get("sub")
+    await check_download_policy(current_user, file_id, lat, lon, client_network_hint)
 
     # -------------------------
     # Decrypt the file
@@ -273,14 +380,15 @@ async def employee_request_and_download(
     try:
         fname, data = await get_decrypted_file(file_id)
     except Exception as e:
-        await db["logs"].insert_one(
+        set_outcome("decrypt_error")
+        await log_event(
             {"email": email, "file": file_id, "action": "decrypt_error",
              "error": str(e), "time": datetime.utcnow()}
         )
         raise HTTPException(status_code=500, detail="decrypt or read error")
 
     # log granted access
-    await db["logs"].insert_one(
+    await log_event(
         {"email": email, "file": file_id, "action": "access_granted", "time": datetime.utcnow()}
     )
 
@@ -291,6 +399,153 @@ async def employee_request_and_download(
     )
 
 
+@app.post("/employee/request-download-ticket")
+async def employee_request_download_ticket(
+    file_id: str = Form(...),
+    lat: float = Form(...),
+    lon: float = Form(...),
+    client_network_hint: str = Form(""),
+    current_user=Depends(get_current_user),
+):
+    """
+    Run the same policy checks as request-and-download, but instead of the bytes
+    return a short-lived signed ticket for GET /download/{ticket}. One ticket
+    covers retries and ranged requests until it expires.
+    """
+    email = current_user.get("sub")
+    fdoc = await check_download_policy(current_user, file_id, lat, lon, client_network_hint)
+    ticket = issue_ticket(
+        email, current_user.get("role"), file_id, fdoc.get("filename") or "download",
+        fdoc.get("mime_type") or "application/octet-stream", fdoc.get("size"),
+    )
+    await log_event(
+        {"email": email, "file": file_id, "action": "access_granted", "via": "ticket", "time": datetime.utcnow()}
+    )
+    return {"ticket": ticket, "url": f"/download/{ticket}", "expires_in": DOWNLOAD_TICKET_TTL_SECONDS}
+
+
+@app.get("/download/{ticket}")
+async def download_with_ticket(ticket: str, request: Request):
+    """
+    Stream a file for a valid ticket. The ticket is verified from its signature
+    alone (no policy DB reads); single `Range: bytes=` requests are honoured so
+    browsers can resume or split downloads. Segmented blobs are decrypted one
+    segment at a time as the response is sent; a legacy whole-file token can
+    only be decrypted in one piece, so those files are buffered in memory.
+    """
+    claims = verify_ticket(ticket)
+    if not claims:
+        set_outcome("invalid_ticket")
+        raise HTTPException(status_code=401, detail="invalid or expired ticket")
+    file_id = claims["fid"]
+    # ACL revocations still apply while a ticket is live (in-memory check)
+    if not permissions.can_access(claims["sub"], claims.get("rl"), file_id):
+        set_outcome("denied_acl")
+        raise HTTPException(status_code=403, detail="no access to this file")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{claims["fn"]}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-store",
+    }
+    whole = None
+    try:
+        grid_out = await open_stored_file(file_id)
+        if is_segmented(grid_out.metadata):
+            size = grid_out.metadata["plain_size"]
+        else:
+            _, whole = await get_decrypted_file(file_id)
+            size = len(whole)
+    except Exception:
+        set_outcome("decrypt_error")
+        raise HTTPException(status_code=500, detail="decrypt or read error")
+
+    try:
+        rng = parse_byte_range(request.headers.get("range"), size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    status_code = 200
+    start, end = 0, size - 1
+    if rng is not None:
+        start, end = rng
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if whole is not None:
+        return Response(content=whole[start:end + 1], status_code=status_code,
+                        media_type=claims["mt"], headers=headers)
+
+    chunks = iter_plaintext_range(grid_out, start, end)
+    # decrypt the first segment before answering, so a bad key is a 500 rather than a cut-off body
+    try:
+        first = await anext(chunks, b"")
+    except Exception:
+        set_outcome("decrypt_error")
+        raise HTTPException(status_code=500, detail="decrypt or read error")
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(body(), status_code=status_code, media_type=claims["mt"], headers=headers)
+
+
+# ---------------------------------------------------------------------
+# PREVIEW RENDITIONS
+# ---------------------------------------------------------------------
+@app.get("/files/{file_id}/preview")
+async def file_preview(
+    file_id: str,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    client_network_hint: str = "",
+    current_user=Depends(get_current_user),
+):
+    """
+    Small cached rendition of a file (text head, thumbnail, first PDF page text
+    or metadata JSON). X-Preview-Kind names the rendition. Admins only need the
+    ACL; employees go through the same policy checks as downloads.
+    """
+    if current_user.get("role") == "admin":
+        if not permissions.can_access(current_user.get("sub"), "admin", file_id):
+            raise HTTPException(status_code=403, detail="no access to this file")
+        fdoc = await db["files"].find_one({"file_id": file_id})
+        if not fdoc:
+            raise HTTPException(status_code=404, detail="file not found")
+    else:
+        if lat is None or lon is None:
+            raise HTTPException(status_code=400, detail="lat and lon required")
+        fdoc = await check_download_policy(current_user, file_id, lat, lon, client_network_hint)
+
+    try:
+        body, media_type, kind = await get_preview(fdoc)
+    except Exception:
+        raise HTTPException(status_code=500, detail="preview error")
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"X-Preview-Kind": kind, "Cache-Control": "private, max-age=300"}
+    )
+
+
+# ---------------------------------------------------------------------
+# METRICS (Prometheus text format)
+# ---------------------------------------------------------------------
+METRICS_TOKEN = settings.metrics_token
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """
+    This worker's metrics. Set METRICS_TOKEN to require `Authorization: Bearer <token>`.
+    """
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 # ---------------------------------------------------------------------
 # MOUNT ADMIN + EMPLOYEE ROUTES
 # ---------------------------------------------------------------------
@@ -300,12 +555,13 @@ app.include_router(employee_router)
 
 
 # ---------------------------------------------------------------------
-# Run server
+# Run server (development; use serve.py for production)
 # ---------------------------------------------------------------------
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
-        host=os.getenv("APP_HOST", "0.0.0.0"),
-        port=int(os.getenv("APP_PORT", 8000)),
+        host=settings.app_host,
+        port=settings.app_port,
         reload=True,
     )
@@ -0,0 +1,62 @@
+# maintenance.py - periodic maintenance jobs registered on the scheduler
+from datetime import datetime
+from typing import Dict, Any
+from pymongo import UpdateOne
+
+from db import db
+from config import settings
+from audit import log_events
+from events import emit
+from utils import parse_wfh_until
+from scheduler import Job, Scheduler
+from auth import purge_expired_otps
+from acl import refresh_permissions, ACL_REFRESH_SECONDS
+from uploads import collect_expired, UPLOAD_GC_SECONDS
+from log_archive import archive_old_logs
+from log_migration import migrate_logs
+import scrubber
+
+
+OTP_PURGE_SECONDS = settings.otp_purge_seconds
+WFH_EXPIRY_SECONDS = settings.wfh_expiry_seconds
+LOG_ARCHIVE_CRON = settings.log_archive_cron
+SCRUB_CHECK_SECONDS = settings.scrub_check_seconds
+
+
+async def expire_wfh() -> Dict[str, Any]:
+    """
+    Clear wfh_allowed_until once it has passed and convert legacy string
+    values to datetimes, so the download path only compares datetimes.
+    """
+    now = datetime.utcnow()
+    ops = []
+    expired = []
+    async for u in db["users"].find({"wfh_allowed_until": {"$ne": None}}, {"email": 1, "wfh_allowed_until": 1}):
+        until = parse_wfh_until(u["wfh_allowed_until"])
+        if until is None or until <= now:
+            ops.append(UpdateOne({"_id": u["_id"]}, {"$set": {"wfh_allowed_until": None}}))
+            expired.append(u["email"])
+        elif until != u["wfh_allowed_until"]:
+            ops.append(UpdateOne({"_id": u["_id"]}, {"$set": {"wfh_allowed_until": until}}))
+    if ops:
+        await db["users"].bulk_write(ops, ordered=False)
+    await log_events([{"email": email, "action": "wfh_expired", "time": now} for email in expired])
+    for email in expired:
+        emit("wfh_updated", {"requested_by": email, "status": "expired"})
+    return {"expired": len(expired), "normalized": len(ops) - len(expired)}
+
+
+def register_jobs(s: Scheduler):
+    # per-worker: each worker keeps its own permission cache
+    s.add(Job("acl_refresh", refresh_permissions, every=ACL_REFRESH_SECONDS, timeout=30, leased=False))
+    s.add(Job("upload_gc", collect_expired, every=UPLOAD_GC_SECONDS, jitter=30, timeout=300))
+    s.add(Job("otp_purge", purge_expired_otps, every=OTP_PURGE_SECONDS, jitter=30, timeout=60))
+    s.add(Job("wfh_expiry", expire_wfh, every=WFH_EXPIRY_SECONDS, jitter=10, timeout=60, run_at_start=True))
+    s.add(Job("log_archive", archive_old_logs, cron=LOG_ARCHIVE_CRON, jitter=60, timeout=3600))
+    # resumable like the scrub: a run cut at its timeout carries on at the next one
+    s.add(Job("log_migration", migrate_logs, every=3600, jitter=60, timeout=3300, run_at_start=True))
+    # a long pass is cut at the timeout and resumes from its checkpoint next time;
+    # short check intervals still get a usable timeout
+    scrub_timeout = max(SCRUB_CHECK_SECONDS - 120, SCRUB_CHECK_SECONDS // 2, 30)
+    s.add(Job("integrity_scrub", scrubber.run_if_due, every=SCRUB_CHECK_SECONDS, jitter=60,
+              timeout=scrub_timeout, run_at_start=True))
@@ -0,0 +1,279 @@
+# metrics.py - in-process Prometheus-style metrics (text exposition at /metrics)
+"""
+Counters, gauges and histograms are plain dicts of floats keyed by label
+tuples. Updates are single in-place operations with no locks; the event loop
+is single-threaded and the GIL covers the few updates made from driver or
+to_thread worker threads, so the cost on the hot path is a dict lookup and
+an add. Losing an increment to a rare thread race is accepted.
+
+Every worker process keeps its own numbers and labels them with its pid;
+scrape each worker (or sum over `worker`) for totals.
+
+Sources:
+  http_*     ASGI middleware, labelled by route template and, for the
+             download policy routes, which branch decided the request
+  mongo_*    pymongo CommandListener registered on the Motor client
+  crypto_*   encrypt/decrypt byte and time counters from files.py
+  smtp_*     send latency and failures from email_utils
+
+record_phase() also forwards Mongo, crypto and hashing time to the request
+profiler when profiling.install() has set phase_hook.
+"""
+import os
+import time
+import bisect
+import contextvars
+from typing import Dict, Tuple, List, Optional, Any, Callable
+from pymongo import monitoring
+
+WORKER = str(os.getpid())
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    parts.append(f'worker="{WORKER}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in list(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, labels: Tuple, value: float):
+        self.values[labels] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self) -> List[str]:
+        out = []
+        for k, row in list(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {cumulative}")
+            cumulative += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {row[-1]}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {cumulative}")
+        return out
+
+
+_registry: List[Any] = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+# ---------------------------------------------------------------------
+# Metric definitions
+# ---------------------------------------------------------------------
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")))
+http_latency = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency; outcome names the download policy branch",
+    ("method", "route", "outcome")))
+http_in_flight = _register(Gauge("http_requests_in_flight", "Requests currently being handled by this worker"))
+
+mongo_commands = _register(Counter(
+    "mongo_commands_total", "MongoDB commands by name, collection and result", ("command", "collection", "result")))
+mongo_latency = _register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round-trip time", ("command",), FAST_BUCKETS))
+
+crypto_bytes = _register(Counter("crypto_bytes_total", "Plaintext bytes encrypted or decrypted", ("op",)))
+crypto_seconds = _register(Counter("crypto_seconds_total", "Time spent encrypting or decrypting", ("op",)))
+crypto_throughput = _register(Gauge(
+    "crypto_throughput_bytes_per_second", "Lifetime average crypto throughput of this worker", ("op",)))
+
+smtp_latency = _register(Histogram("smtp_send_duration_seconds", "SMTP send time, connect to quit", ("result",)))
+smtp_failures = _register(Counter("smtp_send_failures_total", "Failed SMTP sends by exception type", ("error",)))
+
+segment_cache_lookups = _register(Counter(
+    "segment_cache_lookups_total", "Encrypted-segment cache lookups by result", ("result",)))
+segment_cache_bytes = _register(Counter(
+    "segment_cache_bytes_total", "Ciphertext bytes of segmented reads by source (cache or mongo)", ("source",)))
+segment_cache_size = _register(Gauge("segment_cache_size_bytes", "Ciphertext bytes held by the segment cache"))
+segment_cache_hit_ratio = _register(Gauge("segment_cache_hit_ratio", "Lifetime segment cache hit ratio of this worker"))
+
+auth_refreshes = _register(Counter(
+    "auth_refresh_total", "Refresh-token exchanges by result (ok, expired, reused, ...)", ("result",)))
+
+
+# ---------------------------------------------------------------------
+# Request phases (profiling)
+# ---------------------------------------------------------------------
+phase_hook: Optional[Callable[[str, float], None]] = None
+
+
+def record_phase(name: str, seconds: float):
+    if phase_hook is not None:
+        phase_hook(name, seconds)
+
+
+# ---------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------
+_outcome: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar("metrics_outcome", default=None)
+
+
+def set_outcome(outcome: str):
+    """
+    Label the current request with the policy branch that decided it
+    (e.g. "denied_geofence", "granted").
+    """
+    holder = _outcome.get()
+    if holder is not None:
+        holder["outcome"] = outcome
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no extra task per request). The route label is the
+    matched path template, so ids in URLs do not create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = {"code": 500}
+        holder: Dict[str, str] = {}
+        token = _outcome.set(holder)
+        http_in_flight.inc((), 1)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.inc((), -1)
+            _outcome.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc((method, path, str(status["code"])))
+            http_latency.observe((method, path, holder.get("outcome", "")), time.perf_counter() - start)
+
+
+# ---------------------------------------------------------------------
+# MongoDB
+# ---------------------------------------------------------------------
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, result: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_commands.inc((event.command_name, collection, result))
+        mongo_latency.observe((event.command_name,), event.duration_micros / 1e6)
+        record_phase("mongo", event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+mongo_listener = MongoCommandMetrics()
+
+
+# ---------------------------------------------------------------------
+# Crypto / SMTP / segment cache / session helpers
+# ---------------------------------------------------------------------
+def record_crypto(op: str, nbytes: int, seconds: float):
+    crypto_bytes.inc((op,), nbytes)
+    crypto_seconds.inc((op,), seconds)
+    record_phase("crypto", seconds)
+
+
+def record_smtp(seconds: float, error: Optional[BaseException] = None):
+    smtp_latency.observe(("error" if error else "ok",), seconds)
+    if error is not None:
+        smtp_failures.inc((type(error).__name__,))
+
+
+def record_segment_lookup(hit: bool, nbytes: int):
+    segment_cache_lookups.inc(("hit" if hit else "miss",))
+    if hit:
+        segment_cache_bytes.inc(("cache",), nbytes)
+
+
+def record_segment_fetch(nbytes: int):
+    segment_cache_bytes.inc(("mongo",), nbytes)
+
+
+def record_refresh(result: str):
+    auth_refreshes.inc((result,))
+    set_outcome("refresh_" + result)
+
+
+# ---------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------
+def render() -> str:
+    for (op,), total in list(crypto_bytes.values.items()):
+        seconds = crypto_seconds.values.get((op,), 0.0)
+        if seconds:
+            crypto_throughput.set((op,), total / seconds)
+    lookups = sum(segment_cache_lookups.values.values())
+    if lookups:
+        segment_cache_hit_ratio.set((), segment_cache_lookups.values.get(("hit",), 0.0) / lookups)
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
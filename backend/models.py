@@ -7,6 +7,12 @@ Keep these minimal and free of side effects so they are safe to import at startu
 from typing import Optional, Dict
 from datetime import datetime
 
+def email_key(email: str) -> str:
+    """
+    Uniqueness key for `users`: addresses that differ only in case are one mailbox.
+    """
+    return email.lower()
+
 def make_user_doc(email: str, hashed_password: str, name: Optional[str], role: str) -> Dict:
     """
     Create a new user document for insertion into MongoDB.
@@ -14,6 +20,7 @@ def make_user_doc(email: str, hashed_password: str, name: Optional[str], role: s
     """
     return {
         "email": email,
+        "email_key": email_key(email),
         "hashed_password": hashed_password,
         "name": name,
         "role": role,
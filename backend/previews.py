@@ -0,0 +1,157 @@
+# previews.py - small, cached preview renditions of stored files
+"""
+Renditions are generated on first request, encrypted and stored in GridFS next
+to the originals, and recorded in the `previews` collection keyed by content
+hash, so identical uploads share one rendition and repeat previews are a single
+small read.
+
+Kinds:
+  text      first PREVIEW_TEXT_BYTES of a text file (only those bytes are decrypted)
+  image     downscaled JPEG/PNG (needs Pillow)
+  pdf_text  text of the first PDF page (needs pypdf)
+  metadata  JSON description, used when no rendition can be made
+Pillow and pypdf are optional; without them those types fall back to metadata.
+"""
+import io
+import json
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, Tuple, List
+
+from db import db
+from config import settings
+from files import store_encrypted_file, get_decrypted_file, read_plaintext_range
+
+
+PREVIEW_TEXT_BYTES = settings.preview_text_bytes
+PREVIEW_IMAGE_PX = settings.preview_image_px
+# images/PDFs are decoded in full, so skip renditions for very large ones
+PREVIEW_MAX_SOURCE_BYTES = settings.preview_max_source_bytes
+
+_TEXT_TYPES = ("application/json", "application/xml", "application/javascript", "application/x-ndjson")
+
+# (key, kind) -> [lock, callers holding or waiting on it]; dropped when the count reaches 0
+_locks: Dict[Tuple[str, str], List[Any]] = {}
+
+
+def preview_kind(mime_type: str, size: int) -> str:
+    if mime_type.startswith("text/") or mime_type in _TEXT_TYPES:
+        return "text"
+    if size is not None and size > PREVIEW_MAX_SOURCE_BYTES:
+        return "metadata"
+    if mime_type.startswith("image/"):
+        return "image"
+    if mime_type == "application/pdf":
+        return "pdf_text"
+    return "metadata"
+
+
+def _metadata_rendition(fdoc: Dict[str, Any]) -> Tuple[bytes, str]:
+    info = {
+        "filename": fdoc.get("filename"),
+        "size": fdoc.get("size"),
+        "mime_type": fdoc.get("mime_type"),
+        "uploaded_by": fdoc.get("uploaded_by"),
+        "uploaded_at": fdoc["uploaded_at"].isoformat() if fdoc.get("uploaded_at") else None,
+        "tags": fdoc.get("tags", []),
+    }
+    return json.dumps(info).encode(), "application/json"
+
+
+def _image_rendition(data: bytes) -> Tuple[bytes, str]:
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.thumbnail((PREVIEW_IMAGE_PX, PREVIEW_IMAGE_PX))
+    out = io.BytesIO()
+    if img.mode in ("RGBA", "LA", "P"):
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue(), "image/png"
+    img.convert("RGB").save(out, format="JPEG", quality=80)
+    return out.getvalue(), "image/jpeg"
+
+
+def _pdf_text_rendition(data: bytes) -> Tuple[bytes, str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    text = reader.pages[0].extract_text() if reader.pages else ""
+    return (text or "").encode("utf-8")[:PREVIEW_TEXT_BYTES], "text/plain; charset=utf-8"
+
+
+async def _render(fdoc: Dict[str, Any], kind: str) -> Tuple[bytes, str, str]:
+    """
+    Build a rendition, returning (bytes, media type, actual kind). Any failure
+    in the optional image/PDF paths degrades to the metadata rendition.
+    """
+    file_id = fdoc["file_id"]
+    if kind == "text":
+        size = fdoc.get("size")
+        end = PREVIEW_TEXT_BYTES - 1 if size is None else min(PREVIEW_TEXT_BYTES, size) - 1
+        if end < 0:
+            return b"", "text/plain; charset=utf-8", "text"
+        head = await read_plaintext_range(file_id, 0, end)
+        # drop a multi-byte character cut in half at the boundary
+        text = head.decode("utf-8", errors="ignore").encode("utf-8")
+        return text, "text/plain; charset=utf-8", "text"
+    if kind in ("image", "pdf_text"):
+        try:
+            _, data = await get_decrypted_file(file_id)
+            render = _image_rendition if kind == "image" else _pdf_text_rendition
+            body, media_type = await asyncio.to_thread(render, data)
+            return body, media_type, kind
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"preview rendition failed for {file_id}: {e}")
+    body, media_type = _metadata_rendition(fdoc)
+    return body, media_type, "metadata"
+
+
+async def get_preview(fdoc: Dict[str, Any]) -> Tuple[bytes, str, str]:
+    """
+    Return (bytes, media type, kind) for a file's preview, generating and
+    storing it on first use.
+    """
+    mime_type = fdoc.get("mime_type") or "application/octet-stream"
+    kind = preview_kind(mime_type, fdoc.get("size"))
+    if kind == "metadata":
+        # cheap to build and changes with the catalog entry, so never stored
+        body, media_type = _metadata_rendition(fdoc)
+        return body, media_type, kind
+
+    key = fdoc.get("sha256") or f"file:{fdoc['file_id']}"
+    entry = _locks.setdefault((key, kind), [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            cached = await db["previews"].find_one({"key": key, "kind": kind})
+            if cached:
+                try:
+                    _, body = await get_decrypted_file(cached["blob_id"])
+                    return body, cached["media_type"], cached["actual_kind"]
+                except Exception:
+                    await db["previews"].delete_one({"_id": cached["_id"]})
+
+            body, media_type, actual_kind = await _render(fdoc, kind)
+            if actual_kind == "metadata":
+                # rendering failed or an optional library is missing; retry next time
+                return body, media_type, actual_kind
+            blob_id = await store_encrypted_file(
+                f"preview-{fdoc['file_id']}", body, metadata={"preview_of": key, "kind": kind}
+            )
+            await db["previews"].update_one(
+                {"key": key, "kind": kind},
+                {"$set": {"blob_id": blob_id, "media_type": media_type, "actual_kind": actual_kind,
+                          "created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+            return body, media_type, actual_kind
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _locks.pop((key, kind), None)
+
+
+async def ensure_indexes():
+    await db["previews"].create_index([("key", 1), ("kind", 1)], unique=True)
@@ -0,0 +1,231 @@
+# profiling.py - opt-in request profiling with stored collapsed-stack profiles
+"""
+A request is profiled when PROFILE_SAMPLE_RATE picks it, or when it carries
+`X-Profile: <admin JWT>` and PROFILE_ON_HEADER=1. When neither is enabled the
+middleware is not installed and the phase hooks stay unset, so there is no
+cost at all.
+
+Profiled requests run under pyinstrument (sampling, async-aware) when it is
+installed, else cProfile. cProfile sees every coroutine on the thread, so it
+profiles one request at a time and its stacks are rebuilt from the heaviest
+caller chain (an approximation). Either way the result is stored in
+`profiles` as collapsed stacks ("frame;frame;frame microseconds" per line),
+which flamegraph.pl and speedscope read directly, together with the
+request's wall time split into Mongo, crypto and password hashing.
+"""
+import os
+import time
+import random
+import asyncio
+import pstats
+import cProfile
+import importlib.util
+import contextvars
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+from bson import ObjectId
+
+import metrics
+from db import db, reader
+from config import settings
+from auth import decode_token
+
+
+PROFILE_SAMPLE_RATE = settings.profile_sample_rate
+PROFILE_ON_HEADER = settings.profile_on_header
+PROFILE_INTERVAL_SECONDS = settings.profile_interval_seconds
+PROFILE_RETENTION_DAYS = settings.profile_retention_days
+PROFILE_MAX_STACK_BYTES = 1024 * 1024
+
+PROFILING_ENABLED = PROFILE_SAMPLE_RATE > 0 or PROFILE_ON_HEADER
+HAVE_PYINSTRUMENT = importlib.util.find_spec("pyinstrument") is not None
+
+_phases: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("profile_phases", default=None)
+_cprofile_busy = False
+
+
+def _add_phase(name: str, seconds: float):
+    # called from the event loop and from Motor/to_thread workers (which copy the context)
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+# ---------------------------------------------------------------------
+# Collapsed stacks
+# ---------------------------------------------------------------------
+def _clean(name: str) -> str:
+    return name.replace(";", ":").replace("\n", " ")
+
+
+def _collapse_pyinstrument(session) -> str:
+    lines: Dict[str, float] = {}
+
+    def walk(frame, prefix: str):
+        label = _clean(f"{frame.function} ({frame.file_path_short}:{frame.line_no})"
+                       if frame.file_path_short else frame.function)
+        path = f"{prefix};{label}" if prefix else label
+        own = frame.time - sum(c.time for c in frame.children)
+        if own > 0:
+            lines[path] = lines.get(path, 0.0) + own
+        for child in frame.children:
+            walk(child, path)
+
+    root = session.root_frame()
+    if root is not None:
+        walk(root, "")
+    return "\n".join(f"{p} {int(t * 1e6)}" for p, t in lines.items() if int(t * 1e6) > 0)
+
+
+def _func_label(func) -> str:
+    filename, line, name = func
+    return _clean(f"{name} ({os.path.basename(filename)}:{line})" if line else name)
+
+
+def _collapse_cprofile(prof: cProfile.Profile) -> str:
+    stats = pstats.Stats(prof).stats  # func -> (cc, nc, tottime, cumtime, callers)
+    lines = []
+    for func, (_, _, tottime, _, callers) in stats.items():
+        if tottime <= 0:
+            continue
+        chain = [func]
+        seen = {func}
+        current = callers
+        while current and len(chain) < 64:
+            # follow the caller that spent the most cumulative time in this frame
+            parent = max(current.items(), key=lambda kv: kv[1][3])[0]
+            if parent in seen:
+                break
+            chain.append(parent)
+            seen.add(parent)
+            current = stats.get(parent, (0, 0, 0, 0, {}))[4]
+        lines.append(";".join(_func_label(f) for f in reversed(chain)) + f" {int(tottime * 1e6)}")
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------
+def _header_authorized(scope) -> bool:
+    if not PROFILE_ON_HEADER:
+        return False
+    for key, value in scope.get("headers", ()):
+        if key == b"x-profile":
+            claims = decode_token(value.decode("latin-1"))
+            return bool(claims and claims.get("role") == "admin")
+    return False
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if _header_authorized(scope):
+            trigger = "header"
+        elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            trigger = "sample"
+        else:
+            return await self.app(scope, receive, send)
+        await self._profile(scope, receive, send, trigger)
+
+    async def _profile(self, scope, receive, send, trigger: str):
+        global _cprofile_busy
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        if HAVE_PYINSTRUMENT:
+            from pyinstrument import Profiler
+            profiler, kind = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled"), "pyinstrument"
+        elif not _cprofile_busy:
+            profiler, kind = cProfile.Profile(), "cProfile"
+            _cprofile_busy = True
+        else:
+            return await self.app(scope, receive, send)
+
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        start = time.perf_counter()
+        profiler.enable() if kind == "cProfile" else profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if kind == "cProfile":
+                profiler.disable()
+                _cprofile_busy = False
+                collapsed = _collapse_cprofile(profiler)
+            else:
+                collapsed = _collapse_pyinstrument(profiler.stop())
+            wall = time.perf_counter() - start
+            _phases.reset(token)
+            route = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+            doc = {
+                "created_at": datetime.utcnow(),
+                "method": scope["method"],
+                "route": route,
+                "path": scope.get("path", ""),
+                "status": status["code"],
+                "trigger": trigger,
+                "profiler": kind,
+                "wall_ms": round(wall * 1000, 2),
+                "phases_ms": _split(wall, phases),
+                "collapsed": collapsed.encode()[:PROFILE_MAX_STACK_BYTES].decode(errors="ignore"),
+            }
+            # stored off the request path; the response has already been sent
+            asyncio.get_running_loop().create_task(_store(doc))
+
+
+def _split(wall: float, phases: Dict[str, float]) -> Dict[str, float]:
+    out = {name: round(phases.get(name, 0.0) * 1000, 2) for name in ("mongo", "crypto", "hashing")}
+    # concurrent awaits can overlap, so "other" is floored at zero
+    out["other"] = round(max(wall * 1000 - sum(out.values()), 0.0), 2)
+    return out
+
+
+async def _store(doc: Dict[str, Any]):
+    try:
+        await db["profiles"].insert_one(doc)
+    except Exception as e:
+        print(f"could not store profile: {e}")
+
+
+def install(app):
+    """
+    Add the middleware and phase hooks, only when profiling is configured.
+    """
+    if not PROFILING_ENABLED:
+        return
+    metrics.phase_hook = _add_phase
+    app.add_middleware(ProfilingMiddleware)
+
+
+# ---------------------------------------------------------------------
+# Stored profiles
+# ---------------------------------------------------------------------
+async def list_profiles(route: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    query = {"route": route} if route else {}
+    docs = await reader("profiles")["profiles"].find(query, {"collapsed": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+    for d in docs:
+        d["_id"] = str(d["_id"])
+    return docs
+
+
+async def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not ObjectId.is_valid(profile_id):
+        return None
+    doc = await db["profiles"].find_one({"_id": ObjectId(profile_id)})
+    if doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+async def ensure_indexes():
+    await db["profiles"].create_index("created_at", expireAfterSeconds=PROFILE_RETENTION_DAYS * 86400)
+    await db["profiles"].create_index([("route", 1), ("created_at", -1)])
@@ -0,0 +1,127 @@
+# read_routing_check.py - show which replica-set member serves each kind of read
+"""
+Usage:
+    MONGO_URI="mongodb://localhost:27017,localhost:27018,localhost:27019/geocrypt?replicaSet=rs0" \
+        python read_routing_check.py [--rounds 20]
+
+Runs a representative read for every purpose in db.READ_PURPOSES, plus the
+primary-only reads (auth, OTP, policy), --rounds times each. For each one it
+prints the members that answered and whether that matches the configured
+routing. Exits 1 on a mismatch:
+  - a primary-only read was served by a secondary, or
+  - a routed read hit the primary while a secondary within the staleness
+    bound was available (secondaryPreferred / secondary modes only).
+Reads only; any database on the replica set will do.
+
+A throwaway local replica set for the check:
+    for p in 27017 27018 27019; do
+        mkdir -p /tmp/rs/$p
+        mongod --replSet rs0 --port $p --dbpath /tmp/rs/$p --bind_ip localhost --fork --logpath /tmp/rs/$p.log
+    done
+    mongosh --port 27017 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+"""
+import sys
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, Tuple, List
+
+from pymongo import monitoring
+
+
+class ServedBy(monitoring.CommandListener):
+    """
+    Remembers the server address of the last read command started.
+    """
+
+    def __init__(self):
+        self.last = None
+
+    def started(self, event):
+        if event.command_name in ("find", "aggregate", "count"):
+            self.last = event.connection_id
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# purpose -> (collection, representative query); "primary" reads use `db`
+CHECKS: Dict[str, Tuple[str, dict]] = {
+    "admin_lists": ("users", {"role": "employee"}),
+    "file_search": ("files", {"filename_lc": {"$gte": "a"}}),
+    "logs": ("logs", {}),
+    "exports": ("logs", {}),
+    "integrity": ("files", {"integrity.status": "ok"}),
+    "profiles": ("profiles", {}),
+}
+PRIMARY_CHECKS: Dict[str, Tuple[str, dict]] = {
+    "auth (users)": ("users", {"email": "routing-check@example.com"}),
+    "otp": ("otps", {"email": "routing-check@example.com"}),
+    "policy (file_acls)": ("file_acls", {"file_id": "routing-check"}),
+}
+
+
+async def run(rounds: int) -> List[str]:
+    listener = ServedBy()
+    monitoring.register(listener)  # before the client in db.py is created
+    import db as db_module
+    from config import settings
+
+    client = db_module.client
+    await client.admin.command("ping")
+    await asyncio.sleep(1)  # let the topology discover every member
+    primary = client.primary
+    secondaries = set(client.secondaries)
+    if not secondaries:
+        print("warning: no secondaries visible (standalone or single-member set); everything reads from one server")
+
+    pref = db_module.analytics_db.read_preference
+    print(f"routed purposes: {', '.join(sorted(settings.analytics_reads)) or '(none)'}")
+    print(f"routed read preference: {pref.mongos_mode}, max staleness {pref.max_staleness}s\n")
+    print(f"{'read':<22}{'handle':<12}served by")
+
+    problems = []
+
+    async def probe(label: str, handle, collection: str, query: dict, expect_secondary: bool, routed: bool):
+        served = Counter()
+        for _ in range(rounds):
+            await handle[collection].find_one(query)
+            address = listener.last
+            served["primary" if address == primary else f"secondary {address[0]}:{address[1]}"] += 1
+        print(f"{label:<22}{'routed' if routed else 'primary':<12}"
+              + ", ".join(f"{k} x{v}" for k, v in sorted(served.items())))
+        on_primary = served.get("primary", 0)
+        if not routed and on_primary != rounds:
+            problems.append(f"{label}: primary-only read served by a secondary")
+        if expect_secondary and on_primary:
+            problems.append(f"{label}: routed read served by the primary {on_primary}/{rounds} times")
+
+    prefers_secondary = pref.mongos_mode in ("secondary", "secondaryPreferred") and bool(secondaries)
+    for purpose, (collection, query) in CHECKS.items():
+        routed = purpose in settings.analytics_reads
+        handle = db_module.reader(purpose)
+        await probe(purpose, handle, collection, query, routed and prefers_secondary, routed)
+    for label, (collection, query) in PRIMARY_CHECKS.items():
+        await probe(label, db_module.db, collection, query, False, False)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check read routing against a replica set")
+    parser.add_argument("--rounds", type=int, default=20, help="reads per check")
+    args = parser.parse_args()
+    problems = asyncio.run(run(args.rounds))
+    if problems:
+        print("\nrouting problems:")
+        for p in problems:
+            print(f"  {p}")
+        sys.exit(1)
+    print("\nrouting as configured")
+
+
+if __name__ == "__main__":
+    main()
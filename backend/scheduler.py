@@ -0,0 +1,274 @@
+# scheduler.py - small in-process asyncio scheduler for maintenance jobs
+"""
+Jobs run on a fixed interval (`every` seconds after the previous run) or on a
+five-field cron expression ("m h dom mon dow", local time, supporting *, a-b,
+a,b and */n). Each run gets random start jitter and an optional timeout.
+
+With several uvicorn workers every worker runs the scheduler, so leased jobs
+first take a row in `job_leases`: the owner holds it while the job runs and
+until just before the next due time, so the job runs on one worker per
+period. Per-worker jobs (cache refreshes) set leased=False. The same row
+records the last run's start, duration, status and error for /admin/jobs.
+"""
+import os
+import uuid
+import random
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Set
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import db
+
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+# lease kept while a job without a timeout runs
+DEFAULT_LEASE_SECONDS = 3600
+
+
+class CronSpec:
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(f, lo, hi) for f, (lo, hi) in zip(fields, self._RANGES)
+        )
+        # as in cron, when both day fields are restricted either may match
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, lo: int, hi: int) -> Set[int]:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_s = part.split("/", 1)
+                step = int(step_s)
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                start, end = map(int, part.split("-", 1))
+            else:
+                start = end = int(part)
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"cron field out of range: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays  # cron: 0 = Sunday
+        if self._any_day:
+            return dow
+        if self._any_weekday:
+            return dom
+        return dom or dow
+
+    def next_after(self, after: datetime) -> datetime:
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron expression never fires: {self.expr!r}")
+
+
+class Job:
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], every: Optional[float] = None,
+                 cron: Optional[str] = None, jitter: float = 0, timeout: Optional[float] = None,
+                 leased: bool = True, run_at_start: bool = False):
+        if (every is None) == (cron is None):
+            raise ValueError("give exactly one of every / cron")
+        self.name = name
+        self.func = func
+        self.every = every
+        self.cron = CronSpec(cron) if cron else None
+        self.jitter = jitter
+        self.timeout = timeout
+        self.leased = leased
+        self.run_at_start = run_at_start
+        self.next_run: Optional[datetime] = None
+        self.running = False
+        self.last: Dict[str, Any] = {}
+
+    def schedule_text(self) -> str:
+        return f"cron {self.cron.expr}" if self.cron else f"every {self.every:g}s"
+
+    def next_due(self, now_local: datetime) -> float:
+        """
+        Seconds from now until the next run, before jitter.
+        """
+        if self.cron:
+            return (self.cron.next_after(now_local) - now_local).total_seconds()
+        return self.every
+
+
+class Scheduler:
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add(self, job: Job):
+        if job.name in self.jobs:
+            raise ValueError(f"duplicate job {job.name}")
+        self.jobs[job.name] = job
+
+    # -----------------------------------------------------------------
+    # leases
+    # -----------------------------------------------------------------
+    async def _acquire(self, job: Job) -> bool:
+        now = datetime.utcnow()
+        hold = (job.timeout or DEFAULT_LEASE_SECONDS) + 60
+        try:
+            await db["job_leases"].find_one_and_update(
+                {"_id": job.name, "$or": [{"expires_at": {"$lte": now}}, {"owner": OWNER_ID}]},
+                {"$set": {"owner": OWNER_ID, "expires_at": now + timedelta(seconds=hold)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def _record(self, job: Job, hold_seconds: Optional[float]):
+        """
+        Persist the last run and, for leased jobs, keep the lease until shortly
+        before the next due time so other workers skip this period.
+        """
+        fields: Dict[str, Any] = {f"last_{k}": v for k, v in job.last.items()}
+        fields["last_owner"] = OWNER_ID
+        if job.leased:
+            fields["expires_at"] = datetime.utcnow() + timedelta(seconds=max(hold_seconds or 0, 0))
+        await db["job_leases"].update_one({"_id": job.name}, {"$set": fields, "$inc": {"runs": 1}}, upsert=True)
+
+    # -----------------------------------------------------------------
+    # running
+    # -----------------------------------------------------------------
+    async def run_job(self, job: Job) -> Dict[str, Any]:
+        if job.running:
+            return {"status": "skipped", "detail": "already running on this worker"}
+        if job.leased and not await self._acquire(job):
+            return {"status": "skipped", "detail": "leased by another worker"}
+        started = datetime.utcnow()
+        status, error, result = "ok", None, None
+        job.running = True
+        try:
+            result = await asyncio.wait_for(job.func(), timeout=job.timeout)
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"did not finish within {job.timeout:g}s"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, error = "error", repr(e)
+            print(f"job {job.name} failed: {e!r}")
+        finally:
+            job.running = False
+        finished = datetime.utcnow()
+        job.last = {
+            "started_at": started,
+            "finished_at": finished,
+            "duration_ms": round((finished - started).total_seconds() * 1000, 1),
+            "status": status,
+            "error": error,
+            "result": result if isinstance(result, (int, float, str, dict, type(None))) else str(result),
+        }
+        try:
+            await self._record(job, job.next_due(datetime.now()) - job.jitter - 1)
+        except Exception as e:
+            print(f"job {job.name}: could not record run: {e!r}")
+        return job.last
+
+    async def _loop(self, job: Job):
+        first = True
+        while True:
+            delay = 0 if first and job.run_at_start else job.next_due(datetime.now())
+            delay += random.uniform(0, job.jitter)
+            first = False
+            job.next_run = datetime.utcnow() + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            try:
+                await self.run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # lease or bookkeeping failure (e.g. Mongo unreachable); try again next period
+                print(f"job {job.name} could not run: {e!r}")
+
+    def start(self):
+        if self._tasks:
+            return
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"job:{job.name}"))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def status(self) -> List[Dict[str, Any]]:
+        shared = {d["_id"]: d async for d in db["job_leases"].find({"_id": {"$in": list(self.jobs)}})}
+        out = []
+        for job in self.jobs.values():
+            row = shared.get(job.name, {})
+            out.append({
+                "name": job.name,
+                "schedule": job.schedule_text(),
+                "timeout": job.timeout,
+                "leased": job.leased,
+                "next_run_here": job.next_run,
+                "running_here": job.running,
+                "last_here": job.last,
+                # cluster-wide view (last run on any worker)
+                "last_started_at": row.get("last_started_at"),
+                "last_duration_ms": row.get("last_duration_ms"),
+                "last_status": row.get("last_status"),
+                "last_error": row.get("last_error"),
+                "last_owner": row.get("last_owner"),
+                "runs": row.get("runs", 0),
+                "lease_owner": row.get("owner"),
+                "lease_expires_at": row.get("expires_at"),
+            })
+        return out
+
+
+async def take_lock(name: str, seconds: float) -> bool:
+    """
+    Cross-worker mutex kept in `job_leases` (use a name that is not a job).
+    Taking it again from the same worker extends it, so long runs can renew.
+    """
+    now = datetime.utcnow()
+    try:
+        await db["job_leases"].find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lte": now}}, {"owner": OWNER_ID}]},
+            {"$set": {"owner": OWNER_ID, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def release_lock(name: str):
+    await db["job_leases"].update_one({"_id": name, "owner": OWNER_ID}, {"$set": {"expires_at": datetime.utcnow()}})
+
+
+scheduler = Scheduler()
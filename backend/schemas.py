@@ -1,6 +1,6 @@
 # schemas.py - Pydantic request/response schemas
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, BeforeValidator
+from typing import Optional, List, Literal, Dict, Any, Union, Annotated
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -16,6 +16,12 @@ class OTPVerifyForm(BaseModel):
     email: EmailStr
     code: str
 
+class RefreshIn(BaseModel):
+    refresh_token: str
+
+class RevokeSessionsIn(BaseModel):
+    emails: List[str]
+
 class AccessRequest(BaseModel):
     file_id: str
     lat: float
@@ -29,3 +35,80 @@ class WFHRequestIn(BaseModel):
 
 class ApproveWFHIn(BaseModel):
     request_id: str
+
+class BulkWFHDecisionIn(BaseModel):
+    request_ids: List[str]
+    decision: Literal["approve", "reject"]
+
+class FileACLIn(BaseModel):
+    users: List[str] = []
+    groups: List[str] = []
+
+class GroupIn(BaseModel):
+    members: List[str] = []
+
+
+# ---------------------------------------------------------------------
+# List responses (fields double as the Mongo projection, see serialization.py)
+# ---------------------------------------------------------------------
+# Mongo hands back ObjectIds; hot and archived events mix ObjectId and str ids
+IdStr = Annotated[str, BeforeValidator(lambda v: v if isinstance(v, str) else str(v))]
+# old-style update events stored {field: new value}; only the names are returned, as in audit.compact()
+ChangedFields = Annotated[List[str], BeforeValidator(
+    lambda v: sorted("password_changed" if k == "hashed_password" else k for k in v) if isinstance(v, dict) else v)]
+
+class EmployeeOut(BaseModel):
+    id: IdStr = Field(alias="_id")
+    email: str
+    name: Optional[str] = None
+    role: str
+    created_at: Optional[datetime] = None
+    wfh_allowed_until: Optional[datetime] = None
+
+class EmployeeFileOut(BaseModel):
+    id: IdStr = Field(alias="_id")
+    file_id: str
+    filename: str
+    uploaded_by: Optional[str] = None
+    uploaded_at: Optional[datetime] = None
+    size: Optional[int] = None
+    mime_type: Optional[str] = None
+    tags: List[str] = []
+
+class FileOut(EmployeeFileOut):
+    sha256: Optional[str] = None
+    restricted: Optional[bool] = None
+    integrity: Optional[Dict[str, Any]] = None
+
+class FilePage(BaseModel):
+    items: List[FileOut]
+    next_cursor: Optional[str] = None
+
+class WFHRequestOut(BaseModel):
+    id: IdStr = Field(alias="_id")
+    requested_by: str
+    start_date: Optional[Union[str, datetime]] = None
+    end_date: Optional[Union[str, datetime]] = None
+    reason: Optional[str] = None
+    status: str = "pending"
+    created_at: Optional[datetime] = None
+    approved_at: Optional[datetime] = None
+    rejected_at: Optional[datetime] = None
+    revoked_at: Optional[datetime] = None
+
+class LogOut(BaseModel):
+    # action-specific fields beyond these stay in Mongo and in /admin/logs/export
+    id: IdStr = Field(alias="_id")
+    email: Optional[str] = None
+    action: str
+    time: datetime
+    file: Optional[str] = None
+    file_id: Optional[str] = None
+    filename: Optional[str] = None
+    target: Optional[str] = None
+    request_id: Optional[str] = None
+    status: Optional[str] = None
+    via: Optional[str] = None
+    job: Optional[str] = None
+    changes: Optional[ChangedFields] = None
+    detail: Optional[Any] = None
@@ -0,0 +1,240 @@
+# scrubber.py - background integrity scrubber for encrypted GridFS blobs
+"""
+Walks the `files` catalog and checks every stored blob's Fernet HMAC tags
+(per segment for "fseg1" blobs, over the whole token for legacy ones). Only
+the signing half of FERNET_KEY is used, so no plaintext is ever produced; a
+tag mismatch means corrupt data or a blob written under a different key.
+
+Reads are paced by a byte-rate budget shared by all concurrent checks, and
+the walk position is checkpointed in `settings` so a restart resumes where
+it stopped. Each file gets an `integrity` subdocument:
+  {"status": "ok" | "corrupt" | "missing" | "error", "checked_at": ..., "detail": ...}
+where "error" means the check itself failed and says nothing about the data.
+"""
+import hmac
+import time
+import base64
+import hashlib
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+from db import db, reader
+from config import settings
+from events import emit
+from files import is_segmented, segment_count, segment_bounds, signing_key, token_mac_ok
+
+
+SCRUB_BYTES_PER_SECOND = settings.scrub_bytes_per_second
+SCRUB_CONCURRENCY = settings.scrub_concurrency
+SCRUB_INTERVAL_HOURS = settings.scrub_interval_hours
+
+_STATE_ID = "scrub_state"
+# legacy tokens are base64 text; read a multiple of 4 characters at a time
+_LEGACY_READ = 4 * 256 * 1024
+
+# live counters for the current process, reported next to the persisted state
+progress: Dict[str, Any] = {
+    "running": False,
+    "files_checked": 0,
+    "bytes_checked": 0,
+    "corrupt": 0,
+    "errors": 0,
+    "current_rate": 0.0,
+}
+
+
+class ByteBudget:
+    """
+    Token bucket in bytes. Callers take what they read and sleep off any debt,
+    so the long-run rate stays at `rate` however many checks run at once.
+    A rate of 0 or less means unpaced.
+    """
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    async def take(self, n: int):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+# ---------------------------------------------------------------------
+# Verifying one blob
+# ---------------------------------------------------------------------
+async def _verify_segmented(grid_out, meta: Dict[str, Any], key: bytes, budget: ByteBudget) -> Optional[str]:
+    plain_size, seg_size = meta["plain_size"], meta["segment_size"]
+    count = segment_count(plain_size, seg_size)
+    last_off, last_len = segment_bounds(count - 1, plain_size, seg_size)
+    if grid_out.length != last_off + last_len:
+        return f"length {grid_out.length} does not match {last_off + last_len} expected for {plain_size} plaintext bytes"
+    for index in range(count):
+        _, length = segment_bounds(index, plain_size, seg_size)
+        await budget.take(length)
+        raw = await grid_out.read(length)
+        if not token_mac_ok(raw, key):
+            return f"segment {index} failed authentication (corrupt data or wrong FERNET_KEY)"
+        progress["bytes_checked"] += length
+    return None
+
+
+async def _verify_legacy(grid_out, key: bytes, budget: ByteBudget) -> Optional[str]:
+    mac = hmac.new(key, digestmod=hashlib.sha256)
+    tail = b""
+    seen = 0
+    while True:
+        await budget.take(_LEGACY_READ)
+        text = await grid_out.read(_LEGACY_READ)
+        if not text:
+            break
+        progress["bytes_checked"] += len(text)
+        try:
+            raw = base64.urlsafe_b64decode(text)
+        except Exception:
+            return "token is not valid base64"
+        if not seen and raw[:1] != b"\x80":
+            return "not a Fernet token"
+        seen += len(raw)
+        # the last 32 bytes are the tag, so hold them back until the end
+        buf = tail + raw
+        mac.update(buf[:-32])
+        tail = buf[-32:]
+    if seen < 73:
+        return "token is truncated"
+    if not hmac.compare_digest(mac.digest(), tail):
+        return "token failed authentication (corrupt data or wrong FERNET_KEY)"
+    return None
+
+
+async def verify_file(file_id: str, budget: Optional[ByteBudget] = None) -> Dict[str, Any]:
+    """
+    Check one stored file and record the result on its catalog entry.
+    """
+    budget = budget or ByteBudget(SCRUB_BYTES_PER_SECOND)
+    key = signing_key()
+    fs = AsyncIOMotorGridFSBucket(db)
+    try:
+        grid_out = await fs.open_download_stream(ObjectId(file_id))
+    except Exception as e:
+        result = {"status": "missing", "detail": f"blob not readable: {e}"}
+    else:
+        try:
+            meta = grid_out.metadata or {}
+            if is_segmented(meta):
+                detail = await _verify_segmented(grid_out, meta, key, budget)
+            else:
+                detail = await _verify_legacy(grid_out, key, budget)
+        except Exception as e:
+            result = {"status": "error", "detail": f"check failed: {e}"}
+        else:
+            result = {"status": "corrupt" if detail else "ok", "detail": detail}
+
+    result["checked_at"] = datetime.utcnow()
+    await db["files"].update_one({"file_id": file_id}, {"$set": {"integrity": result}})
+    progress["files_checked"] += 1
+    if result["status"] == "error":
+        progress["errors"] += 1
+    elif result["status"] != "ok":
+        progress["corrupt"] += 1
+        emit("integrity", {"file_id": file_id, **result})
+    return result
+
+
+# ---------------------------------------------------------------------
+# Resumable passes over the catalog
+# ---------------------------------------------------------------------
+async def get_state() -> Dict[str, Any]:
+    return await db["settings"].find_one({"_id": _STATE_ID}) or {"_id": _STATE_ID}
+
+
+async def _save_state(fields: Dict[str, Any]):
+    await db["settings"].update_one({"_id": _STATE_ID}, {"$set": fields}, upsert=True)
+
+
+async def scrub_pass() -> Dict[str, Any]:
+    """
+    Check every catalog file once, continuing from the checkpoint if a previous
+    pass was interrupted. Files are taken in _id order in batches of
+    SCRUB_CONCURRENCY; the checkpoint moves after each batch completes.
+    """
+    state = await get_state()
+    cursor = state.get("cursor")
+    if cursor is None:
+        await _save_state({"pass_started_at": datetime.utcnow(), "pass_files": 0, "pass_corrupt": 0,
+                           "pass_errors": 0})
+        state = await get_state()
+    budget = ByteBudget(SCRUB_BYTES_PER_SECOND)
+    files_done, corrupt = state.get("pass_files", 0), state.get("pass_corrupt", 0)
+    errors = state.get("pass_errors", 0)
+    progress["running"] = True
+    started, start_bytes = time.monotonic(), progress["bytes_checked"]
+    try:
+        while True:
+            query = {"_id": {"$gt": cursor}} if cursor is not None else {}
+            batch = await db["files"].find(query, {"file_id": 1}).sort("_id", 1) \
+                .limit(SCRUB_CONCURRENCY).to_list(SCRUB_CONCURRENCY)
+            if not batch:
+                break
+            results = await asyncio.gather(*(verify_file(d["file_id"], budget) for d in batch))
+            files_done += len(results)
+            corrupt += sum(1 for r in results if r["status"] in ("corrupt", "missing"))
+            errors += sum(1 for r in results if r["status"] == "error")
+            cursor = batch[-1]["_id"]
+            elapsed = time.monotonic() - started
+            progress["current_rate"] = (progress["bytes_checked"] - start_bytes) / elapsed if elapsed else 0.0
+            await _save_state({"cursor": cursor, "pass_files": files_done, "pass_corrupt": corrupt,
+                               "pass_errors": errors})
+    finally:
+        progress["running"] = False
+    await _save_state({"cursor": None, "pass_finished_at": datetime.utcnow(),
+                       "last_pass_files": files_done, "last_pass_corrupt": corrupt, "last_pass_errors": errors})
+    return await get_state()
+
+
+async def integrity_summary() -> Dict[str, Any]:
+    state = await get_state()
+    state.pop("_id", None)
+    if state.get("cursor") is not None:
+        state["cursor"] = str(state["cursor"])
+    counts = {}
+    async for row in reader("integrity")["files"].aggregate([{"$group": {"_id": "$integrity.status", "n": {"$sum": 1}}}]):
+        counts[row["_id"] or "unchecked"] = row["n"]
+    return {
+        "state": state,
+        "process": dict(progress),
+        "counts": counts,
+        "budget_bytes_per_second": SCRUB_BYTES_PER_SECOND,
+        "concurrency": SCRUB_CONCURRENCY,
+    }
+
+
+async def run_if_due() -> Dict[str, Any]:
+    """
+    Scheduler entry point: resume an interrupted pass, or start a new one once
+    SCRUB_INTERVAL_HOURS have passed since the last finished. A run cut short
+    by its timeout keeps its checkpoint and continues on the next call.
+    """
+    if SCRUB_BYTES_PER_SECOND <= 0:
+        return {"skipped": "disabled"}
+    state = await get_state()
+    finished = state.get("pass_finished_at")
+    if state.get("cursor") is None and finished \
+            and datetime.utcnow() < finished + timedelta(hours=SCRUB_INTERVAL_HOURS):
+        return {"skipped": "not due"}
+    state = await scrub_pass()
+    return {"files": state.get("last_pass_files"), "corrupt": state.get("last_pass_corrupt"),
+            "errors": state.get("last_pass_errors")}
+
+
+async def ensure_indexes():
+    await db["files"].create_index("integrity.status", sparse=True)
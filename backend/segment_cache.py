@@ -0,0 +1,152 @@
+# segment_cache.py - byte-budgeted cache of encrypted file segments
+"""
+Downloads, ranged reads and previews of segmented (fseg1) blobs take their
+ciphertext from here, keyed by (blob id, segment index), and read only the
+missing segments from GridFS. Entries are raw Fernet tokens exactly as
+stored, so no plaintext is kept in memory; every hit is still decrypted
+and authenticated on its way out. A segment is cached only after it has
+decrypted successfully.
+
+Eviction is a segmented LRU. New segments enter a probation list; a second
+hit moves them to the protected list, which may hold up to 80% of
+SEGMENT_CACHE_BYTES. A one-off download of a large cold file only cycles
+probation, so this week's hot files stay cached.
+
+GridFS blobs are immutable: a replaced file gets a new blob id. So an entry
+can only go stale by deletion. delete_blobs() drops the blob's segments in
+this worker. Other workers still look up the blob's files document before
+every read, so a deleted blob is never served. Each worker has its own
+cache; SEGMENT_CACHE_BYTES=0 disables it.
+"""
+from collections import OrderedDict
+from typing import Dict, Set, Tuple, Optional, Any
+
+from config import settings
+from metrics import record_segment_lookup, record_segment_fetch, segment_cache_size
+
+
+SEGMENT_CACHE_BYTES = settings.segment_cache_bytes
+PROTECTED_RATIO = 0.8
+
+Key = Tuple[str, int]
+
+
+class SegmentCache:
+    def __init__(self, budget_bytes: int, protected_ratio: float = PROTECTED_RATIO):
+        self.budget = max(budget_bytes, 0)
+        self.protected_budget = int(self.budget * protected_ratio)
+        self._probation: "OrderedDict[Key, bytes]" = OrderedDict()
+        self._protected: "OrderedDict[Key, bytes]" = OrderedDict()
+        self._by_blob: Dict[str, Set[int]] = {}
+        self.bytes = 0
+        self.protected_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self.bytes_fetched = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def get(self, blob: str, index: int) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        key = (blob, index)
+        raw = self._protected.get(key)
+        if raw is not None:
+            self._protected.move_to_end(key)
+        else:
+            raw = self._probation.pop(key, None)
+            if raw is not None:
+                # second hit: promote, demoting the protected tail back to probation if full
+                self._protected[key] = raw
+                self.protected_bytes += len(raw)
+                while self.protected_bytes > self.protected_budget and len(self._protected) > 1:
+                    old_key, old_raw = self._protected.popitem(last=False)
+                    self.protected_bytes -= len(old_raw)
+                    self._probation[old_key] = old_raw
+        if raw is None:
+            self.misses += 1
+            record_segment_lookup(False, 0)
+            return None
+        self.hits += 1
+        self.bytes_served += len(raw)
+        record_segment_lookup(True, len(raw))
+        return raw
+
+    def put(self, blob: str, index: int, raw: bytes):
+        """
+        Cache a segment read from GridFS (and already authenticated by decrypting it).
+        """
+        self.bytes_fetched += len(raw)
+        record_segment_fetch(len(raw))
+        if not self.enabled or len(raw) > self.budget:
+            return
+        key = (blob, index)
+        if key in self._probation or key in self._protected:
+            return
+        self._probation[key] = raw
+        self._by_blob.setdefault(blob, set()).add(index)
+        self.bytes += len(raw)
+        self._evict()
+        segment_cache_size.set((), self.bytes)
+
+    def _evict(self):
+        while self.bytes > self.budget:
+            source = self._probation if self._probation else self._protected
+            key, raw = source.popitem(last=False)
+            if source is self._protected:
+                self.protected_bytes -= len(raw)
+            self._forget(key, raw)
+            self.evictions += 1
+
+    def _forget(self, key: Key, raw: bytes):
+        self.bytes -= len(raw)
+        indexes = self._by_blob.get(key[0])
+        if indexes is not None:
+            indexes.discard(key[1])
+            if not indexes:
+                del self._by_blob[key[0]]
+
+    def invalidate(self, blob: str) -> int:
+        """
+        Drop every cached segment of a blob; returns how many were dropped.
+        """
+        indexes = self._by_blob.pop(blob, set())
+        for index in indexes:
+            key = (blob, index)
+            raw = self._probation.pop(key, None)
+            if raw is None:
+                raw = self._protected.pop(key)
+                self.protected_bytes -= len(raw)
+            self.bytes -= len(raw)
+        segment_cache_size.set((), self.bytes)
+        return len(indexes)
+
+    def clear(self):
+        self._probation.clear()
+        self._protected.clear()
+        self._by_blob.clear()
+        self.bytes = self.protected_bytes = 0
+        segment_cache_size.set((), 0)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "budget_bytes": self.budget,
+            "bytes": self.bytes,
+            "protected_bytes": self.protected_bytes,
+            "segments": len(self._probation) + len(self._protected),
+            "blobs": len(self._by_blob),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "bytes_served_from_cache": self.bytes_served,
+            "bytes_read_from_mongo": self.bytes_fetched,
+        }
+
+
+segment_cache = SegmentCache(SEGMENT_CACHE_BYTES)
@@ -0,0 +1,79 @@
+# serialization.py - one-pass JSON responses for list endpoints
+"""
+List endpoints return FastJSONResponse(docs) straight from Motor. ObjectId and
+datetime values are converted by the encoder while the bytes are written, so
+there is no per-row `_id` loop and no jsonable_encoder walk. orjson does the
+encoding when installed, stdlib json otherwise; both produce the same JSON
+(ISO datetimes, ObjectIds as hex strings) that FastAPI's encoder did.
+
+Response models in schemas.py define the shapes. projection(Model) derives
+the Mongo projection from their fields so only those leave the database, and
+FastJSONResponse(content, model=...) validates the rows against the model
+before encoding, dropping any field the model does not declare. A route's
+`response_model` alone is documentation: FastAPI skips it for a returned
+Response.
+"""
+import json
+from functools import lru_cache
+from datetime import datetime, date
+from typing import Any, Dict, Type
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json fallback below
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):  # only reached on the stdlib path
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def validated(model: Any, content: Any) -> Any:
+    """
+    `content` checked against `model` (a model or a type such as List[Model])
+    and dumped back to plain data by alias. Raises pydantic.ValidationError.
+    """
+    adapter = _adapter(model)
+    return adapter.dump_python(adapter.validate_python(content), by_alias=True)
+
+
+class FastJSONResponse(JSONResponse):
+    def __init__(self, content: Any, model: Any = None, **kwargs):
+        if model is not None:
+            content = validated(model, content)
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """
+    Inclusion projection for the model's fields (aliases, so `id` -> `_id`).
+    """
+    fields = {(f.alias or name): 1 for name, f in model.model_fields.items()}
+    fields.setdefault("_id", 0)
+    return fields
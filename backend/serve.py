@@ -0,0 +1,85 @@
+# serve.py - production entry point (multi-worker uvicorn, uvloop + httptools when installed)
+"""
+Usage:  python serve.py
+
+Worker count comes from WEB_CONCURRENCY, or else the CPUs this process may
+run on (sched_getaffinity honours taskset/cgroup pinning, unlike cpu_count).
+`python main.py` remains the single-process auto-reload dev server.
+
+On SIGTERM uvicorn stops accepting connections and waits up to
+GRACEFUL_SHUTDOWN_SECONDS for in-flight requests before running the app's
+lifespan shutdown. Live event streams never finish on their own, so
+install_drain_handler() ends them as soon as the signal arrives (browsers'
+EventSource reconnects to another worker).
+"""
+import os
+import signal
+import asyncio
+import threading
+import importlib.util
+
+from config import settings
+
+GRACEFUL_SHUTDOWN_SECONDS = settings.graceful_shutdown_seconds
+KEEP_ALIVE_SECONDS = settings.keep_alive_seconds
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS / Windows
+        return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    explicit = settings.web_concurrency
+    return max(explicit, 1) if explicit else available_cpus()
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def install_drain_handler(drain):
+    """
+    Chain `drain()` in front of uvicorn's SIGTERM/SIGINT handlers. Called from
+    the app lifespan, after uvicorn has installed its own handlers; a no-op
+    off the main thread (e.g. under the test client).
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(drain)
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+def main():
+    # imported here: the app imports this module for install_drain_handler()
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=settings.app_host,
+        port=settings.app_port,
+        workers=worker_count(),
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        backlog=settings.listen_backlog,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.forwarded_allow_ips,
+        access_log=settings.access_log,
+    )
+
+
+if __name__ == "__main__":
+    main()
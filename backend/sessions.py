@@ -0,0 +1,214 @@
+# sessions.py - rotating refresh tokens (login sessions)
+"""
+OTP verification opens a session: a short-lived access JWT plus a refresh
+token `<session id>.<secret>`. /auth/refresh exchanges the refresh token for
+a new pair without password, OTP or email. It costs a primary-key read, one
+conditional update, one insert, a users lookup and an indexed family check. The secret is 256 random
+bits, so it is stored as a plain SHA-256 digest; a slow password hash would
+add nothing.
+
+Every exchange rotates: the presented token is marked used and a new token
+is issued in the same family. Presenting a used token again means a copy is
+in someone else's hands, so the whole family is revoked. Two browser tabs
+refreshing at the same moment can present the same token; a repeat within
+REFRESH_REUSE_GRACE_SECONDS is refused without revoking.
+
+A session is bound to the device id the client sent at login (X-Device-Id).
+A token presented with a different device id also revokes the family.
+Tokens expire REFRESH_TOKEN_DAYS after their last use. A family ends
+SESSION_MAX_DAYS after the OTP login, whatever its activity. Revoking
+sessions stops refreshes; access tokens already issued stay valid until
+they expire (JWT_EXP_MINUTES).
+"""
+import hmac
+import secrets
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+
+from bson import ObjectId
+
+from db import db
+from config import settings
+from auth import create_access_token
+from audit import log_event
+from metrics import record_refresh
+
+
+REFRESH_TOKEN_DAYS = settings.refresh_token_days
+SESSION_MAX_DAYS = settings.session_max_days
+REFRESH_REUSE_GRACE_SECONDS = settings.refresh_reuse_grace_seconds
+
+LIST_PROJECTION = {"token_hash": 0, "device_hash": 0, "parent": 0, "replaced_by": 0}
+
+
+class SessionError(Exception):
+    """Raised with the reason the refresh token was refused (always a 401)."""
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def _digest(value: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(value.encode()).hexdigest() if value else None
+
+
+def _parse(token: str):
+    session_id, _, secret = (token or "").partition(".")
+    if not secret or not ObjectId.is_valid(session_id):
+        return None, None
+    return ObjectId(session_id), secret
+
+
+async def _issue(email: str, role: str, family_id: ObjectId, family_expires_at: datetime,
+                 device_hash: Optional[str], client: Dict[str, Any], now: datetime,
+                 session_id: Optional[ObjectId] = None, parent: Optional[ObjectId] = None) -> Dict[str, Any]:
+    session_id = session_id or ObjectId()
+    secret = secrets.token_urlsafe(32)
+    expires_at = min(now + timedelta(days=REFRESH_TOKEN_DAYS), family_expires_at)
+    await db["sessions"].insert_one({
+        "_id": session_id,
+        "family_id": family_id,
+        "parent": parent,
+        "email": email,
+        "token_hash": _digest(secret),
+        "device_hash": device_hash,
+        "user_agent": client.get("user_agent"),
+        "ip": client.get("ip"),
+        "created_at": now,
+        "expires_at": expires_at,
+        "family_expires_at": family_expires_at,
+        "rotated_at": None,
+        "revoked_at": None,
+    })
+    return {
+        "access_token": create_access_token(email, role),
+        "refresh_token": f"{session_id}.{secret}",
+        "refresh_expires_at": expires_at,
+        "role": role,
+    }
+
+
+async def open_session(email: str, role: str, device_id: Optional[str],
+                       client: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Start a new session family after a successful OTP login.
+    """
+    now = datetime.utcnow()
+    family_id = ObjectId()
+    return await _issue(email, role, family_id, now + timedelta(days=SESSION_MAX_DAYS),
+                        _digest(device_id), client, now, session_id=family_id)
+
+
+async def refresh_session(token: str, device_id: Optional[str], client: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    Raises SessionError when the token is refused.
+    """
+    session_id, secret = _parse(token)
+    doc = await db["sessions"].find_one({"_id": session_id}) if session_id else None
+    if not doc or not hmac.compare_digest(doc["token_hash"], _digest(secret)):
+        record_refresh("invalid")
+        raise SessionError("invalid refresh token")
+
+    now = datetime.utcnow()
+    if doc.get("revoked_at"):
+        record_refresh("revoked")
+        raise SessionError("session revoked")
+    if doc["expires_at"] <= now:
+        record_refresh("expired")
+        raise SessionError("refresh token expired")
+    if doc.get("device_hash") != _digest(device_id):
+        await revoke_family(doc["family_id"], "device_mismatch", doc["email"])
+        record_refresh("device_mismatch")
+        raise SessionError("session revoked")
+
+    # claim the token; only one request can move rotated_at from None
+    next_id = ObjectId()
+    claimed = await db["sessions"].update_one(
+        {"_id": session_id, "rotated_at": None, "revoked_at": None},
+        {"$set": {"rotated_at": now, "replaced_by": next_id}},
+    )
+    if claimed.modified_count == 0:
+        current = await db["sessions"].find_one({"_id": session_id}, {"rotated_at": 1})
+        rotated_at = (current or {}).get("rotated_at")
+        if rotated_at and (now - rotated_at).total_seconds() <= REFRESH_REUSE_GRACE_SECONDS:
+            record_refresh("raced")
+            raise SessionError("refresh token already used")
+        await revoke_family(doc["family_id"], "reuse_detected", doc["email"])
+        record_refresh("reused")
+        raise SessionError("session revoked")
+
+    user = await db["users"].find_one({"email": doc["email"]}, {"role": 1})
+    if not user:
+        await revoke_family(doc["family_id"], "user_removed", doc["email"])
+        record_refresh("revoked")
+        raise SessionError("session revoked")
+
+    issued = await _issue(doc["email"], user["role"], doc["family_id"], doc["family_expires_at"],
+                          doc.get("device_hash"), client, now, session_id=next_id, parent=session_id)
+    # a revocation that landed between the claim and the insert missed the new token
+    if await db["sessions"].find_one({"family_id": doc["family_id"], "revoked_at": {"$ne": None}}, {"_id": 1}):
+        await revoke_family(doc["family_id"], "revoked_during_refresh")
+        record_refresh("revoked")
+        raise SessionError("session revoked")
+    record_refresh("ok")
+    return issued
+
+
+async def revoke_family(family_id: ObjectId, reason: str, email: Optional[str] = None) -> int:
+    result = await db["sessions"].update_many(
+        {"family_id": family_id, "revoked_at": None},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}},
+    )
+    if reason in ("reuse_detected", "device_mismatch"):
+        await log_event({"email": email, "action": "session_" + reason,
+                         "family": str(family_id), "time": datetime.utcnow()})
+    return result.modified_count
+
+
+async def end_session(token: str) -> bool:
+    """
+    Logout: revoke the family of a refresh token. Unknown tokens are ignored.
+    """
+    session_id, secret = _parse(token)
+    doc = await db["sessions"].find_one({"_id": session_id}) if session_id else None
+    if not doc or not hmac.compare_digest(doc["token_hash"], _digest(secret)):
+        return False
+    await revoke_family(doc["family_id"], "logout")
+    return True
+
+
+async def revoke_sessions(emails: List[str], reason: str) -> int:
+    """
+    Revoke every live session of the given users; returns the number of tokens revoked.
+    """
+    if not emails:
+        return 0
+    result = await db["sessions"].update_many(
+        {"email": {"$in": emails}, "revoked_at": None, "expires_at": {"$gt": datetime.utcnow()}},
+        {"$set": {"revoked_at": datetime.utcnow(), "revoked_reason": reason}},
+    )
+    return result.modified_count
+
+
+async def list_sessions(email: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """
+    Live sessions (the newest token of each family), newest first.
+    """
+    query: Dict[str, Any] = {"rotated_at": None, "revoked_at": None, "expires_at": {"$gt": datetime.utcnow()}}
+    if email:
+        query["email"] = email
+    docs = await db["sessions"].find(query, LIST_PROJECTION).sort("created_at", -1).limit(limit).to_list(limit)
+    for d in docs:
+        d["_id"] = str(d["_id"])
+        d["family_id"] = str(d["family_id"])
+    return docs
+
+
+async def ensure_indexes():
+    # expired tokens are dropped by the TTL monitor; revoked ones age out the same way
+    await db["sessions"].create_index("expires_at", expireAfterSeconds=0)
+    await db["sessions"].create_index("family_id")
+    await db["sessions"].create_index([("email", 1), ("created_at", -1)])
@@ -0,0 +1,57 @@
+# conftest.py - in-memory Mongo (mongomock-motor) and GridFS for the backend tests
+"""
+The Motor client and the GridFS bucket are swapped before any backend module
+is imported, as loadtest.py --in-memory does, so the tests need no services.
+Each test starts from empty collections and a cold permission cache.
+"""
+import os
+import sys
+import asyncio
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017/geocrypt_test")
+os.environ.setdefault("SMTP_USER", "test")
+os.environ.setdefault("SMTP_PASS", "test")
+os.environ.setdefault("PROFILE_SAMPLE_RATE", "0")
+
+import motor.motor_asyncio  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import db as db_module  # noqa: E402
+from loadtest import MemoryGridFSBucket  # noqa: E402
+
+db_module.client = AsyncMongoMockClient()
+db_module.db = db_module.client["geocrypt_test"]
+db_module.analytics_db = db_module.db
+motor.motor_asyncio.AsyncIOMotorGridFSBucket = MemoryGridFSBucket
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    """
+    Run a coroutine to completion on the shared event loop.
+    """
+    return loop.run_until_complete
+
+
+@pytest.fixture(autouse=True)
+def clean_db(loop):
+    async def drop():
+        for name in await db_module.db.list_collection_names():
+            await db_module.db.drop_collection(name)
+    loop.run_until_complete(drop())
+    MemoryGridFSBucket.blobs.clear()
+    import acl
+    acl.permissions.load([], [], 0)
+    yield
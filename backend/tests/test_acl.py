@@ -0,0 +1,98 @@
+from acl import (
+    permissions, load_permissions, save_file_acl, save_group, forget_user, ACL_DEFAULT_OPEN,
+)
+from db import db
+
+
+async def _add_file(file_id: str):
+    await db["files"].insert_one({"file_id": file_id, "restricted": False})
+
+
+def test_acl_restricts_to_users_and_group_members(run):
+    run(_add_file("f1"))
+    run(save_group("eng", ["g@x.com"]))
+    run(save_file_acl("f1", ["a@x.com"], ["eng"]))
+
+    assert permissions.can_access("a@x.com", "employee", "f1")
+    assert permissions.can_access("g@x.com", "employee", "f1")
+    assert not permissions.can_access("b@x.com", "employee", "f1")
+    assert permissions.can_access("b@x.com", "admin", "f1")
+
+
+def test_clearing_acl_returns_file_to_default(run):
+    run(_add_file("f1"))
+    run(save_file_acl("f1", ["a@x.com"], []))
+    run(save_file_acl("f1", [], []))
+
+    assert not permissions.is_restricted("f1")
+    assert permissions.can_access("b@x.com", "employee", "f1") == bool(ACL_DEFAULT_OPEN)
+    assert run(db["file_acls"].find_one({"file_id": "f1"})) is None
+    assert run(db["files"].find_one({"file_id": "f1"}))["restricted"] is False
+
+
+def test_forgetting_last_user_keeps_file_admin_only_after_reload(run):
+    run(_add_file("f1"))
+    run(save_file_acl("f1", ["a@x.com"], []))
+    run(forget_user("a@x.com"))
+
+    for reloaded in (False, True):
+        if reloaded:
+            run(load_permissions())
+        assert permissions.is_restricted("f1")
+        assert not permissions.can_access("a@x.com", "employee", "f1")
+        assert not permissions.can_access("b@x.com", "employee", "f1")
+        assert permissions.can_access("root@x.com", "admin", "f1")
+    assert run(db["files"].find_one({"file_id": "f1"}))["restricted"] is True
+
+
+def test_grants_match_normalized_emails(run):
+    run(_add_file("f1"))
+    run(save_group("eng", ["  g@X.COM "]))
+    run(save_file_acl("f1", ["A@Example.COM"], ["eng"]))
+
+    assert permissions.can_access("A@example.com", "employee", "f1")
+    assert permissions.can_access("g@x.com", "employee", "f1")
+    assert run(db["file_acls"].find_one({"file_id": "f1"}))["users"] == ["A@example.com"]
+
+    # mongomock cannot apply the positional `users.$` update, so only the cache side is checked
+    permissions.rename_user("A@example.com", "c@x.com")
+    assert permissions.can_access("c@x.com", "employee", "f1")
+    assert not permissions.can_access("A@example.com", "employee", "f1")
+
+
+def test_malformed_grant_is_rejected(run):
+    import pytest
+    from email_validator import EmailNotValidError
+    run(_add_file("f1"))
+    with pytest.raises(EmailNotValidError):
+        run(save_file_acl("f1", ["not-an-email"], []))
+    assert not permissions.is_restricted("f1")
+
+
+def _snapshot(users, files):
+    return ({f: permissions.is_restricted(f) for f in files},
+            {(u, f): permissions.can_access(u, "employee", f) for u in users for f in files},
+            {u: set(permissions.files_for(u)) for u in users})
+
+
+def test_incremental_updates_match_a_fresh_load(run):
+    users = [f"u{i}@x.com" for i in range(6)]
+    files = [f"f{i}" for i in range(6)]
+    for f in files:
+        run(_add_file(f))
+    run(save_group("eng", users[:3]))
+    run(save_group("ops", users[2:5]))
+    run(save_file_acl("f0", [users[0]], []))
+    run(save_file_acl("f1", [], ["eng"]))
+    run(save_file_acl("f2", [users[5]], ["eng", "ops"]))
+    run(save_file_acl("f3", [users[1]], ["ops"]))
+    run(save_file_acl("f4", [users[0], users[1]], []))
+    run(save_group("eng", users[1:2]))
+    run(save_group("ops", []))
+    run(save_file_acl("f4", [], []))
+    run(forget_user(users[1]))
+    run(save_file_acl("f5", [users[4]], ["eng"]))
+
+    incremental = _snapshot(users, files)
+    run(load_permissions())
+    assert _snapshot(users, files) == incremental
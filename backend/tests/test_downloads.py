@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from files import store_encrypted_file, store_encrypted_blob, _get_fernet, SEGMENT_SIZE
+from tickets import issue_ticket
+
+CONTENT = bytes(range(256)) * (SEGMENT_SIZE * 5 // 2 // 256)
+
+
+@pytest.fixture
+def client():
+    # no lifespan: the tests need neither the scheduler nor the bootstrap admin
+    return TestClient(main.app)
+
+
+def _ticket(file_id: str, size=None) -> str:
+    return issue_ticket("a@x.com", "employee", file_id, "a.bin", "application/octet-stream", size)
+
+
+@pytest.fixture
+def segmented(run):
+    return run(store_encrypted_file("a.bin", CONTENT))
+
+
+@pytest.fixture
+def legacy(run):
+    return str(run(store_encrypted_blob("a.bin", _get_fernet().encrypt(CONTENT))))
+
+
+def test_full_download_streams_whole_file(client, segmented):
+    r = client.get(f"/download/{_ticket(segmented)}")
+    assert r.status_code == 200
+    assert r.headers["content-length"] == str(len(CONTENT))
+    assert r.content == CONTENT
+
+
+@pytest.mark.parametrize("header,start,end", [
+    ("bytes=0-0", 0, 0),
+    (f"bytes={SEGMENT_SIZE - 10}-{SEGMENT_SIZE + 10}", SEGMENT_SIZE - 10, SEGMENT_SIZE + 10),
+    (f"bytes={SEGMENT_SIZE}-", SEGMENT_SIZE, len(CONTENT) - 1),
+    ("bytes=-100", len(CONTENT) - 100, len(CONTENT) - 1),
+    ("bytes=10-99999999", 10, len(CONTENT) - 1),
+])
+@pytest.mark.parametrize("layout", ["segmented", "legacy"])
+def test_ranged_download(client, request, layout, header, start, end):
+    file_id = request.getfixturevalue(layout)
+    r = client.get(f"/download/{_ticket(file_id)}", headers={"Range": header})
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert r.content == CONTENT[start:end + 1]
+
+
+def test_unsatisfiable_range(client, segmented):
+    r = client.get(f"/download/{_ticket(segmented)}", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_empty_file(client, run):
+    file_id = run(store_encrypted_file("empty.bin", b""))
+    r = client.get(f"/download/{_ticket(file_id)}")
+    assert r.status_code == 200
+    assert r.content == b""
+
+
+def test_tampered_ticket_is_rejected(client, segmented):
+    ticket = _ticket(segmented)
+    body, sig = ticket.split(".")
+    assert client.get(f"/download/{body}.{sig[:-2]}AA").status_code == 401
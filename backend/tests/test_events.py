@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from tickets import issue_stream_ticket
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _bearer(role: str):
+    return {"Authorization": f"Bearer {create_access_token(role + '@x.com', role)}"}
+
+
+def test_ticket_endpoint_is_admin_only(client):
+    assert client.post("/admin/events/ticket").status_code in (401, 403)
+    assert client.post("/admin/events/ticket", headers=_bearer("employee")).status_code == 403
+    r = client.post("/admin/events/ticket", headers=_bearer("admin"))
+    assert r.status_code == 200
+    assert r.json()["ticket"]
+
+
+def test_stream_refuses_session_tokens_and_bad_tickets(client):
+    token = create_access_token("admin@x.com", "admin")
+    assert client.get(f"/admin/events?token={token}").status_code == 401
+    assert client.get(f"/admin/events?ticket={token}").status_code == 401
+    assert client.get("/admin/events", headers=_bearer("admin")).status_code == 401
+    employee = issue_stream_ticket("e@x.com", "employee")
+    assert client.get(f"/admin/events?ticket={employee}").status_code == 403
@@ -0,0 +1,56 @@
+import asyncio
+
+import previews
+from previews import get_preview
+from files import store_encrypted_file
+
+
+def _fdoc(run):
+    file_id = run(store_encrypted_file("notes.txt", b"hello preview\n" * 10))
+    return {"file_id": file_id, "filename": "notes.txt", "mime_type": "text/plain", "size": 140, "sha256": "ab" * 32}
+
+
+def test_concurrent_requests_render_once(run, monkeypatch):
+    renders = []
+    render = previews._render
+
+    async def slow_render(fdoc, kind):
+        renders.append(kind)
+        await asyncio.sleep(0.01)
+        return await render(fdoc, kind)
+    monkeypatch.setattr(previews, "_render", slow_render)
+    fdoc = _fdoc(run)
+
+    async def many():
+        return await asyncio.gather(*(get_preview(fdoc) for _ in range(5)))
+
+    results = run(many())
+    assert renders == ["text"]
+    assert all(r == results[0] for r in results)
+    assert previews._locks == {}
+
+
+def test_lock_is_kept_while_callers_wait(run, monkeypatch):
+    # failed renders are not stored, so every caller renders; they must still take turns
+    active, peak = [0], [0]
+
+    async def failing_render(fdoc, kind):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        return b"{}", "application/json", "metadata"
+    monkeypatch.setattr(previews, "_render", failing_render)
+    fdoc = _fdoc(run)
+
+    async def scenario():
+        late = []
+        first = asyncio.ensure_future(get_preview(fdoc))
+        # arrives just after the first caller releases, while the second is still waking up
+        first.add_done_callback(lambda _: late.append(asyncio.ensure_future(get_preview(fdoc))))
+        await asyncio.gather(first, get_preview(fdoc))
+        await asyncio.gather(*late)
+
+    run(scenario())
+    assert peak[0] == 1
+    assert previews._locks == {}
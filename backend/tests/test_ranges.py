@@ -0,0 +1,48 @@
+import pytest
+
+from files import parse_byte_range, open_stored_file, iter_plaintext_range, store_encrypted_file, SEGMENT_SIZE
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("", None),
+    ("bytes=-", None),
+    ("items=0-1", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-", (0, 999)),
+    ("bytes=10-20", (10, 20)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=-1", (999, 999)),
+    ("bytes=-5000", (0, 999)),
+    (" bytes=1-2 ", (1, 2)),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=5-4", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 1000)
+
+
+def test_any_range_of_an_empty_file_is_unsatisfiable():
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=0-", 0)
+
+
+def test_iter_plaintext_range_yields_one_segment_at_a_time(run):
+    content = bytes(range(251)) * (SEGMENT_SIZE * 3 // 251)
+
+    async def collect(start, end):
+        grid_out = await open_stored_file(file_id)
+        return [chunk async for chunk in iter_plaintext_range(grid_out, start, end)]
+
+    file_id = run(store_encrypted_file("a.bin", content))
+    for start, end in [(0, len(content) - 1), (SEGMENT_SIZE - 1, SEGMENT_SIZE), (5, 5),
+                       (SEGMENT_SIZE, 2 * SEGMENT_SIZE - 1), (len(content) - 3, len(content) - 1)]:
+        chunks = run(collect(start, end))
+        assert b"".join(chunks) == content[start:end + 1]
+        assert len(chunks) == end // SEGMENT_SIZE - start // SEGMENT_SIZE + 1
+        assert all(len(c) <= SEGMENT_SIZE for c in chunks)
@@ -0,0 +1,47 @@
+import scrubber
+from scrubber import ByteBudget, verify_file
+from files import store_encrypted_file
+from db import db
+
+
+async def _stored(content: bytes) -> str:
+    file_id = await store_encrypted_file("a.bin", content)
+    await db["files"].insert_one({"file_id": file_id, "filename": "a.bin"})
+    return file_id
+
+
+def test_zero_rate_budget_is_unpaced(run):
+    budget = ByteBudget(0)
+    run(budget.take(10 * 1024 * 1024))
+    run(budget.take(1))
+
+
+def test_unpaced_verify_reports_healthy_file_ok(run):
+    file_id = run(_stored(b"x" * 5000))
+    result = run(verify_file(file_id, ByteBudget(0)))
+    assert result["status"] == "ok"
+    assert run(db["files"].find_one({"file_id": file_id}))["integrity"]["status"] == "ok"
+
+
+def test_flipped_byte_is_corrupt(run):
+    from loadtest import MemoryGridFSBucket
+    file_id = run(_stored(b"y" * 5000))
+    blob = next(iter(MemoryGridFSBucket.blobs.values()))
+    data = bytearray(blob["data"])
+    data[40] ^= 1
+    blob["data"] = bytes(data)
+    assert run(verify_file(file_id))["status"] == "corrupt"
+
+
+def test_check_failure_is_an_error_not_corruption(run, monkeypatch):
+    file_id = run(_stored(b"z" * 100))
+    corrupt_before = scrubber.progress["corrupt"]
+
+    async def broken(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(scrubber, "_verify_segmented", broken)
+
+    result = run(verify_file(file_id))
+    assert result["status"] == "error"
+    assert "boom" in result["detail"]
+    assert scrubber.progress["corrupt"] == corrupt_before
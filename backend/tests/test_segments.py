@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+from files import (
+    enc_len, segment_count, segment_bounds, encrypt_segments, decrypt_segments, decrypt_segment,
+    token_mac_ok, signing_key,
+)
+
+SEG = 64
+
+
+@pytest.mark.parametrize("size", [0, 1, SEG - 1, SEG, SEG + 1, 3 * SEG, 3 * SEG + 7])
+def test_layout_matches_encrypted_length(size):
+    content = os.urandom(size)
+    raw = encrypt_segments(content, segment_size=SEG)
+    count = segment_count(size, SEG)
+    assert count == max(1, -(-size // SEG))
+    last_off, last_len = segment_bounds(count - 1, size, SEG)
+    assert last_off + last_len == len(raw)
+    assert b"".join(decrypt_segments(raw, size, segment_size=SEG)) == content
+
+
+def test_full_segments_have_fixed_length():
+    raw = encrypt_segments(b"x" * (3 * SEG), segment_size=SEG)
+    for i in range(3):
+        off, length = segment_bounds(i, 3 * SEG, SEG)
+        assert (off, length) == (i * enc_len(SEG), enc_len(SEG))
+        assert decrypt_segment(raw[off:off + length]) == b"x" * SEG
+
+
+def test_run_of_segments_from_the_middle():
+    content = os.urandom(4 * SEG + 5)
+    raw = encrypt_segments(content, segment_size=SEG)
+    off, _ = segment_bounds(2, len(content), SEG)
+    parts = decrypt_segments(raw[off:], len(content), first_index=2, segment_size=SEG)
+    assert [len(p) for p in parts] == [SEG, SEG, 5]
+    assert b"".join(parts) == content[2 * SEG:]
+
+
+def test_tampered_segment_fails_authentication():
+    raw = bytearray(encrypt_segments(os.urandom(2 * SEG), segment_size=SEG))
+    raw[enc_len(SEG) + 30] ^= 1
+    with pytest.raises(InvalidToken):
+        decrypt_segments(bytes(raw), 2 * SEG, segment_size=SEG)
+    key = signing_key()
+    assert token_mac_ok(bytes(raw[:enc_len(SEG)]), key)
+    assert not token_mac_ok(bytes(raw[enc_len(SEG):]), key)
+
+
+def test_mis_sliced_segment_is_rejected():
+    raw = encrypt_segments(os.urandom(2 * SEG), segment_size=SEG)
+    with pytest.raises(InvalidToken):
+        decrypt_segment(raw[1:enc_len(SEG) + 1])
+    assert not token_mac_ok(raw[:enc_len(SEG) - 16], signing_key())
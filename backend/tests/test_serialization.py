@@ -0,0 +1,37 @@
+import json
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+
+from schemas import EmployeeOut, LogOut, FilePage
+from serialization import FastJSONResponse
+
+
+def _body(content, model):
+    return json.loads(FastJSONResponse(content, model=model).body)
+
+
+def test_undeclared_fields_are_dropped():
+    oid = ObjectId()
+    row = {"_id": oid, "email": "a@x.com", "role": "employee", "hashed_password": "$2b$..."}
+    assert _body([row], List[EmployeeOut]) == [{
+        "_id": str(oid), "email": "a@x.com", "name": None, "role": "employee",
+        "created_at": None, "wfh_allowed_until": None,
+    }]
+
+
+def test_log_events_keep_declared_fields_only():
+    event = {"_id": "archived-1", "email": "a@x.com", "action": "updated_employee",
+             "time": datetime(2026, 1, 2, 3, 4, 5), "target": "b@x.com",
+             "changes": {"name": "B", "hashed_password": "$2b$..."}, "secret": "x"}
+    out = _body([event], List[LogOut])[0]
+    assert out["_id"] == "archived-1"
+    assert out["time"] == "2026-01-02T03:04:05"
+    assert out["changes"] == ["name", "password_changed"]
+    assert "secret" not in out
+
+
+def test_page_model():
+    out = _body({"items": [], "next_cursor": None}, FilePage)
+    assert out == {"items": [], "next_cursor": None}
@@ -0,0 +1,91 @@
+import pytest
+
+import sessions
+from sessions import open_session, refresh_session, end_session, revoke_sessions, SessionError
+from db import db
+
+CLIENT = {"user_agent": "pytest", "ip": "127.0.0.1"}
+
+
+@pytest.fixture
+def opened(run):
+    run(db["users"].insert_one({"email": "a@x.com", "role": "employee"}))
+    return run(open_session("a@x.com", "employee", "device-1", CLIENT))
+
+
+def _refresh(run, token, device="device-1"):
+    return run(refresh_session(token, device, CLIENT))
+
+
+def _refused(run, token, detail, device="device-1"):
+    with pytest.raises(SessionError) as e:
+        _refresh(run, token, device)
+    assert e.value.detail == detail
+
+
+def _live_tokens(run) -> int:
+    return run(db["sessions"].count_documents({"revoked_at": None}))
+
+
+def test_refresh_rotates_the_token(run, opened):
+    issued = _refresh(run, opened["refresh_token"])
+    assert issued["refresh_token"] != opened["refresh_token"]
+    assert issued["access_token"]
+    assert issued["role"] == "employee"
+    assert _refresh(run, issued["refresh_token"])["refresh_token"]
+
+
+def test_reusing_a_rotated_token_revokes_the_family(run, opened, monkeypatch):
+    monkeypatch.setattr(sessions, "REFRESH_REUSE_GRACE_SECONDS", -1)
+    issued = _refresh(run, opened["refresh_token"])
+    _refused(run, opened["refresh_token"], "session revoked")
+    _refused(run, issued["refresh_token"], "session revoked")
+    assert _live_tokens(run) == 0
+
+
+def test_repeat_within_grace_is_refused_without_revoking(run, opened, monkeypatch):
+    monkeypatch.setattr(sessions, "REFRESH_REUSE_GRACE_SECONDS", 60)
+    issued = _refresh(run, opened["refresh_token"])
+    _refused(run, opened["refresh_token"], "refresh token already used")
+    assert _refresh(run, issued["refresh_token"])
+
+
+def test_other_device_revokes_the_family(run, opened):
+    _refused(run, opened["refresh_token"], "session revoked", device="device-2")
+    _refused(run, opened["refresh_token"], "session revoked")
+
+
+def test_wrong_secret_and_garbage_are_invalid(run, opened):
+    session_id, _ = opened["refresh_token"].split(".", 1)
+    _refused(run, f"{session_id}.wrong", "invalid refresh token")
+    _refused(run, "garbage", "invalid refresh token")
+    assert _refresh(run, opened["refresh_token"])
+
+
+def test_logout_and_admin_revocation(run, opened):
+    assert run(end_session(opened["refresh_token"]))
+    _refused(run, opened["refresh_token"], "session revoked")
+
+    other = run(open_session("a@x.com", "employee", "device-1", CLIENT))
+    assert run(revoke_sessions(["a@x.com"], "credentials_changed")) == 1
+    _refused(run, other["refresh_token"], "session revoked")
+
+
+def test_deleted_user_cannot_refresh(run, opened):
+    run(db["users"].delete_one({"email": "a@x.com"}))
+    _refused(run, opened["refresh_token"], "session revoked")
+    assert _live_tokens(run) == 0
+
+
+def test_revocation_during_refresh_reaches_the_new_token(run, opened, monkeypatch):
+    issue = sessions._issue
+
+    async def revoke_mid_refresh(*args, **kwargs):
+        issued = await issue(*args, **kwargs)
+        # another worker revokes the family's older tokens while this one is inserted
+        await db["sessions"].update_many({"rotated_at": {"$ne": None}}, {"$set": {"revoked_at": sessions.datetime.utcnow()}})
+        return issued
+    monkeypatch.setattr(sessions, "_issue", revoke_mid_refresh)
+
+    _refused(run, opened["refresh_token"], "session revoked")
+    assert _live_tokens(run) == 0
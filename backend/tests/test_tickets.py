@@ -0,0 +1,58 @@
+import json
+import time
+
+import tickets
+from tickets import issue_ticket, verify_ticket, _b64, _unb64
+
+
+def _issue(**kwargs) -> str:
+    return issue_ticket("a@x.com", "employee", "f1", "a.pdf", "application/pdf", 1234, **kwargs)
+
+
+def test_valid_ticket_round_trips_claims():
+    claims = verify_ticket(_issue())
+    assert claims["sub"] == "a@x.com"
+    assert claims["rl"] == "employee"
+    assert claims["fid"] == "f1"
+    assert claims["sz"] == 1234
+    assert claims["exp"] > time.time()
+
+
+def test_expired_ticket_is_rejected(monkeypatch):
+    ticket = _issue(ttl=10)
+    now = time.time()
+    monkeypatch.setattr(tickets.time, "time", lambda: now + 11)
+    assert verify_ticket(ticket) is None
+
+
+def test_edited_claims_are_rejected():
+    body, sig = _issue().split(".")
+    claims = json.loads(_unb64(body))
+    claims["fid"] = "f2"
+    forged = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    assert verify_ticket(f"{forged}.{sig}") is None
+
+
+def test_signature_from_another_secret_is_rejected(monkeypatch):
+    ticket = _issue()
+    monkeypatch.setattr(tickets, "_SECRET", b"another secret")
+    assert verify_ticket(ticket) is None
+
+
+def test_malformed_tickets_are_rejected():
+    for ticket in ("", "no-dot", ".", "a.b.c", "!!!.???"):
+        assert verify_ticket(ticket) is None
+
+
+def test_stream_and_download_tickets_are_not_interchangeable():
+    stream = tickets.issue_stream_ticket("admin@x.com", "admin")
+    assert tickets.verify_stream_ticket(stream)["rl"] == "admin"
+    assert verify_ticket(stream) is None
+    assert tickets.verify_stream_ticket(_issue()) is None
+
+
+def test_stream_ticket_expires(monkeypatch):
+    stream = tickets.issue_stream_ticket("admin@x.com", "admin")
+    now = time.time()
+    monkeypatch.setattr(tickets.time, "time", lambda: now + tickets.STREAM_TICKET_TTL_SECONDS + 1)
+    assert tickets.verify_stream_ticket(stream) is None
@@ -0,0 +1,90 @@
+# tickets.py - short-lived HMAC-signed download and event-stream tickets
+"""
+A ticket records one positive policy decision: user `sub` may fetch file `fid`
+until `exp`. It is verified with the server secret alone, so the download
+endpoint needs no DB reads and the same ticket can serve retries and ranged
+(resumed or parallel) requests until it expires.
+
+A stream ticket lets an admin open /admin/events, where the browser's
+EventSource can only authenticate through the URL. It is signed with its own
+key, so neither kind of ticket is accepted in place of the other, and it
+lives STREAM_TICKET_TTL_SECONDS: long enough to connect, so what lands in
+access logs is not a reusable session token.
+"""
+import hmac
+import json
+import time
+import base64
+import hashlib
+from typing import Optional, Dict, Any
+
+from config import settings
+
+DOWNLOAD_TICKET_TTL_SECONDS = settings.download_ticket_ttl_seconds
+STREAM_TICKET_TTL_SECONDS = settings.stream_ticket_ttl_seconds
+
+
+# DOWNLOAD_TICKET_SECRET, or a key derived from JWT_SECRET (see config.py)
+_SECRET = settings.ticket_secret
+_STREAM_SECRET = hmac.new(_SECRET, b"geocrypt-stream-ticket", hashlib.sha256).digest()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(claims: Dict[str, Any], key: bytes) -> str:
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    sig = _b64(hmac.new(key, body.encode(), hashlib.sha256).digest())
+    return f"{body}.{sig}"
+
+
+def _verify(ticket: str, key: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        body, sig = ticket.split(".", 1)
+        expected = _b64(hmac.new(key, body.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        claims = json.loads(_unb64(body))
+    except Exception:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+def issue_ticket(email: str, role: str, file_id: str, filename: str, mime_type: str,
+                 size: Optional[int] = None, ttl: Optional[int] = None) -> str:
+    claims = {
+        "sub": email,
+        "rl": role,
+        "fid": file_id,
+        "fn": filename,
+        "mt": mime_type,
+        "sz": size,
+        "exp": int(time.time()) + (ttl or DOWNLOAD_TICKET_TTL_SECONDS),
+    }
+    return _sign(claims, _SECRET)
+
+
+def verify_ticket(ticket: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the ticket claims, or None if the signature is bad or it has expired.
+    """
+    return _verify(ticket, _SECRET)
+
+
+def issue_stream_ticket(email: str, role: str) -> str:
+    return _sign({"sub": email, "rl": role, "exp": int(time.time()) + STREAM_TICKET_TTL_SECONDS},
+                 _STREAM_SECRET)
+
+
+def verify_stream_ticket(ticket: str) -> Optional[Dict[str, Any]]:
+    """
+    Claims of a valid, unexpired stream ticket, else None.
+    """
+    return _verify(ticket, _STREAM_SECRET)
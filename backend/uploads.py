@@ -0,0 +1,227 @@
+# uploads.py - resumable chunked upload sessions
+"""
+tus-style flow for large files:
+  1. create a session (filename, total size, chunk size)
+  2. PUT numbered chunks in any order, possibly in parallel, and retry any that fail
+  3. query the session to see which chunks arrived and the contiguous offset
+  4. finalize: the encrypted chunks are concatenated into one GridFS blob
+
+Each chunk is encrypted as whole segments (chunk_size is a multiple of
+files.SEGMENT_SIZE) and written to GridFS as soon as it arrives, so finalizing
+is a byte copy. Session state lives in Mongo, so any worker can take any chunk.
+Sessions that are not finalized before they expire are garbage-collected.
+"""
+import uuid
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+
+from db import db
+from config import settings
+from files import (
+    SEGMENT_SIZE,
+    encrypt_segments,
+    decrypt_segments,
+    segment_metadata,
+    store_encrypted_blob,
+    delete_blobs,
+    concat_blobs,
+)
+
+
+UPLOAD_SESSION_TTL_HOURS = settings.upload_session_ttl_hours
+UPLOAD_GC_SECONDS = settings.upload_gc_seconds
+DEFAULT_CHUNK_SIZE = 8 * SEGMENT_SIZE
+MAX_CHUNK_SIZE = 64 * SEGMENT_SIZE
+MAX_UPLOAD_SIZE = settings.max_upload_size
+
+
+class UploadError(Exception):
+    """Raised with an HTTP status code for the route to surface."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _expiry() -> datetime:
+    return datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+
+
+def _chunk_length(session: Dict[str, Any], index: int) -> int:
+    return min(session["chunk_size"], session["size"] - index * session["chunk_size"])
+
+
+def describe(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Public view of a session: received chunks and the contiguous byte offset.
+    """
+    received = sorted(int(k) for k in session.get("received", {}))
+    contiguous = 0
+    for i in received:
+        if i != contiguous:
+            break
+        contiguous += 1
+    return {
+        "upload_id": session["_id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received": received,
+        "offset": min(contiguous * session["chunk_size"], session["size"]),
+        "status": session["status"],
+        "expires_at": session["expires_at"],
+    }
+
+
+async def create_session(filename: str, size: int, chunk_size: Optional[int], tags: List[str],
+                         created_by: str) -> Dict[str, Any]:
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not filename:
+        raise UploadError(400, "filename required")
+    if size < 0 or size > MAX_UPLOAD_SIZE:
+        raise UploadError(400, "invalid size")
+    if chunk_size <= 0 or chunk_size % SEGMENT_SIZE or chunk_size > MAX_CHUNK_SIZE:
+        raise UploadError(400, f"chunk_size must be a multiple of {SEGMENT_SIZE} up to {MAX_CHUNK_SIZE}")
+    session = {
+        "_id": uuid.uuid4().hex,
+        "filename": filename,
+        "size": size,
+        "chunk_size": chunk_size,
+        "total_chunks": max(1, -(-size // chunk_size)),
+        "tags": tags,
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "expires_at": _expiry(),
+        "status": "open",
+        "received": {},
+    }
+    await db["upload_sessions"].insert_one(session)
+    return session
+
+
+async def get_session(upload_id: str, created_by: Optional[str] = None) -> Dict[str, Any]:
+    q: Dict[str, Any] = {"_id": upload_id}
+    if created_by:
+        q["created_by"] = created_by
+    session = await db["upload_sessions"].find_one(q)
+    if not session:
+        raise UploadError(404, "upload session not found")
+    return session
+
+
+async def put_chunk(session: Dict[str, Any], index: int, data: bytes) -> Dict[str, Any]:
+    """
+    Encrypt and store one chunk, then record it on the session. Re-sending a
+    chunk replaces the earlier copy, so clients can simply retry.
+    """
+    if session["status"] != "open":
+        raise UploadError(409, f"upload is {session['status']}")
+    if not 0 <= index < session["total_chunks"]:
+        raise UploadError(400, "chunk index out of range")
+    expected = _chunk_length(session, index)
+    if len(data) != expected:
+        raise UploadError(400, f"chunk {index} must be {expected} bytes, got {len(data)}")
+
+    encrypted = await asyncio.to_thread(encrypt_segments, data)
+    blob_id = await store_encrypted_blob(
+        f"upload-{session['_id']}-{index}", encrypted, metadata={"upload_session": session["_id"], "chunk": index}
+    )
+    entry = {"blob_id": blob_id, "plain_len": len(data), "head": data[:64] if index == 0 else b""}
+    previous = await db["upload_sessions"].find_one_and_update(
+        {"_id": session["_id"], "status": "open"},
+        {"$set": {f"received.{index}": entry, "expires_at": _expiry()}},
+        projection={f"received.{index}": 1},
+    )
+    if previous is None:
+        await delete_blobs([blob_id])
+        raise UploadError(409, "upload is no longer open")
+    old = (previous.get("received") or {}).get(str(index))
+    if old and old["blob_id"] != blob_id:
+        await delete_blobs([old["blob_id"]])
+    return describe(await get_session(session["_id"]))
+
+
+async def finalize(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Concatenate all chunks into the final blob. Returns the catalog inputs
+    (file id, size, sha256 and the plaintext head for type detection).
+    The plaintext hash is computed by decrypting each chunk once, which also
+    proves every chunk decrypts before the file becomes visible.
+    """
+    missing = [i for i in range(session["total_chunks"]) if str(i) not in session.get("received", {})]
+    if missing:
+        raise UploadError(409, f"missing chunks: {missing[:20]}")
+
+    claimed = await db["upload_sessions"].find_one_and_update(
+        {"_id": session["_id"], "status": "open"},
+        # a long concatenation must not cross the expiry the GC works from
+        {"$set": {"status": "finalizing", "expires_at": _expiry()}},
+    )
+    if not claimed:
+        raise UploadError(409, f"upload is {session['status']}")
+
+    parts = [claimed["received"][str(i)] for i in range(claimed["total_chunks"])]
+    digest = hashlib.sha256()
+
+    async def hash_part(i: int, raw: bytes):
+        for seg in await asyncio.to_thread(decrypt_segments, raw, parts[i]["plain_len"]):
+            digest.update(seg)
+
+    try:
+        meta = {"uploaded_by": claimed["created_by"], **segment_metadata(claimed["size"])}
+        oid = await concat_blobs(claimed["filename"], [p["blob_id"] for p in parts], meta, visit=hash_part)
+    except Exception:
+        await db["upload_sessions"].update_one({"_id": claimed["_id"]}, {"$set": {"status": "open"}})
+        raise
+
+    await db["upload_sessions"].update_one(
+        {"_id": claimed["_id"]}, {"$set": {"status": "done", "file_id": str(oid)}}
+    )
+    await delete_blobs([p["blob_id"] for p in parts])
+    return {
+        "file_id": str(oid),
+        "size": claimed["size"],
+        "sha256": digest.hexdigest(),
+        "head": parts[0].get("head") or b"",
+        "filename": claimed["filename"],
+        "tags": claimed.get("tags", []),
+    }
+
+
+async def abort(session: Dict[str, Any]):
+    await db["upload_sessions"].delete_one({"_id": session["_id"]})
+    await delete_blobs([p["blob_id"] for p in session.get("received", {}).values()])
+
+
+# ---------------------------------------------------------------------
+# Garbage collection of expired sessions
+# ---------------------------------------------------------------------
+async def collect_expired() -> int:
+    """
+    Delete expired open sessions and every chunk blob they left behind
+    (including orphans from concurrent retries of the same chunk). Finished
+    sessions, and ones whose finalize died with its worker, are removed one
+    more UPLOAD_SESSION_TTL_HOURS later, never while a finalize is running.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    query = {"$or": [
+        {"status": "open", "expires_at": {"$lt": now}},
+        {"status": {"$in": ["finalizing", "done"]}, "expires_at": {"$lt": stale}},
+    ]}
+    removed = 0
+    async for s in db["upload_sessions"].find(query, {"_id": 1}):
+        blobs = [f["_id"] async for f in db["fs.files"].find({"metadata.upload_session": s["_id"]}, {"_id": 1})]
+        await delete_blobs(blobs)
+        await db["upload_sessions"].delete_one({"_id": s["_id"]})
+        removed += 1
+    return removed
+
+
+async def ensure_indexes():
+    await db["upload_sessions"].create_index("expires_at")
+    await db["fs.files"].create_index("metadata.upload_session", sparse=True)
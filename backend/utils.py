@@ -1,20 +1,24 @@
 # utils.py - geofence, time checks, haversine
-import os
 import math
-from datetime import datetime, time
-from dotenv import load_dotenv
+from datetime import datetime
+from typing import Optional
 
-load_dotenv()
+from config import settings
 
-CENTER_LAT = float(os.getenv("GEOFENCE_CENTER_LAT", "9.35866726100274"))
-CENTER_LON = float(os.getenv("GEOFENCE_CENTER_LON", "76.67729687183018"))
-RADIUS_M = float(os.getenv("GEOFENCE_RADIUS_M", "1000"))
-WORKDAY_START = os.getenv("WORKDAY_START", "09:00")
-WORKDAY_END = os.getenv("WORKDAY_END", "17:00")
-ALLOWED_WIFI_SSID = os.getenv("ALLOWED_WIFI_SSID", None)
+CENTER_LAT = settings.geofence_center_lat
+CENTER_LON = settings.geofence_center_lon
+RADIUS_M = settings.geofence_radius_m
+WORKDAY_START = settings.workday_start  # datetime.time
+WORKDAY_END = settings.workday_end
+ALLOWED_WIFI_SSID = settings.allowed_wifi_ssid
+
+EARTH_RADIUS_M = 6371000.0
+_CENTER_PHI = math.radians(CENTER_LAT)
+_CENTER_LAMBDA = math.radians(CENTER_LON)
+_CENTER_COS = math.cos(_CENTER_PHI)
 
 def haversine_meters(lat1, lon1, lat2, lon2):
-    R = 6371000.0
+    R = EARTH_RADIUS_M
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
@@ -24,13 +28,25 @@ def haversine_meters(lat1, lon1, lat2, lon2):
     return R * c
 
 def is_within_geofence(lat: float, lon: float) -> bool:
-    dist = haversine_meters(lat, lon, CENTER_LAT, CENTER_LON)
+    # haversine_meters against the fixed center, with its radians and cosine precomputed
+    phi = math.radians(lat)
+    a = (math.sin((_CENTER_PHI - phi) / 2) ** 2
+         + math.cos(phi) * _CENTER_COS * math.sin((_CENTER_LAMBDA - math.radians(lon)) / 2) ** 2)
+    dist = EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return dist <= RADIUS_M
 
 def is_within_work_hours(now: datetime = None) -> bool:
     now = now or datetime.now()
-    start_h, start_m = map(int, WORKDAY_START.split(":"))
-    end_h, end_m = map(int, WORKDAY_END.split(":"))
-    start = time(start_h, start_m)
-    end = time(end_h, end_m)
-    return start <= now.time() <= end
+    return WORKDAY_START <= now.time() <= WORKDAY_END
+
+def parse_wfh_until(value) -> Optional[datetime]:
+    """
+    wfh_allowed_until as a datetime. Older approvals stored the request's
+    end_date string ("YYYY-MM-DD HH:mm:ss" or ISO); unparsable values mean no WFH.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
@@ -11,30 +11,32 @@ import EmployeeDashboard from "./pages/EmployeeDashboard";
 import AdminSettings from "./pages/AdminSettings";
 import Nav from "./components/Nav";
 
-import API from "./api";
+import API, { refreshSession } from "./api";
 import {
   parseJwt,
   readToken,
+  readRefreshToken,
   isTokenValid,
+  hasSession,
   scheduleAutoLogout,
   clearSession
 } from "./utils/auth";
 
+// renew the access token this long before it expires
+const REFRESH_AHEAD_MS = 60 * 1000;
+
 
 // --------------------------------------------
 // 🛡️ PRIVATE ROUTE
 // --------------------------------------------
 function PrivateRoute({ children, role }) {
-  const token = readToken();
-  const valid = isTokenValid(token);
-
-  // Reject if no token or expired or invalid
-  if (!valid.valid) {
+  // Reject if there is neither a valid access token nor a refresh token to renew it
+  if (!hasSession()) {
     clearSession();
     return <Navigate to="/" replace />;
   }
 
-  const payload = parseJwt(token);
+  const payload = parseJwt(readToken() || "") || {};
   const userRole = payload.role || localStorage.getItem("role");
 
   // Reject if role mismatch
@@ -54,15 +56,18 @@ export default function App() {
 
   useEffect(() => {
     async function checkSession() {
-      const token = readToken();
-      if (!token) return;
+      let token = readToken();
+      if (!token && !readRefreshToken()) return;
 
-      // Local JWT validation
+      // Local JWT validation; an expired access token is renewed, not logged out
       const validity = isTokenValid(token);
       if (!validity.valid) {
-        console.log("Invalid session:", validity.reason);
-        clearSession();
-        return;
+        console.log("Access token not usable:", validity.reason);
+        token = readRefreshToken() ? await refreshSession() : null;
+        if (!token) {
+          clearSession();
+          return;
+        }
       }
 
       // Optional but recommended server-side validation
@@ -77,9 +82,19 @@ export default function App() {
         return;
       }
 
-      // Auto logout on token expiration
+      // Renew shortly before expiry; without a refresh token, log out at expiry
       if (logoutTimerRef.current) clearTimeout(logoutTimerRef.current);
 
+      if (readRefreshToken()) {
+        const payload = parseJwt(token);
+        const millis = payload?.exp ? payload.exp * 1000 - Date.now() - REFRESH_AHEAD_MS : 0;
+        logoutTimerRef.current = setTimeout(async () => {
+          if (await refreshSession()) checkSession();
+          else window.location.href = "/";
+        }, Math.max(millis, 0));
+        return;
+      }
+
       logoutTimerRef.current = scheduleAutoLogout(token, () => {
         console.log("Auto logout triggered (token expired)");
         clearSession();
@@ -1,13 +1,90 @@
 import axios from "axios";
+import { readToken, readRefreshToken, getDeviceId, storeSession, clearSession } from "./utils/auth";
 
-const API = axios.create({
-  baseURL: import.meta.env.VITE_API_URL || "http://localhost:8000",
-});
+const baseURL = import.meta.env.VITE_API_URL || "http://localhost:8000";
+
+const API = axios.create({ baseURL });
 
 API.interceptors.request.use((config) => {
-  const token = localStorage.getItem("token");
+  const token = readToken();
   if (token) config.headers.Authorization = `Bearer ${token}`;
+  config.headers["X-Device-Id"] = getDeviceId();
   return config;
 });
 
+// ---------------------------------------------------------------------
+// Refresh: one /auth/refresh at a time per tab; concurrent 401s wait for it.
+// ---------------------------------------------------------------------
+let refreshing = null;
+
+async function exchange(refreshToken) {
+  // plain axios: this call must not go through the 401 handler below
+  const res = await axios.post(
+    `${baseURL}/auth/refresh`,
+    { refresh_token: refreshToken },
+    { headers: { "X-Device-Id": getDeviceId() } }
+  );
+  storeSession(res.data);
+  return res.data.access_token;
+}
+
+/**
+ * Renew the access token with the stored refresh token. Resolves to the new
+ * access token, or null when the session is over (storage is cleared).
+ */
+export function refreshSession() {
+  if (!refreshing) {
+    const refreshToken = readRefreshToken();
+    refreshing = (refreshToken ? exchange(refreshToken) : Promise.reject(new Error("no session")))
+      .catch((err) => {
+        // another tab may have rotated the token meanwhile: retry once with its token
+        const current = readRefreshToken();
+        if (current && current !== refreshToken && err?.response?.status === 401) {
+          return exchange(current);
+        }
+        throw err;
+      })
+      .catch(() => {
+        clearSession();
+        return null;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+}
+
+API.interceptors.response.use(
+  (res) => res,
+  async (error) => {
+    const original = error.config;
+    const isAuthCall = original?.url?.startsWith("/auth/") && original.url !== "/auth/me";
+    if (error.response?.status !== 401 || !original || original._retried || isAuthCall || !readRefreshToken()) {
+      return Promise.reject(error);
+    }
+    original._retried = true;
+    const token = await refreshSession();
+    if (!token) {
+      window.location.href = "/";
+      return Promise.reject(error);
+    }
+    original.headers.Authorization = `Bearer ${token}`;
+    return API(original);
+  }
+);
+
+/** revoke the session server-side (best effort) and clear local storage */
+export async function logout() {
+  const refreshToken = readRefreshToken();
+  clearSession();
+  if (refreshToken) {
+    try {
+      await axios.post(`${baseURL}/auth/logout`, { refresh_token: refreshToken });
+    } catch (e) {
+      // the session still expires on its own
+    }
+  }
+}
+
 export default API;
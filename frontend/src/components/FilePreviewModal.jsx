@@ -8,9 +8,10 @@ import Modal from "./Modal";
  *  - open: boolean
  *  - fileId: string
  *  - filename: string
+ *  - mimeType: string (optional, from the file catalog)
  *  - onClose: fn
  */
-export default function FilePreviewModal({ open, fileId, filename, onClose }) {
+export default function FilePreviewModal({ open, fileId, filename, mimeType, onClose }) {
   const [loading, setLoading] = useState(false);
   const [blobUrl, setBlobUrl] = useState(null);
   const [mime, setMime] = useState(null);
@@ -44,9 +45,8 @@ export default function FilePreviewModal({ open, fileId, filename, onClose }) {
         if (["txt","log","md","csv","json","xml"].includes(ext)) guessed = "text/plain";
         if (["mp4","webm","ogg"].includes(ext)) guessed = `video/${ext === "mp4" ? "mp4" : ext}`;
 
-        // Use Content-Type header if backend provides it
-        const contentTypeHeader = res.headers && res.headers["content-type"];
-        const finalMime = contentTypeHeader || guessed;
+        // prefer the type recorded at upload; fall back to the extension guess
+        const finalMime = mimeType || guessed;
         setMime(finalMime);
 
         const ab = res.data;
@@ -83,7 +83,7 @@ export default function FilePreviewModal({ open, fileId, filename, onClose }) {
       cancelled = true;
       if (urlRef) URL.revokeObjectURL(urlRef);
     };
-  }, [open, fileId, filename]);
+  }, [open, fileId, filename, mimeType]);
 
   function renderBody() {
     if (loading) return <div style={{ padding: 24 }}>Loading preview…</div>;
@@ -1,6 +1,7 @@
 // src/components/Nav.jsx (Admin button removed)
 import React, { useMemo } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import { logout } from "../api";
 
 /* --- JWT Helper Functions --- */
 function parseJwt(token) {
@@ -30,13 +31,14 @@ export default function Nav() {
 
   const authInfo = useMemo(() => {
     const token = readStoredToken();
+    const refreshable = !!localStorage.getItem("refresh_token");
     if (!token) return { authenticated: false };
 
     const payload = parseJwt(token);
     if (!payload) return { authenticated: false };
 
-    // Check expiry
-    if (payload.exp && Math.floor(Date.now() / 1000) >= payload.exp) {
+    // Check expiry (an expired access token is renewed while a refresh token exists)
+    if (payload.exp && Math.floor(Date.now() / 1000) >= payload.exp && !refreshable) {
       localStorage.removeItem("access_token");
       localStorage.removeItem("token");
       return { authenticated: false };
@@ -49,10 +51,8 @@ export default function Nav() {
     };
   }, []);
 
-  function handleLogout() {
-    localStorage.removeItem("access_token");
-    localStorage.removeItem("token");
-    localStorage.removeItem("role");
+  async function handleLogout() {
+    await logout();
     navigate("/");
     window.location.reload();
   }
@@ -11,9 +11,11 @@ import Modal from "./Modal"; // assumes Modal is at src/components/Modal.jsx
  *  POST /admin/approve-wfh    (form request_id)
  *  POST /admin/reject-wfh     (form request_id)
  *  POST /admin/revoke-wfh     (form user_email)
+ *  POST /admin/wfh/bulk-decision (json request_ids, decision)
  *
  * Props:
  *  - onChange(optional): function called with { type, requestId, email } after actions
+ *  - refreshKey(optional): reloads the list whenever it changes (live feed updates)
  */
 
 function fmt(dt) {
@@ -27,7 +29,7 @@ function fmt(dt) {
   }
 }
 
-export default function WFHRequests({ onChange }) {
+export default function WFHRequests({ onChange, refreshKey }) {
   const [pending, setPending] = useState([]);
   const [approved, setApproved] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -60,7 +62,7 @@ export default function WFHRequests({ onChange }) {
 
   useEffect(() => {
     load();
-  }, []);
+  }, [refreshKey]);
 
   async function doApprove(req) {
     if (!confirm(`Approve WFH for ${req.requested_by}?\n${req.start_date} → ${req.end_date}`)) return;
@@ -96,6 +98,25 @@ export default function WFHRequests({ onChange }) {
     }
   }
 
+  async function doBulk(decision) {
+    if (pending.length === 0) return;
+    if (!confirm(`${decision === "approve" ? "Approve" : "Reject"} all ${pending.length} pending requests?`)) return;
+    setActionLoading("bulk");
+    try {
+      const ids = pending.map((r) => r._id);
+      const res = await API.post("/admin/wfh/bulk-decision", { request_ids: ids, decision });
+      const failed = (res.data?.results || []).filter((r) => r.status === "error");
+      if (failed.length) alert(`${failed.length} request(s) could not be updated`);
+      await load();
+      if (onChange) onChange({ type: decision === "approve" ? "approved" : "rejected", requestId: null, email: null });
+    } catch (err) {
+      console.error("Bulk decision failed:", err);
+      alert(err?.response?.data?.detail || "Bulk decision failed");
+    } finally {
+      setActionLoading(null);
+    }
+  }
+
   async function doRevoke(approvedReq) {
     if (!confirm(`Revoke WFH access for ${approvedReq.requested_by}?`)) return;
     const email = approvedReq.requested_by;
@@ -123,7 +144,19 @@ export default function WFHRequests({ onChange }) {
 
   return (
     <div style={{ padding: 6 }}>
-      <h4 style={{ marginTop: 0 }}>Pending Requests</h4>
+      <div style={{ display: "flex", justifyContent: "space-between", alignItems: "center" }}>
+        <h4 style={{ marginTop: 0 }}>Pending Requests</h4>
+        {pending.length > 1 && (
+          <div style={{ display: "flex", gap: 8 }}>
+            <button className="btn" disabled={actionLoading !== null} onClick={() => doBulk("approve")}>
+              {actionLoading === "bulk" ? "…" : "Approve all"}
+            </button>
+            <button className="btn danger" disabled={actionLoading !== null} onClick={() => doBulk("reject")}>
+              {actionLoading === "bulk" ? "…" : "Reject all"}
+            </button>
+          </div>
+        )}
+      </div>
 
       {loading && <div style={{ padding: 8 }}>Loading requests…</div>}
       {!loading && pending.length === 0 && <div style={{ color: "var(--muted)", padding: 8 }}>No pending requests</div>}
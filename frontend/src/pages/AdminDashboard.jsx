@@ -6,20 +6,19 @@ import FileUpload from "../components/FileUpload";
 import WFHRequests from "../components/WFHRequests";
 import Modal from "../components/Modal";
 import EmployeeForm from "../components/EmployeeForm";
-import { formatDateISOString } from "../utils";
+import { formatDateISOString, formatBytes } from "../utils";
 
 /**
  * Small internal FilePreview component.
  * Props:
- *  - open (bool), fileId (string), filename (string), onClose (fn)
- * Uses your /stream-file endpoint and expects API to attach Authorization header.
+ *  - open (bool), fileId (string), filename (string), onDownload (fn), onClose (fn)
+ * Uses the /files/{id}/preview rendition endpoint (text head, thumbnail or metadata),
+ * so opening a preview never pulls the whole file.
  */
-function FilePreview({ open, fileId, filename, onClose }) {
+function FilePreview({ open, fileId, filename, onDownload, onClose }) {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
-  const [blobUrl, setBlobUrl] = useState(null);
-  const [mime, setMime] = useState(null);
-  const [textPreview, setTextPreview] = useState(null);
+  const [preview, setPreview] = useState(null); // { kind, url?, text?, meta? }
   const urlRef = useRef(null);
 
   useEffect(() => {
@@ -29,44 +28,24 @@ function FilePreview({ open, fileId, filename, onClose }) {
     let cancelled = false;
     setLoading(true);
     setError(null);
-    setBlobUrl(null);
-    setMime(null);
-    setTextPreview(null);
+    setPreview(null);
 
     async function load() {
       try {
-        const form = new URLSearchParams();
-        form.set("file_id", fileId);
-
-        // responseType arraybuffer to get raw bytes
-        const res = await API.post("/stream-file", form, { responseType: "arraybuffer" });
-
-        // infer mime from response header if present, fallback to filename extension
-        const headerMime = res.headers && res.headers["content-type"];
-        let inferred = headerMime || inferMimeFromFilename(filename);
-
+        const res = await API.get(`/files/${encodeURIComponent(fileId)}/preview`, { responseType: "arraybuffer" });
+        if (cancelled) return;
+        const kind = res.headers["x-preview-kind"] || "metadata";
+        const type = res.headers["content-type"] || "application/octet-stream";
         const ab = res.data;
-        const blob = new Blob([ab], { type: inferred });
-        const url = URL.createObjectURL(blob);
-        urlRef.current = url;
 
-        if (cancelled) {
-          URL.revokeObjectURL(url);
-          return;
-        }
-
-        setMime(inferred);
-        setBlobUrl(url);
-
-        // if text, decode and keep preview
-        if (inferred.startsWith("text/")) {
-          try {
-            const dec = new TextDecoder("utf-8");
-            const txt = dec.decode(ab);
-            setTextPreview(txt.slice(0, 200000)); // limit for performance
-          } catch (e) {
-            // ignore decoding errors
-          }
+        if (kind === "image") {
+          const url = URL.createObjectURL(new Blob([ab], { type }));
+          urlRef.current = url;
+          setPreview({ kind, url });
+        } else if (kind === "text" || kind === "pdf_text") {
+          setPreview({ kind, text: new TextDecoder("utf-8").decode(ab) });
+        } else {
+          setPreview({ kind: "metadata", meta: JSON.parse(new TextDecoder("utf-8").decode(ab)) });
         }
       } catch (err) {
         console.error("File preview load error:", err);
@@ -85,65 +64,37 @@ function FilePreview({ open, fileId, filename, onClose }) {
         urlRef.current = null;
       }
     };
-  }, [open, fileId, filename]);
-
-  function inferMimeFromFilename(name = "") {
-    const ext = (name || "").split(".").pop().toLowerCase();
-    if (["png", "jpg", "jpeg", "gif", "bmp", "webp"].includes(ext)) return ext === "jpg" ? "image/jpeg" : `image/${ext}`;
-    if (ext === "pdf") return "application/pdf";
-    if (["txt", "log", "md", "csv", "json", "xml"].includes(ext)) return "text/plain";
-    if (["mp4", "webm", "ogg"].includes(ext)) return `video/${ext}`;
-    return "application/octet-stream";
-  }
+  }, [open, fileId]);
 
   function renderBody() {
     if (loading) return <div style={{ padding: 18 }}>Loading preview…</div>;
     if (error) return <div style={{ padding: 18, color: "#c0392b" }}>{error}</div>;
-    if (!blobUrl) return <div style={{ padding: 18 }}>No preview available.</div>;
+    if (!preview) return <div style={{ padding: 18 }}>No preview available.</div>;
 
-    if (mime?.startsWith("image/")) {
+    if (preview.kind === "image") {
       return (
         <div style={{ padding: 12, display: "flex", justifyContent: "center" }}>
-          <img src={blobUrl} alt={filename} style={{ maxWidth: "100%", maxHeight: "70vh", borderRadius: 8 }} />
-        </div>
-      );
-    }
-
-    if (mime === "application/pdf") {
-      return (
-        <div style={{ height: "70vh" }}>
-          <iframe title={filename} src={blobUrl} style={{ width: "100%", height: "100%", border: "none" }} />
-        </div>
-      );
-    }
-
-    if (mime?.startsWith("video/")) {
-      return (
-        <div style={{ padding: 12 }}>
-          <video controls style={{ width: "100%", maxHeight: "70vh" }}>
-            <source src={blobUrl} type={mime} />
-            Your browser does not support the video tag.
-          </video>
+          <img src={preview.url} alt={filename} style={{ maxWidth: "100%", maxHeight: "70vh", borderRadius: 8 }} />
         </div>
       );
     }
 
-    if (mime?.startsWith("text/") || textPreview !== null) {
+    if (preview.kind === "text" || preview.kind === "pdf_text") {
       return (
         <div style={{ padding: 12, maxHeight: "70vh", overflow: "auto", background: "#0b1220", color: "#e8eef8", borderRadius: 8 }}>
-          <pre style={{ whiteSpace: "pre-wrap", wordBreak: "break-word", margin: 0 }}>{textPreview || "Empty file"}</pre>
+          {preview.kind === "pdf_text" && <div className="small" style={{ marginBottom: 8 }}>First page text</div>}
+          <pre style={{ whiteSpace: "pre-wrap", wordBreak: "break-word", margin: 0 }}>{preview.text || "Empty file"}</pre>
         </div>
       );
     }
 
-    // fallback: show download and open links
+    const meta = preview.meta || {};
     return (
       <div style={{ padding: 18 }}>
         <div style={{ marginBottom: 12 }}>No inline preview available for this file type.</div>
-        <div style={{ display: "flex", gap: 8 }}>
-          <a className="btn" href={blobUrl} download={filename}>Download</a>
-          <a className="btn ghost" href={blobUrl} target="_blank" rel="noreferrer">Open in new tab</a>
-        </div>
+        <div className="small">Type: {meta.mime_type || "unknown"}</div>
+        {typeof meta.size === "number" && <div className="small">Size: {formatBytes(meta.size)}</div>}
+        {meta.uploaded_by && <div className="small">Uploaded by: {meta.uploaded_by}</div>}
       </div>
     );
   }
@@ -153,7 +104,7 @@ function FilePreview({ open, fileId, filename, onClose }) {
       <div style={{ minHeight: 120 }}>{renderBody()}</div>
 
       <div style={{ display: "flex", justifyContent: "flex-end", gap: 8, marginTop: 12 }}>
-        {blobUrl && <a className="btn" href={blobUrl} download={filename}>Download</a>}
+        {onDownload && <button className="btn" onClick={onDownload}>Download</button>}
         <button className="btn ghost" onClick={onClose}>Close</button>
       </div>
     </Modal>
@@ -169,10 +120,11 @@ export default function AdminDashboard() {
   const [modalOpen, setModalOpen] = useState(false);
   const [editing, setEditing] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [wfhVersion, setWfhVersion] = useState(0);
 
   // preview state
   const [previewOpen, setPreviewOpen] = useState(false);
-  const [previewFile, setPreviewFile] = useState({ fileId: null, filename: null });
+  const [previewFile, setPreviewFile] = useState({ fileId: null, filename: null, file: null });
 
   async function load() {
     setLoading(true);
@@ -197,6 +149,49 @@ export default function AdminDashboard() {
     load();
   }, []);
 
+  // live activity feed: new logs and WFH changes are pushed instead of re-fetched
+  useEffect(() => {
+    if (typeof EventSource === "undefined") return;
+    let source = null;
+    let stopped = false;
+
+    async function connect() {
+      if (stopped) return;
+      // a short-lived stream ticket goes in the URL, never the session token
+      let ticket;
+      try {
+        ticket = (await API.post("/admin/events/ticket")).data.ticket;
+      } catch (e) {
+        return;
+      }
+      if (stopped) return;
+      source = new EventSource(`${API.defaults.baseURL}/admin/events?ticket=${encodeURIComponent(ticket)}`);
+
+      source.addEventListener("log", (ev) => {
+        try {
+          const entry = JSON.parse(ev.data);
+          setLogs((prev) => [entry, ...prev.filter((l) => l._id !== entry._id)].slice(0, 100));
+        } catch (e) {
+          console.error("Bad log event", e);
+        }
+      });
+      const bumpWfh = () => setWfhVersion((v) => v + 1);
+      source.addEventListener("wfh_request", bumpWfh);
+      source.addEventListener("wfh_updated", bumpWfh);
+      // EventSource gives up on an HTTP error (expired ticket): get a new one and reconnect
+      source.onerror = () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        connect();
+      };
+    }
+
+    connect();
+    return () => {
+      stopped = true;
+      if (source) source.close();
+    };
+  }, []);
+
   function openNewEmployee() {
     setEditing(null);
     setModalOpen(true);
@@ -222,13 +217,13 @@ export default function AdminDashboard() {
   function openPreview(file) {
     // backend stores file_id as string; some records might have file_id or _id
     const fid = file.file_id || file.fileId || file._id;
-    setPreviewFile({ fileId: String(fid), filename: file.filename || file.name || "file" });
+    setPreviewFile({ fileId: String(fid), filename: file.filename || file.name || "file", file });
     setPreviewOpen(true);
   }
 
   function closePreview() {
     setPreviewOpen(false);
-    setPreviewFile({ fileId: null, filename: null });
+    setPreviewFile({ fileId: null, filename: null, file: null });
   }
 
   // download helper using stream-file
@@ -238,7 +233,7 @@ export default function AdminDashboard() {
       const form = new URLSearchParams();
       form.set("file_id", String(fid));
       const res = await API.post("/stream-file", form, { responseType: "arraybuffer" });
-      const contentType = res.headers && res.headers["content-type"] ? res.headers["content-type"] : "application/octet-stream";
+      const contentType = file.mime_type || "application/octet-stream";
       const blob = new Blob([res.data], { type: contentType });
       const url = URL.createObjectURL(blob);
       const a = document.createElement("a");
@@ -312,7 +307,10 @@ export default function AdminDashboard() {
                 <div key={f._id || f.file_id} className="file-item" style={{ padding: 8, display: "flex", justifyContent: "space-between", alignItems: "center", borderBottom: "1px solid rgba(0,0,0,0.04)" }}>
                   <div>
                     <div style={{ fontWeight: 700 }}>{f.filename}</div>
-                    <div className="small">{f.uploaded_by} • {f.uploaded_at ? formatDateISOString(f.uploaded_at) : ""}</div>
+                    <div className="small">
+                      {f.uploaded_by} • {f.uploaded_at ? formatDateISOString(f.uploaded_at) : ""}
+                      {typeof f.size === "number" ? ` • ${formatBytes(f.size)}` : ""}
+                    </div>
                   </div>
 
                   <div style={{ display: "flex", gap: 8 }}>
@@ -342,7 +340,7 @@ export default function AdminDashboard() {
 
           <div className="card" style={{ marginTop: 18 }}>
             <h3>WFH Requests</h3>
-            <WFHRequests onChange={() => load()} />
+            <WFHRequests refreshKey={wfhVersion} />
           </div>
         </aside>
       </div>
@@ -359,6 +357,7 @@ export default function AdminDashboard() {
         open={previewOpen}
         fileId={previewFile.fileId}
         filename={previewFile.filename}
+        onDownload={previewFile.file ? () => downloadFile(previewFile.file) : null}
         onClose={closePreview}
       />
     </div>
@@ -13,7 +13,7 @@ export default function EmployeeDashboard() {
 
   async function load() {
     try {
-      const [f, l] = await Promise.all([API.get("/admin/files"), API.get("/employee/my-logs")]);
+      const [f, l] = await Promise.all([API.get("/employee/files"), API.get("/employee/my-logs")]);
       setFiles(f.data || []);
       setLogs(l.data || []);
     } catch (e) {
@@ -24,15 +24,22 @@ export default function EmployeeDashboard() {
   useEffect(() => { load(); }, []);
 
   async function previewFile(file) {
-    try {
-      const form = new URLSearchParams({ file_id: file.file_id, lat: 0, lon: 0, client_network_hint: "" });
-      const res = await API.post("/employee/request-and-download", form, { responseType: "blob" });
-      const blob = res.data;
-      const text = await blob.text();
-      openTextPreview(file.filename, text);
-    } catch (err) {
-      alert(err?.response?.data?.detail || "preview failed");
-    }
+    navigator.geolocation.getCurrentPosition(async (pos) => {
+      try {
+        // small cached rendition (text head / thumbnail / metadata) instead of the whole file
+        const params = { lat: pos.coords.latitude, lon: pos.coords.longitude, client_network_hint: "" };
+        const res = await API.get(`/files/${encodeURIComponent(file.file_id)}/preview`, { params, responseType: "blob" });
+        const kind = res.headers["x-preview-kind"];
+        if (kind === "image") {
+          window.open(URL.createObjectURL(res.data), "_blank");
+          return;
+        }
+        const text = await res.data.text();
+        openTextPreview(file.filename, kind === "metadata" ? JSON.stringify(JSON.parse(text), null, 2) : text);
+      } catch (err) {
+        alert(err?.response?.data?.detail || "preview failed");
+      }
+    }, () => { alert("geolocation failed or denied"); });
   }
 
   function openTextPreview(filename, text) {
@@ -52,10 +59,10 @@ export default function EmployeeDashboard() {
       const hint = prompt("Enter network hint (SSID or IP) or leave blank");
       try {
         const form = new URLSearchParams({ file_id: file.file_id, lat: String(lat), lon: String(lon), client_network_hint: hint || "" });
-        const res = await API.post("/employee/request-and-download", form, { responseType: "blob" });
-        const url = URL.createObjectURL(res.data);
+        // policy check returns a short-lived ticket; the browser then downloads natively (resumable, no Blob buffering)
+        const res = await API.post("/employee/request-download-ticket", form);
         const a = document.createElement("a");
-        a.href = url;
+        a.href = `${API.defaults.baseURL}${res.data.url}`;
         a.download = file.filename;
         a.click();
       } catch (e) { alert(e?.response?.data?.detail || "download failed"); }
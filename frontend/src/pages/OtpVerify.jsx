@@ -1,5 +1,6 @@
 import React, {useState, useEffect} from 'react'
 import API from '../api'
+import { storeSession } from '../utils/auth'
 import { useLocation, useNavigate } from 'react-router-dom'
 
 export default function OtpVerify(){
@@ -17,8 +18,8 @@ export default function OtpVerify(){
     try{
       const form = new URLSearchParams({email, code})
       const res = await API.post('/auth/verify-otp', form)
-      localStorage.setItem('token', res.data.access_token)
-      localStorage.setItem('role', res.data.role)
+      // access token + refresh token (renewed by api.js, no OTP until the session ends)
+      storeSession(res.data)
       // Role-based redirect improvements: go to originally requested path (if present)
       if (res.data.role === 'admin') nav('/admin')
       else nav('/employee')
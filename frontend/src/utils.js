@@ -3,3 +3,12 @@ export function formatDateISOString(iso) {
   if (!iso) return ''
   try { return new Date(iso).toLocaleString() } catch { return iso }
 }
+
+export function formatBytes(n) {
+  if (n == null) return ''
+  const units = ['B', 'KB', 'MB', 'GB', 'TB']
+  let i = 0
+  let v = n
+  while (v >= 1024 && i < units.length - 1) { v /= 1024; i++ }
+  return `${i === 0 ? v : v.toFixed(1)} ${units[i]}`
+}
@@ -1,5 +1,6 @@
 // src/utils/auth.js
 // JWT helpers: parse token, check expiry, schedule auto-logout
+// Session helpers: refresh token + device id kept next to the access token
 
 /**
  * Decode JWT payload without external libs.
@@ -23,11 +24,42 @@ export function readToken() {
   return localStorage.getItem("access_token") || localStorage.getItem("token") || null;
 }
 
+export function readRefreshToken() {
+  return localStorage.getItem("refresh_token") || null;
+}
+
+/**
+ * Stable random id for this browser; sessions are bound to it (X-Device-Id).
+ */
+export function getDeviceId() {
+  let id = localStorage.getItem("device_id");
+  if (!id) {
+    id = window.crypto?.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem("device_id", id);
+  }
+  return id;
+}
+
+/** store the body of /auth/verify-otp or /auth/refresh */
+export function storeSession(data) {
+  localStorage.setItem("token", data.access_token);
+  if (data.refresh_token) localStorage.setItem("refresh_token", data.refresh_token);
+  if (data.role) localStorage.setItem("role", data.role);
+}
+
 export function clearSession() {
   localStorage.removeItem("access_token");
   localStorage.removeItem("token");
+  localStorage.removeItem("refresh_token");
   localStorage.removeItem("role");
-  // any other keys you used
+  // any other keys you used (device_id stays: it identifies the browser)
+}
+
+/** signed in = a valid access token, or a refresh token that can renew it */
+export function hasSession() {
+  return isTokenValid(readToken()).valid || !!readRefreshToken();
 }
 
 /** return { valid: boolean, reason?: string, payload?: object } */